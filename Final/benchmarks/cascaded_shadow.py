@@ -0,0 +1,78 @@
+"""
+Cascaded shadow benchmark: render a field of spheres with a moving camera, so that shadow maps
+are rendered every frame, once with the single color-and-depth shadow map and once with
+cascaded depth-only shadow maps of 1 to 4 cascades, and compare time per frame
+and the distance up to which shadows are computed.
+
+Run from the Final directory:
+    python -m benchmarks.cascaded_shadow
+"""
+import time
+
+import OpenGL.GL as GL
+
+from benchmarks.context import create_context
+from scripts.camera.camera import Camera
+from scripts.core.mesh import Mesh
+from scripts.geometry.geometry import BoxGeometry, SphereGeometry
+from scripts.light.light import AmbientLight, DirectionalLight
+from scripts.material.phong import PhongMaterial
+from scripts.render.renderer import Renderer
+from scripts.scene import Scene
+
+
+def build_scene(cascaded_shadow):
+    scene = Scene()
+    scene.add(AmbientLight(color=[0.1, 0.1, 0.1]))
+    directional_light = DirectionalLight(color=[0.9, 0.9, 0.9], direction=[-1, -1, -0.5])
+    scene.add(directional_light)
+    material = PhongMaterial(property_dict={"baseColor": [0.8, 0.4, 0.2]}, number_of_light_sources=2,
+                             use_shadow=True, cascaded_shadow=cascaded_shadow)
+    ground = Mesh(BoxGeometry(100, 0.2, 100), material)
+    ground.set_position([0, -0.1, 0])
+    scene.add(ground)
+    geometry = SphereGeometry(radius=0.5, indexed=True)
+    for row in range(20):
+        for column in range(-5, 6):
+            mesh = Mesh(geometry, material)
+            mesh.set_position([column * 3, 1, -row * 3])
+            scene.add(mesh)
+    return scene, directional_light
+
+
+def run_frames(renderer, scene, camera, frame_count):
+    renderer.render(scene, camera)
+    GL.glFinish()
+    start = time.perf_counter()
+    for _ in range(frame_count):
+        # Moving the camera moves the cascades, so that they are rendered again
+        camera.translate(0, 0, -0.01)
+        renderer.render(scene, camera)
+    GL.glFinish()
+    return (time.perf_counter() - start) / frame_count
+
+
+def main(frame_count=10):
+    create_context((512, 512))
+    print(f"{'shadow map':>22}{'ms per frame':>15}{'shadow distance':>18}")
+    for cascade_count in [0, 1, 2, 3, 4]:
+        scene, directional_light = build_scene(cascade_count > 0)
+        camera = Camera(aspect_ratio=1)
+        camera.set_position([0, 3, 6])
+        renderer = Renderer()
+        if cascade_count > 0:
+            renderer.enable_shadows(directional_light, resolution=(1024, 1024), cascade_count=cascade_count)
+            name = f"{cascade_count} x depth 1024"
+        else:
+            renderer.enable_shadows(directional_light, resolution=(1024, 1024))
+            name = "single RGBA 1024"
+        frame_time = run_frames(renderer, scene, camera, frame_count)
+        if cascade_count > 0:
+            shadow_distance = f"{renderer.shadow_object.split_distance_list[-1]:.0f}"
+        else:
+            shadow_distance = "fixed box"
+        print(f"{name:>22}{frame_time * 1000:>15.1f}{shadow_distance:>18}")
+
+
+if __name__ == "__main__":
+    main()
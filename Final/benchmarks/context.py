@@ -0,0 +1,12 @@
+import pygame
+
+
+def create_context(size=(64, 64)):
+    """
+    Create a hidden window with an OpenGL context,
+    needed by benchmarks that create buffers, textures or programs
+    """
+    pygame.init()
+    # Use a core OpenGL profile, as in the main application
+    pygame.display.gl_set_attribute(pygame.GL_CONTEXT_PROFILE_MASK, pygame.GL_CONTEXT_PROFILE_CORE)
+    return pygame.display.set_mode(size, pygame.DOUBLEBUF | pygame.OPENGL | pygame.HIDDEN)
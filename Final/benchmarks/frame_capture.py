@@ -0,0 +1,85 @@
+"""
+Frame capture benchmark: render a field of spheres into a render target and record every frame
+as PNG, once with a blocking glReadPixels and PNG encoding in the render loop, and once
+with the pixel pack buffers and worker processes of FrameCapture; compare time per frame
+with the time of rendering without recording.
+
+Run from the Final directory:
+    python -m benchmarks.frame_capture
+"""
+import os
+import tempfile
+import time
+
+import OpenGL.GL as GL
+
+from benchmarks.context import create_context
+from scripts.camera.camera import Camera
+from scripts.core.mesh import Mesh
+from scripts.geometry.geometry import SphereGeometry
+from scripts.light.light import AmbientLight, DirectionalLight
+from scripts.material.phong import PhongMaterial
+from scripts.render.render_target import RenderTarget
+from scripts.render.renderer import Renderer
+from scripts.scene import Scene
+
+
+def build_scene():
+    scene = Scene()
+    scene.add(AmbientLight(color=[0.2, 0.2, 0.2]))
+    scene.add(DirectionalLight(color=[0.8, 0.8, 0.8], direction=[-1, -1, -1]))
+    material = PhongMaterial(property_dict={"baseColor": [0.2, 0.5, 0.8]}, number_of_light_sources=2)
+    geometry = SphereGeometry(radius=0.4, indexed=True)
+    for index in range(100):
+        mesh = Mesh(geometry, material)
+        mesh.set_position([index % 10 - 4.5, index // 10 - 4.5, 0])
+        scene.add(mesh)
+    return scene
+
+
+def run_frames(renderer, scene, camera, frame_count, record_frame):
+    start = time.perf_counter()
+    for frame_index in range(frame_count):
+        camera.set_position([0, 0, 12 + 0.01 * frame_index])
+        renderer.render(scene, camera)
+        record_frame(frame_index)
+    return (time.perf_counter() - start) / frame_count
+
+
+def main(frame_count=60, size=(1280, 720)):
+    create_context()
+    render_target = RenderTarget(size)
+    scene = build_scene()
+    camera = Camera(aspect_ratio=size[0] / size[1])
+    scene.add(camera)
+    renderer = Renderer(default_render_target=render_target)
+    print(f"{'recording':>28}{'ms per frame':>15}")
+    with tempfile.TemporaryDirectory() as directory:
+        # Warm-up
+        run_frames(renderer, scene, camera, 5, lambda frame_index: None)
+        GL.glFinish()
+
+        def record_nothing(frame_index):
+            # Wait for the frame as the other modes do, so that the times are comparable
+            GL.glFinish()
+
+        frame_time = run_frames(renderer, scene, camera, frame_count, record_nothing)
+        print(f"{'none':>28}{frame_time * 1000:>15.1f}")
+
+        def record_blocking(frame_index):
+            render_target.save_image(os.path.join(directory, f"blocking_{frame_index:06d}.png"))
+
+        frame_time = run_frames(renderer, scene, camera, frame_count, record_blocking)
+        print(f"{'glReadPixels + PNG':>28}{frame_time * 1000:>15.1f}")
+
+        renderer.start_capture(os.path.join(directory, "capture"))
+        start = time.perf_counter()
+        frame_time = run_frames(renderer, scene, camera, frame_count, lambda frame_index: renderer.capture_frame())
+        renderer.stop_capture()
+        total_time = (time.perf_counter() - start) / frame_count
+        print(f"{'FrameCapture (PNG workers)':>28}{frame_time * 1000:>15.1f}"
+              f"  ({total_time * 1000:.1f} including writing the last frames)")
+
+
+if __name__ == "__main__":
+    main()
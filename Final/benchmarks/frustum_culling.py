@@ -0,0 +1,104 @@
+"""
+Frustum culling benchmark:
+1. render a scene of objects scattered all around the camera
+with and without frustum culling, and compare CPU time per frame and culled meshes;
+2. compare culling by testing the bounding sphere of every mesh
+with culling by the bounding volume hierarchy of the scene, while a few meshes move.
+
+Run from the Final directory:
+    python -m benchmarks.frustum_culling
+"""
+import time
+
+import OpenGL.GL as GL
+import numpy as np
+
+from benchmarks.context import create_context
+from scripts.camera.camera import Camera
+from scripts.core.mesh import Mesh
+from scripts.geometry.geometry import SphereGeometry
+from scripts.light.light import AmbientLight, DirectionalLight
+from scripts.material.phong import PhongMaterial
+from scripts.render.frustum import Frustum
+from scripts.render.renderer import Renderer
+from scripts.scene import Scene
+
+
+def build_scene(count, seed=0):
+    """ Return scene with count spheres placed randomly in a cube of side 100 around the origin """
+    random = np.random.default_rng(seed)
+    scene = Scene()
+    scene.add(AmbientLight(color=[0.1, 0.1, 0.1]))
+    directional_light = DirectionalLight(color=[0.9, 0.9, 0.9], direction=[-1, -1, -1])
+    scene.add(directional_light)
+    geometry = SphereGeometry(radius=0.5, indexed=True)
+    material = PhongMaterial(property_dict={"baseColor": [0.8, 0.4, 0.2]}, number_of_light_sources=2,
+                             use_shadow=True)
+    for position in random.uniform(-50, 50, (count, 3)):
+        mesh = Mesh(geometry, material)
+        mesh.set_position(position)
+        scene.add(mesh)
+    return scene, directional_light
+
+
+def run_frames(renderer, scene, camera, frame_count):
+    renderer.render(scene, camera)
+    GL.glFinish()
+    start = time.perf_counter()
+    for _ in range(frame_count):
+        renderer.render(scene, camera)
+    GL.glFinish()
+    return (time.perf_counter() - start) / frame_count
+
+
+def flat_cull(scene, frustum):
+    """ Test the bounding sphere of every mesh, without the hierarchy """
+    sphere_list = [mesh.world_bounding_sphere for mesh in scene.mesh_list]
+    centers = np.array([sphere[0] for sphere in sphere_list])
+    radii = np.array([sphere[1] for sphere in sphere_list])
+    inside_list = frustum.intersects_spheres(centers, radii)
+    return [mesh for mesh, inside in zip(scene.mesh_list, inside_list) if inside]
+
+
+def run_culling(scene, camera, cull, frame_count, moving_count=10):
+    frustum = Frustum.from_camera(camera)
+    moving_list = scene.mesh_list[:moving_count]
+    start = time.perf_counter()
+    for _ in range(frame_count):
+        for mesh in moving_list:
+            mesh.translate(0.01, 0, 0)
+        cull(scene, frustum)
+    return (time.perf_counter() - start) / frame_count
+
+
+def main(frame_count=10):
+    create_context()
+    camera = Camera(aspect_ratio=1)
+    print(f"{'objects':>8}{'no culling, ms':>16}{'culling, ms':>13}{'culled (shadow, main)':>24}")
+    for count in [250, 1000, 4000]:
+        scene, directional_light = build_scene(count)
+        renderer = Renderer(frustum_culling=False)
+        renderer.enable_shadows(directional_light)
+        unculled_time = run_frames(renderer, scene, camera, frame_count)
+        renderer.frustum_culling = True
+        culled_time = run_frames(renderer, scene, camera, frame_count)
+        culled_count_dict = renderer.culled_count_dict
+        culled_text = f"{culled_count_dict['shadow']}, {culled_count_dict['main']}"
+        print(f"{count:>8}{unculled_time * 1000:>16.1f}{culled_time * 1000:>13.1f}{culled_text:>24}")
+
+    print()
+    print("Culling only, 10 moving meshes")
+    print(f"{'objects':>8}{'flat, ms':>12}{'hierarchy, ms':>16}")
+    camera.update_view_matrix()
+    for count in [1000, 4000, 16000]:
+        scene, _ = build_scene(count)
+        flat_time = run_culling(scene, camera, flat_cull, frame_count)
+        hierarchy_cull = lambda scene, frustum: scene.bounding_volume_hierarchy.frustum_query(frustum)
+        # First query builds the hierarchy
+        hierarchy_cull(scene, Frustum.from_camera(camera))
+        hierarchy_time = run_culling(scene, camera, hierarchy_cull, frame_count)
+        print(f"{count:>8}{flat_time * 1000:>12.2f}{hierarchy_time * 1000:>16.2f}")
+
+
+if __name__ == "__main__":
+    main()
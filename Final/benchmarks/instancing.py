@@ -0,0 +1,84 @@
+"""
+Instancing benchmark: draw many copies of one geometry with one material
+as separate meshes (one draw call each) and as one InstancedMesh (a single draw call),
+in the shadow pass and the main pass, and compare CPU time per frame.
+
+Run from the Final directory:
+    python -m benchmarks.instancing
+"""
+import time
+
+import OpenGL.GL as GL
+import numpy as np
+
+from benchmarks.context import create_context
+from scripts.camera.camera import Camera
+from scripts.core.instanced_mesh import InstancedMesh
+from scripts.core.matrix import Matrix
+from scripts.core.mesh import Mesh
+from scripts.geometry.geometry import BoxGeometry
+from scripts.light.light import AmbientLight, DirectionalLight
+from scripts.material.phong import PhongMaterial
+from scripts.render.renderer import Renderer
+from scripts.scene import Scene
+
+
+def grid_matrices(count):
+    """ Return translation matrices of count objects placed on a square grid """
+    side = int(np.ceil(np.sqrt(count)))
+    matrix_list = []
+    for i in range(count):
+        matrix_list.append(Matrix.make_translation(i % side - side / 2, 0, i // side - side / 2))
+    return np.array(matrix_list, dtype=np.float32)
+
+
+def build_scene(count, instanced):
+    scene = Scene()
+    scene.add(AmbientLight(color=[0.1, 0.1, 0.1]))
+    directional_light = DirectionalLight(color=[0.9, 0.9, 0.9], direction=[-1, -1, -1])
+    scene.add(directional_light)
+    geometry = BoxGeometry(0.5, 0.5, 0.5)
+    matrices = grid_matrices(count)
+    if instanced:
+        material = PhongMaterial(property_dict={"baseColor": [0.8, 0.4, 0.2]}, number_of_light_sources=2,
+                                 use_shadow=True, instanced=True)
+        scene.add(InstancedMesh(geometry, material, matrices))
+    else:
+        material = PhongMaterial(property_dict={"baseColor": [0.8, 0.4, 0.2]}, number_of_light_sources=2,
+                                 use_shadow=True)
+        for matrix in matrices:
+            mesh = Mesh(geometry, material)
+            mesh.local_matrix = matrix
+            scene.add(mesh)
+    return scene, directional_light
+
+
+def run_frames(renderer, scene, camera, frame_count):
+    # Warm up: first frame compiles shader variants in the driver
+    renderer.render(scene, camera)
+    GL.glFinish()
+    start = time.perf_counter()
+    for _ in range(frame_count):
+        renderer.render(scene, camera)
+    GL.glFinish()
+    return (time.perf_counter() - start) / frame_count
+
+
+def main(frame_count=10):
+    create_context()
+    camera = Camera(aspect_ratio=1)
+    camera.set_position([0, 20, 40])
+    camera.look_at([0, 0, 0])
+    print(f"{'objects':>8}{'meshes, ms':>13}{'instanced, ms':>16}{'speedup':>10}")
+    for count in [100, 400, 1600]:
+        time_list = []
+        for instanced in [False, True]:
+            scene, directional_light = build_scene(count, instanced)
+            renderer = Renderer()
+            renderer.enable_shadows(directional_light)
+            time_list.append(run_frames(renderer, scene, camera, frame_count))
+        print(f"{count:>8}{time_list[0] * 1000:>13.1f}{time_list[1] * 1000:>16.1f}{time_list[0] / time_list[1]:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Level-of-detail benchmark: render rows of spheres receding from the camera,
+once with the finest tessellation for all spheres and once with LODMesh,
+and compare time per frame and the number of triangles of the selected levels.
+
+Run from the Final directory:
+    python -m benchmarks.level_of_detail
+"""
+import time
+
+import OpenGL.GL as GL
+
+from benchmarks.context import create_context
+from scripts.camera.camera import Camera
+from scripts.core.lod_mesh import LODMesh
+from scripts.core.mesh import Mesh
+from scripts.geometry.geometry import SphereGeometry
+from scripts.light.light import AmbientLight, DirectionalLight
+from scripts.material.phong import PhongMaterial
+from scripts.render.renderer import Renderer
+from scripts.scene import Scene
+
+
+def build_scene(row_count, use_levels):
+    scene = Scene()
+    scene.add(AmbientLight(color=[0.1, 0.1, 0.1]))
+    directional_light = DirectionalLight(color=[0.9, 0.9, 0.9], direction=[-1, -1, -1])
+    scene.add(directional_light)
+    geometry_list = SphereGeometry.make_levels(radius=0.5)
+    material = PhongMaterial(property_dict={"baseColor": [0.8, 0.4, 0.2]}, number_of_light_sources=2,
+                             use_shadow=True)
+    for row in range(row_count):
+        for column in range(-5, 6):
+            if use_levels:
+                mesh = LODMesh(geometry_list, material)
+            else:
+                mesh = Mesh(geometry_list[0], material)
+            mesh.set_position([column * 1.5, 0, -row * 3])
+            scene.add(mesh)
+    return scene, directional_light
+
+
+def run_frames(renderer, scene, camera, frame_count):
+    renderer.render(scene, camera)
+    GL.glFinish()
+    start = time.perf_counter()
+    for _ in range(frame_count):
+        renderer.render(scene, camera)
+    GL.glFinish()
+    return (time.perf_counter() - start) / frame_count
+
+
+def main(frame_count=10):
+    create_context((512, 512))
+    camera = Camera(aspect_ratio=1)
+    camera.set_position([0, 2, 6])
+    print(f"{'spheres':>8}{'finest, ms':>13}{'levels, ms':>13}{'finest triangles':>19}{'level triangles':>18}")
+    for row_count in [5, 20, 40]:
+        result_list = []
+        for use_levels in [False, True]:
+            scene, directional_light = build_scene(row_count, use_levels)
+            renderer = Renderer()
+            renderer.enable_shadows(directional_light)
+            frame_time = run_frames(renderer, scene, camera, frame_count)
+            triangle_count = sum(mesh.geometry.index_count // 3 for mesh in scene.mesh_list)
+            result_list.append((frame_time, triangle_count))
+        (finest_time, finest_count), (level_time, level_count) = result_list
+        print(f"{row_count * 11:>8}{finest_time * 1000:>13.1f}{level_time * 1000:>13.1f}"
+              f"{finest_count:>19}{level_count:>18}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+"""
+Compare cold (parse and store in cache) and warm (load from cache) OBJGeometry loads.
+
+Run from the Final directory:
+    python -m benchmarks.obj_cache
+"""
+import time
+
+from benchmarks.context import create_context
+from scripts.geometry.cache import GeometryCache
+from scripts.geometry.geometry import OBJGeometry
+
+FILE_NAME = "./model/satellite_obj.obj"
+SIZE = 0.1
+
+
+def measure(make_geometry):
+    start = time.perf_counter()
+    geometry = make_geometry()
+    return time.perf_counter() - start, geometry
+
+
+def main(repeat=5):
+    create_context()
+    uncached_time, _ = measure(lambda: OBJGeometry(size=SIZE, file_name=FILE_NAME, use_cache=False))
+    GeometryCache.clear(FILE_NAME)
+    cold_time, geometry = measure(lambda: OBJGeometry(size=SIZE, file_name=FILE_NAME))
+    warm_time = min(measure(lambda: OBJGeometry(size=SIZE, file_name=FILE_NAME))[0] for _ in range(repeat))
+    print(f"vertices:              {geometry.vertex_count}")
+    print(f"without cache:         {uncached_time:.4f} s")
+    print(f"cold (parse + store):  {cold_time:.4f} s")
+    print(f"warm (memory-mapped):  {warm_time:.4f} s")
+    print(f"speedup:               {uncached_time / warm_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
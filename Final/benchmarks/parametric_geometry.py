@@ -0,0 +1,45 @@
+"""
+Compare the vectorized and the per-point tessellation paths of ParametricGeometry.
+
+Run from the Final directory:
+    python -m benchmarks.parametric_geometry
+"""
+import time
+
+from benchmarks.context import create_context
+from scripts.geometry.geometry import EllipsoidGeometry, SphereGeometry
+
+# (theta_segments, phi_segments)
+RESOLUTIONS = [(16, 32), (32, 64), (64, 128), (128, 256), (256, 512)]
+
+
+def measure(make_geometry, repeat=3):
+    """ Return the best time in seconds of several geometry builds """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        make_geometry()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    create_context()
+    geometry_classes = {
+        "SphereGeometry": lambda theta, phi, vectorized:
+            SphereGeometry(radius=1, theta_segments=theta, phi_segments=phi, vectorized=vectorized),
+        "EllipsoidGeometry": lambda theta, phi, vectorized:
+            EllipsoidGeometry(width=1, height=2, depth=3, theta_segments=theta, phi_segments=phi, vectorized=vectorized),
+    }
+    print(f"{'geometry':<20}{'segments':>12}{'vertices':>12}{'per-point, s':>16}{'vectorized, s':>16}{'speedup':>10}")
+    for name, make_geometry in geometry_classes.items():
+        for theta, phi in RESOLUTIONS:
+            per_point_time = measure(lambda: make_geometry(theta, phi, False), repeat=1)
+            vectorized_time = measure(lambda: make_geometry(theta, phi, True))
+            vertex_count = 6 * theta * phi
+            print(f"{name:<20}{f'{theta}x{phi}':>12}{vertex_count:>12}"
+                  f"{per_point_time:>16.4f}{vectorized_time:>16.4f}{per_point_time / vectorized_time:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
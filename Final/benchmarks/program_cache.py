@@ -0,0 +1,58 @@
+"""
+Shader program cache benchmark: time to create the materials of a scene
+1. compiling every program (no sharing, as without the cache),
+2. sharing programs of identical shader code, compiling each program once,
+3. sharing programs and loading them from the on-disk binary cache.
+
+Run from the Final directory:
+    python -m benchmarks.program_cache
+"""
+import time
+
+from benchmarks.context import create_context
+from scripts.core.program_cache import ProgramCache
+from scripts.material.phong import PhongMaterial
+from scripts.material.texture_material import TextureMaterial
+from scripts.material.texture import Texture
+
+
+def create_materials(texture, material_count):
+    material_list = []
+    for i in range(material_count):
+        material_list.append(PhongMaterial(texture=texture, number_of_light_sources=2, use_shadow=True))
+        material_list.append(PhongMaterial(property_dict={"baseColor": [i / material_count, 0.5, 0.5]},
+                                           number_of_light_sources=2))
+        material_list.append(TextureMaterial(texture=texture))
+    return material_list
+
+
+def run(texture, material_count, share, use_binary_cache):
+    ProgramCache.clear()
+    ProgramCache.reset_statistics()
+    ProgramCache.use_binary_cache = use_binary_cache
+    start = time.perf_counter()
+    if share:
+        create_materials(texture, material_count)
+    else:
+        for _ in range(material_count):
+            ProgramCache.clear()
+            create_materials(texture, 1)
+    return time.perf_counter() - start, ProgramCache.get_statistics()
+
+
+def main(material_count=10):
+    create_context()
+    texture = Texture("images/crate.jpg")
+    # Fill the binary cache
+    run(texture, 1, True, True)
+    print(f"{'mode':>24}{'total, ms':>12}{'compiled':>10}{'from binary':>13}")
+    for name, share, use_binary_cache in [("compile all", False, False),
+                                          ("share", True, False),
+                                          ("share + binary cache", True, True)]:
+        total_time, statistics = run(texture, material_count, share, use_binary_cache)
+        print(f"{name:>24}{total_time * 1000:>12.1f}{statistics['compile_count']:>10}"
+              f"{statistics['binary_load_count']:>13}")
+
+
+if __name__ == "__main__":
+    main()
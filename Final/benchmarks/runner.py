@@ -0,0 +1,277 @@
+"""
+Scripted benchmark runner: render standard scenes along a fixed camera path and write
+per-frame CPU time, frame time, draw calls and triangles as JSON, so that performance
+regressions can be found on machines without display or GPU (e.g. Mesa llvmpipe).
+
+Scenes:
+    planet       the scene of main.py (sky, sun, earth, moon, satellite)
+    sphere_grid  a grid of --spheres spheres on a ground plate, with cascaded shadows
+    satellite    the satellite OBJ model
+
+By default an EGL context without display is used; --window uses a hidden window instead.
+The camera circles the scene once during the measured frames. When several scenes are given,
+each one runs in its own process, so that caches and contexts of one scene do not affect the next.
+With --profile, the CPU and GPU times of the render passes (measured by a Profiler) are added.
+
+Run from the Final directory:
+    python -m benchmarks.runner --scene planet sphere_grid satellite --frames 120 --output results.json
+"""
+import argparse
+import json
+import math
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from scripts.core.headless_context import HeadlessContext
+
+SCENE_NAME_LIST = ["planet", "sphere_grid", "satellite"]
+
+
+def parse_arguments(argument_list=None):
+    parser = argparse.ArgumentParser(description="Render scenes along a fixed camera path and report frame statistics")
+    parser.add_argument("--scene", nargs="+", default=SCENE_NAME_LIST, choices=SCENE_NAME_LIST)
+    parser.add_argument("--frames", type=int, default=120, help="number of measured frames")
+    parser.add_argument("--warmup", type=int, default=5, help="frames rendered before measuring")
+    parser.add_argument("--size", type=int, nargs=2, default=[800, 600], metavar=("WIDTH", "HEIGHT"))
+    parser.add_argument("--spheres", type=int, default=400, help="number of spheres of the sphere_grid scene")
+    parser.add_argument("--window", action="store_true", help="use a hidden window instead of a headless context")
+    parser.add_argument("--platform", default="egl", choices=HeadlessContext.PLATFORM_LIST,
+                        help="library of the headless context")
+    parser.add_argument("--profile", action="store_true",
+                        help="add CPU and GPU times of the passes, averaged over the measured frames")
+    parser.add_argument("--output", default=None, help="JSON file to write (default: standard output)")
+    return parser.parse_args(argument_list)
+
+
+def create_context(arguments):
+    """ Return the render target to draw to: None for a window, else a RenderTarget of a headless context """
+    # Imported only after the platform has been selected
+    from scripts.render.render_target import RenderTarget
+    if arguments.window:
+        from benchmarks.context import create_context as create_window_context
+        create_window_context(tuple(arguments.size))
+        return None
+    HeadlessContext()
+    return RenderTarget(tuple(arguments.size))
+
+
+def orbit(camera_object, frame_index, frame_count, radius, height, target=(0, 0, 0)):
+    """ Place the object on a circle around the target, looking at the target """
+    angle = 2 * math.pi * frame_index / max(frame_count, 1)
+    camera_object.set_position([target[0] + radius * math.sin(angle), target[1] + height,
+                                target[2] + radius * math.cos(angle)])
+    camera_object.look_at(target)
+
+
+def build_planet_scene(arguments):
+    """ Return (renderer, function rendering frame with given index) of the scene of main.py """
+    from main import Example
+    example = Example(screen_size=arguments.size, asynchronous_loading=False, headless=not arguments.window)
+    example.initialize()
+
+    def render_frame(frame_index, frame_count):
+        # Animation of main.py with a fixed time step
+        example.delta_time = 1 / 60
+        orbit(example.rig, frame_index, frame_count, radius=15, height=2)
+        example.update()
+
+    return example.renderer, render_frame
+
+
+def build_sphere_grid_scene(arguments):
+    """ Return (renderer, function rendering frame with given index) of a grid of spheres with shadows """
+    from scripts.camera.camera import Camera
+    from scripts.core.mesh import Mesh
+    from scripts.geometry.geometry import BoxGeometry, SphereGeometry
+    from scripts.light.light import AmbientLight, DirectionalLight
+    from scripts.material.phong import PhongMaterial
+    from scripts.render.renderer import Renderer
+    from scripts.scene import Scene
+    render_target = create_context(arguments)
+    scene = Scene()
+    scene.add(AmbientLight(color=[0.1, 0.1, 0.1]))
+    directional_light = DirectionalLight(color=[0.9, 0.9, 0.9], direction=[-1, -1, -0.5])
+    scene.add(directional_light)
+    material = PhongMaterial(property_dict={"baseColor": [0.8, 0.4, 0.2]}, number_of_light_sources=2,
+                             use_shadow=True, cascaded_shadow=True)
+    size = math.ceil(math.sqrt(arguments.spheres))
+    spacing = 1.5
+    extent = size * spacing / 2
+    ground = Mesh(BoxGeometry(2 * extent + 2, 0.2, 2 * extent + 2), material)
+    ground.set_position([0, -0.1, 0])
+    scene.add(ground)
+    geometry = SphereGeometry(radius=0.5, indexed=True)
+    for index in range(arguments.spheres):
+        mesh = Mesh(geometry, material)
+        mesh.set_position([(index % size + 0.5) * spacing - extent, 0.5, (index // size + 0.5) * spacing - extent])
+        scene.add(mesh)
+    camera = Camera(aspect_ratio=arguments.size[0] / arguments.size[1])
+    scene.add(camera)
+    renderer = Renderer(default_render_target=render_target)
+    renderer.enable_shadows(directional_light, resolution=(1024, 1024), cascade_count=4)
+
+    def render_frame(frame_index, frame_count):
+        orbit(camera, frame_index, frame_count, radius=extent * 1.5, height=extent * 0.75)
+        renderer.render(scene, camera)
+
+    return renderer, render_frame
+
+
+def build_satellite_scene(arguments):
+    """ Return (renderer, function rendering frame with given index) of the satellite model """
+    from scripts.camera.camera import Camera
+    from scripts.core.mesh import Mesh
+    from scripts.geometry.geometry import OBJGeometry
+    from scripts.light.light import AmbientLight, DirectionalLight
+    from scripts.material.phong import PhongMaterial
+    from scripts.render.renderer import Renderer
+    from scripts.scene import Scene
+    render_target = create_context(arguments)
+    scene = Scene()
+    scene.add(AmbientLight(color=[0.2, 0.2, 0.2]))
+    scene.add(DirectionalLight(color=[0.8, 0.8, 0.8], direction=[-1, -1, -1]))
+    geometry = OBJGeometry()
+    satellite = Mesh(geometry, PhongMaterial(property_dict={"baseColor": [0.8, 0.8, 0.7]}, number_of_light_sources=2))
+    scene.add(satellite)
+    center, radius = geometry.bounding_sphere
+    camera = Camera(aspect_ratio=arguments.size[0] / arguments.size[1])
+    scene.add(camera)
+    renderer = Renderer(default_render_target=render_target)
+
+    def render_frame(frame_index, frame_count):
+        orbit(camera, frame_index, frame_count, radius=radius * 2.5, height=radius * 0.5, target=center)
+        renderer.render(scene, camera)
+
+    return renderer, render_frame
+
+
+SCENE_BUILDER_DICT = {
+    "planet": build_planet_scene,
+    "sphere_grid": build_sphere_grid_scene,
+    "satellite": build_satellite_scene,
+}
+
+
+def summarize(value_list):
+    ordered_list = sorted(value_list)
+    return {
+        "mean": statistics.fmean(ordered_list),
+        "median": statistics.median(ordered_list),
+        "p95": ordered_list[min(len(ordered_list) - 1, int(0.95 * len(ordered_list)))],
+        "max": ordered_list[-1],
+    }
+
+
+def run_scene(scene_name, arguments):
+    """ Render the scene in this process and return its results """
+    start = time.perf_counter()
+    renderer, render_frame = SCENE_BUILDER_DICT[scene_name](arguments)
+    import OpenGL.GL as GL
+    from scripts.core.profiler import Profiler
+    from scripts.core.utils import Utils
+    GL.glFinish()
+    setup_time = time.perf_counter() - start
+    # Warm-up frames upload textures and fill caches; the camera starts on its path
+    for _ in range(arguments.warmup):
+        render_frame(0, arguments.frames)
+    GL.glFinish()
+    profiler = None
+    if arguments.profile:
+        profiler = Profiler(history_length=arguments.frames)
+        renderer.profiler = profiler
+    frame_list = []
+    for frame_index in range(arguments.frames):
+        start = time.perf_counter()
+        if profiler is not None:
+            profiler.begin_frame()
+        render_frame(frame_index, arguments.frames)
+        if profiler is not None:
+            profiler.end_frame()
+        # Time until all commands are issued, then until they are executed
+        cpu_time = time.perf_counter() - start
+        GL.glFinish()
+        frame_time = time.perf_counter() - start
+        frame_list.append({
+            "frame": frame_index,
+            "cpu_time_ms": cpu_time * 1000,
+            "frame_time_ms": frame_time * 1000,
+            "draw_calls": renderer.draw_call_count,
+            "triangles": renderer.triangle_count,
+        })
+    system_info = Utils.get_system_info()
+    result = {
+        "scene": scene_name,
+        "renderer": system_info.renderer,
+        "opengl": system_info.opengl,
+        "headless": not arguments.window,
+        "size": list(arguments.size),
+        "setup_time_ms": setup_time * 1000,
+        "summary": {
+            "cpu_time_ms": summarize([frame["cpu_time_ms"] for frame in frame_list]),
+            "frame_time_ms": summarize([frame["frame_time_ms"] for frame in frame_list]),
+            "draw_calls": summarize([frame["draw_calls"] for frame in frame_list]),
+            "triangles": summarize([frame["triangles"] for frame in frame_list]),
+        },
+        "frames": frame_list,
+    }
+    if profiler is not None:
+        profiler.flush()
+        result["profile"] = profiler.get_averages(arguments.frames)
+    return result
+
+
+def run_scene_process(scene_name, argument_list):
+    """ Run one scene in a new process and return its results """
+    with tempfile.TemporaryDirectory() as directory_name:
+        output_file_name = os.path.join(directory_name, "result.json")
+        command = [sys.executable, "-m", "benchmarks.runner", *argument_list,
+                   "--scene", scene_name, "--output", output_file_name]
+        # Messages of the scene (system information, statistics) are not mixed into the results
+        subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+        with open(output_file_name) as output_file:
+            return json.load(output_file)["scenes"][0]
+
+
+def main(argument_list=None):
+    if argument_list is None:
+        argument_list = sys.argv[1:]
+    arguments = parse_arguments(argument_list)
+    if len(arguments.scene) > 1:
+        # Pass all options except the scene names and output to each process
+        child_argument_list = parse_child_arguments(argument_list)
+        result_list = [run_scene_process(scene_name, child_argument_list) for scene_name in arguments.scene]
+    else:
+        if not arguments.window:
+            HeadlessContext.select_platform(arguments.platform)
+        result_list = [run_scene(arguments.scene[0], arguments)]
+        # Short report for people reading the console; each scene process reports its own scene
+        summary = result_list[0]["summary"]
+        print(f"{arguments.scene[0]:>12}: {summary['frame_time_ms']['mean']:.1f} ms per frame "
+              f"({summary['cpu_time_ms']['mean']:.1f} ms CPU), {summary['draw_calls']['mean']:.0f} draw calls, "
+              f"{summary['triangles']['mean']:.0f} triangles", file=sys.stderr)
+    text = json.dumps({"scenes": result_list}, indent=2)
+    if arguments.output is None:
+        print(text)
+    else:
+        with open(arguments.output, "w") as output_file:
+            output_file.write(text)
+
+
+def parse_child_arguments(argument_list):
+    """ Return the arguments without the values of --scene and --output """
+    child_argument_list = []
+    skipping = False
+    for argument in argument_list:
+        if argument.startswith("--"):
+            skipping = argument in ("--scene", "--output")
+        if not skipping:
+            child_argument_list.append(argument)
+    return child_argument_list
+
+
+if __name__ == "__main__":
+    main()
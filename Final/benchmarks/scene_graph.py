@@ -0,0 +1,97 @@
+"""
+Scene graph stress test:
+1. read the global matrices of thousands of nodes per frame,
+as the renderer does in the shadow pass and the main pass,
+with cached global matrices and with recalculation on every access;
+2. collect the lights of the scene per frame,
+with the cached lists of the scene and with a traversal of the whole scene graph.
+
+Run from the Final directory:
+    python -m benchmarks.scene_graph
+"""
+import time
+
+from scripts.core.object3d import Object3D
+from scripts.light.light import Light
+from scripts.scene import Scene
+
+
+def uncached_global_matrix(node):
+    """ Recalculate the global matrix through the whole parent chain, as without caching """
+    if node.parent is None:
+        return node.local_matrix
+    return uncached_global_matrix(node.parent) @ node.local_matrix
+
+
+def uncached_light_list(scene):
+    """ Traverse the whole scene graph and filter lights, as without caching """
+    descendant_list = []
+    nodes_to_process = [scene]
+    while len(nodes_to_process) > 0:
+        node = nodes_to_process.pop(0)
+        descendant_list.append(node)
+        nodes_to_process = node.children_list + nodes_to_process
+    return [node for node in descendant_list if isinstance(node, Light)]
+
+
+def build_scene(chain_count, chain_depth):
+    """ Return scene, list of all nodes and list of chain roots """
+    scene = Scene()
+    node_list = []
+    root_list = []
+    for i in range(chain_count):
+        parent = scene
+        for depth in range(chain_depth):
+            node = Light() if depth == chain_depth - 1 else Object3D()
+            node.translate(0.1, 0, 0)
+            parent.add(node)
+            node_list.append(node)
+            if depth == 0:
+                root_list.append(node)
+            parent = node
+    return scene, node_list, root_list
+
+
+def run_frames(node_list, root_list, get_global_matrix, frame_count, animated_fraction):
+    animated_list = root_list[:int(len(root_list) * animated_fraction)]
+    start = time.perf_counter()
+    for _ in range(frame_count):
+        for node in animated_list:
+            node.rotate_y(0.01)
+        # shadow pass and main pass
+        for _ in range(2):
+            for node in node_list:
+                get_global_matrix(node)
+    return (time.perf_counter() - start) / frame_count
+
+
+def run_traversals(scene, get_light_list, frame_count):
+    start = time.perf_counter()
+    for _ in range(frame_count):
+        get_light_list(scene)
+    return (time.perf_counter() - start) / frame_count
+
+
+def main(frame_count=10):
+    print("Global matrices")
+    print(f"{'nodes':>8}{'depth':>8}{'animated':>10}{'uncached, ms':>15}{'cached, ms':>13}{'speedup':>10}")
+    for chain_count, chain_depth in [(500, 4), (500, 8), (1000, 8), (500, 16)]:
+        for animated_fraction in [0.1, 1.0]:
+            scene, node_list, root_list = build_scene(chain_count, chain_depth)
+            uncached_time = run_frames(node_list, root_list, uncached_global_matrix, frame_count, animated_fraction)
+            cached_time = run_frames(node_list, root_list, lambda node: node.global_matrix, frame_count, animated_fraction)
+            print(f"{len(node_list):>8}{chain_depth:>8}{animated_fraction:>10.0%}"
+                  f"{uncached_time * 1000:>15.1f}{cached_time * 1000:>13.1f}{uncached_time / cached_time:>10.1f}")
+
+    print()
+    print("Scene traversal")
+    print(f"{'nodes':>8}{'uncached, ms':>15}{'cached, ms':>13}")
+    for chain_count, chain_depth in [(250, 4), (500, 4), (1000, 4), (2000, 4)]:
+        scene, node_list, root_list = build_scene(chain_count, chain_depth)
+        uncached_time = run_traversals(scene, uncached_light_list, frame_count)
+        cached_time = run_traversals(scene, lambda scene: scene.light_list, frame_count)
+        print(f"{len(node_list):>8}{uncached_time * 1000:>15.2f}{cached_time * 1000:>13.4f}")
+
+
+if __name__ == "__main__":
+    main()
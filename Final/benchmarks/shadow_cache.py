@@ -0,0 +1,75 @@
+"""
+Shadow map caching benchmark: render a grid of spheres with shadows, once with all
+shadow casters static (the shadow pass is skipped after the first frame) and once
+with one sphere moving every frame (the shadow map is rendered again each frame),
+and compare time per frame and the number of frames with a shadow pass.
+
+Run from the Final directory:
+    python -m benchmarks.shadow_cache
+"""
+import time
+
+import OpenGL.GL as GL
+
+from benchmarks.context import create_context
+from scripts.camera.camera import Camera
+from scripts.core.mesh import Mesh
+from scripts.geometry.geometry import SphereGeometry
+from scripts.light.light import AmbientLight, DirectionalLight
+from scripts.material.phong import PhongMaterial
+from scripts.render.renderer import Renderer
+from scripts.scene import Scene
+
+
+def build_scene(size):
+    scene = Scene()
+    scene.add(AmbientLight(color=[0.1, 0.1, 0.1]))
+    directional_light = DirectionalLight(color=[0.9, 0.9, 0.9], direction=[-1, -1, -1])
+    scene.add(directional_light)
+    geometry = SphereGeometry(radius=0.3, indexed=True)
+    material = PhongMaterial(property_dict={"baseColor": [0.8, 0.4, 0.2]}, number_of_light_sources=2,
+                             use_shadow=True)
+    mesh_list = []
+    for row in range(size):
+        for column in range(size):
+            mesh = Mesh(geometry, material)
+            mesh.set_position([(column - size / 2) * 0.8, 0, (row - size / 2) * 0.8])
+            scene.add(mesh)
+            mesh_list.append(mesh)
+    return scene, directional_light, mesh_list
+
+
+def run_frames(renderer, scene, camera, frame_count, moving_mesh=None):
+    renderer.render(scene, camera)
+    GL.glFinish()
+    shadow_pass_count = 0
+    start = time.perf_counter()
+    for _ in range(frame_count):
+        if moving_mesh is not None:
+            moving_mesh.translate(0, 0.001, 0)
+        renderer.render(scene, camera)
+        shadow_pass_count += renderer.shadow_map_updated
+    GL.glFinish()
+    return (time.perf_counter() - start) / frame_count, shadow_pass_count
+
+
+def main(frame_count=20):
+    create_context((512, 512))
+    camera = Camera(aspect_ratio=1)
+    camera.set_position([0, 6, 10])
+    camera.look_at([0, 0, 0])
+    print(f"{'spheres':>8}{'static, ms':>13}{'passes':>8}{'moving, ms':>13}{'passes':>8}")
+    for size in [5, 10, 20]:
+        scene, directional_light, mesh_list = build_scene(size)
+        renderer = Renderer()
+        renderer.enable_shadows(directional_light)
+        static_time, static_count = run_frames(renderer, scene, camera, frame_count)
+        # Move the sphere in the middle of the grid, which casts a shadow
+        moving_mesh = mesh_list[(size // 2) * size + size // 2]
+        moving_time, moving_count = run_frames(renderer, scene, camera, frame_count, moving_mesh)
+        print(f"{size * size:>8}{static_time * 1000:>13.1f}{static_count:>8}"
+              f"{moving_time * 1000:>13.1f}{moving_count:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Streaming texture benchmark: replace the content of a texture every frame
+1. by drawing into a pygame surface and calling Texture.upload_data
+(string conversion of the surface, storage reallocation and mipmap generation),
+2. with StreamingTexture.update from a numpy array (pixel unpack buffers and glTexSubImage2D).
+
+Run from the Final directory:
+    python -m benchmarks.streaming_texture
+"""
+import time
+
+import OpenGL.GL as GL
+import numpy as np
+import pygame
+
+from benchmarks.context import create_context
+from scripts.material.streaming_texture import StreamingTexture
+from scripts.material.texture import Texture
+
+
+def run_surface(size, frame_count):
+    texture = Texture()
+    surface = pygame.Surface((size, size), pygame.SRCALPHA)
+    texture.surface = surface
+    start = time.perf_counter()
+    for frame in range(frame_count):
+        surface.fill((frame % 256, 0, 0, 255))
+        texture.upload_data()
+    GL.glFinish()
+    texture.delete()
+    return (time.perf_counter() - start) / frame_count
+
+
+def run_streaming(size, frame_count):
+    texture = StreamingTexture(size, size)
+    pixel_data = np.zeros((size, size, 4), dtype=np.uint8)
+    start = time.perf_counter()
+    for frame in range(frame_count):
+        pixel_data[:, :, 0] = frame % 256
+        texture.update(pixel_data)
+    GL.glFinish()
+    texture.delete()
+    return (time.perf_counter() - start) / frame_count
+
+
+def main(frame_count=20):
+    create_context()
+    print(f"{'size':>6}{'surface upload, ms':>20}{'streaming, ms':>15}")
+    for size in [256, 512, 1024, 2048]:
+        surface_time = run_surface(size, frame_count)
+        streaming_time = run_streaming(size, frame_count)
+        print(f"{size:>6}{surface_time * 1000:>20.2f}{streaming_time * 1000:>15.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""
+Texture cache benchmark: create materials that use a few shared images,
+loading a new texture for every material and sharing textures through TextureCache,
+and compare loading time and GPU memory used by textures.
+
+Run from the Final directory:
+    python -m benchmarks.texture_cache
+"""
+import time
+
+from benchmarks.context import create_context
+from scripts.material.phong import PhongMaterial
+from scripts.material.texture import Texture
+from scripts.material.texture_cache import TextureCache
+
+FILE_NAMES = ["images/earth.jpeg", "images/moon.png", "images/crate.jpg"]
+
+
+def run(material_count, get_texture):
+    memory_size = Texture.get_total_memory_size()
+    texture_list = []
+    start = time.perf_counter()
+    for i in range(material_count):
+        texture = get_texture(FILE_NAMES[i % len(FILE_NAMES)])
+        texture_list.append(texture)
+        PhongMaterial(texture=texture, number_of_light_sources=2)
+    elapsed_time = time.perf_counter() - start
+    used_memory_size = Texture.get_total_memory_size() - memory_size
+    return elapsed_time, used_memory_size, texture_list
+
+
+def main():
+    create_context()
+    print(f"{'materials':>10}{'new, ms':>10}{'new, MiB':>10}{'cached, ms':>12}{'cached, MiB':>13}")
+    for material_count in [3, 12, 30]:
+        new_time, new_memory_size, texture_list = run(material_count, Texture)
+        for texture in texture_list:
+            texture.delete()
+        cached_time, cached_memory_size, texture_list = run(material_count, TextureCache.acquire)
+        for texture in texture_list:
+            TextureCache.release(texture)
+        print(f"{material_count:>10}{new_time * 1000:>10.0f}{new_memory_size / 2 ** 20:>10.1f}"
+              f"{cached_time * 1000:>12.0f}{cached_memory_size / 2 ** 20:>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Texture loading benchmark: time from the start of scene creation to the first rendered frame,
+and until all textures are loaded, with synchronous and asynchronous (background thread) loading
+of the large images of the main scene.
+
+Run from the Final directory:
+    python -m benchmarks.texture_loading
+"""
+import time
+
+import OpenGL.GL as GL
+
+from benchmarks.context import create_context
+from scripts.camera.camera import Camera
+from scripts.core.mesh import Mesh
+from scripts.geometry.geometry import SphereGeometry
+from scripts.light.light import AmbientLight, DirectionalLight
+from scripts.material.phong import PhongMaterial
+from scripts.material.texture_cache import TextureCache
+from scripts.material.texture_loader import TextureLoader
+from scripts.material.texture_material import TextureMaterial
+from scripts.render.renderer import Renderer
+from scripts.scene import Scene
+
+FILE_NAMES = ["images/earth.jpeg", "images/sun.jpeg", "images/moon.png", "images/crate.jpg"]
+
+
+def build_scene(asynchronous):
+    scene = Scene()
+    scene.add(AmbientLight(color=[0.1, 0.1, 0.1]))
+    scene.add(DirectionalLight(color=[0.9, 0.9, 0.9], direction=[-1, -1, -1]))
+    geometry = SphereGeometry(indexed=True)
+    sky_texture = TextureCache.acquire("images/space.jpg", asynchronous=asynchronous)
+    scene.add(Mesh(SphereGeometry(radius=50, indexed=True), TextureMaterial(texture=sky_texture)))
+    for i, file_name in enumerate(FILE_NAMES):
+        texture = TextureCache.acquire(file_name, asynchronous=asynchronous)
+        mesh = Mesh(geometry, PhongMaterial(texture=texture, number_of_light_sources=2))
+        mesh.set_position([i * 3 - 4.5, 0, -5])
+        scene.add(mesh)
+    return scene
+
+
+def run(asynchronous, renderer, camera):
+    """ Return seconds to the first frame and seconds until all textures are loaded """
+    TextureCache.clear()
+    start = time.perf_counter()
+    scene = build_scene(asynchronous)
+    renderer.render(scene, camera)
+    GL.glFinish()
+    first_frame_time = time.perf_counter() - start
+    while TextureLoader.get_pending_count() > 0:
+        renderer.render(scene, camera)
+    GL.glFinish()
+    return first_frame_time, time.perf_counter() - start
+
+
+def main(repeat_count=3):
+    create_context((256, 256))
+    renderer = Renderer()
+    camera = Camera(aspect_ratio=1)
+    # Warm up: compile shader programs and read the image files into the file system cache
+    run(False, renderer, camera)
+    print(f"{'loading':>14}{'first frame, ms':>18}{'all loaded, ms':>17}")
+    for asynchronous in [False, True]:
+        time_list = [run(asynchronous, renderer, camera) for _ in range(repeat_count)]
+        first_frame_time = min(first_frame_time for first_frame_time, _ in time_list)
+        loaded_time = min(loaded_time for _, loaded_time in time_list)
+        print(f"{'asynchronous' if asynchronous else 'synchronous':>14}"
+              f"{first_frame_time * 1000:>18.0f}{loaded_time * 1000:>17.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Transform store benchmark: animate 10,000 bodies (each turning around its own axis and
+orbiting the center of its group) and compute their world matrices, once with
+Object3D nodes, each transformed by its own methods, and once with the nodes bound to
+a TransformStore and transformed by its batched methods; compare time per frame.
+
+Run from the Final directory:
+    python -m benchmarks.transform_store
+"""
+import time
+
+import numpy as np
+
+from scripts.core.object3d import Object3D
+from scripts.core.transform_store import TransformStore
+
+
+def build_scene(body_count, group_size=100):
+    """ Return (root, groups, bodies): groups of bodies below a root """
+    root = Object3D()
+    group_list = []
+    body_list = []
+    for group_index in range(body_count // group_size):
+        group = Object3D()
+        group.set_position([group_index % 10 * 20, 0, group_index // 10 * 20])
+        root.add(group)
+        group_list.append(group)
+        for body_index in range(group_size):
+            body = Object3D()
+            body.set_position([1 + body_index * 0.1, 0, 0])
+            group.add(body)
+            body_list.append(body)
+    return root, group_list, body_list
+
+
+def animate_nodes(group_list, body_list, delta_time):
+    for group in group_list:
+        group.rotate_y(0.1 * delta_time)
+    for body in body_list:
+        body.rotate_y(0.6 * delta_time)
+        body.rotate_y(0.3 * delta_time, False)
+    return [body.global_matrix for body in body_list]
+
+
+def animate_store(store, group_slots, body_slots, delta_time):
+    store.rotate(group_slots, "y", 0.1 * delta_time)
+    store.rotate(body_slots, "y", 0.6 * delta_time)
+    store.rotate(body_slots, "y", 0.3 * delta_time, local=False)
+    return store.get_world_matrices(body_slots)
+
+
+def check_mixed_chain(step_count=50, by_unbinding=False):
+    """
+    Return the largest difference of world matrices and the number of stale versions of a chain
+    alternating between bound and unbound nodes, compared with an unbound chain, over random rotations.
+    With by_unbinding, all nodes are bound (children first) and every other node is unbound again.
+    """
+    generator = np.random.default_rng(1)
+    chain_list = []
+    for bind in (False, True):
+        store = TransformStore()
+        node_list = [Object3D() for _ in range(6)]
+        for parent, child in zip(node_list, node_list[1:]):
+            child.set_position([1, 0, 0])
+            parent.add(child)
+        if bind and by_unbinding:
+            for node in reversed(node_list):
+                store.bind(node)
+            for node in node_list[1::2]:
+                store.unbind(node)
+        elif bind:
+            for node in node_list[::2]:
+                store.bind(node)
+        chain_list.append(node_list)
+    difference = 0.0
+    stale_count = 0
+    for _ in range(step_count):
+        index = generator.integers(len(chain_list[0]))
+        angle = generator.uniform(-1, 1)
+        bound_list = chain_list[1]
+        version_list = [node.transform_version for node in bound_list]
+        for node_list in chain_list:
+            node_list[index].rotate_y(angle)
+        # In random order, each version before its matrix, as the shadow pass reads them
+        for node_index in generator.permutation(len(bound_list)):
+            node = bound_list[node_index]
+            # The rotated node and all below it have moved
+            if node_index >= index and node.transform_version == version_list[node_index]:
+                stale_count += 1
+            difference = max(difference, np.abs(node.global_matrix - chain_list[0][node_index].global_matrix).max())
+    return difference, stale_count
+
+
+def measure(function, frame_count):
+    start = time.perf_counter()
+    for _ in range(frame_count):
+        result = function()
+    return (time.perf_counter() - start) / frame_count, result
+
+
+def main(body_count=10000, frame_count=10):
+    delta_time = 1 / 60
+    root, group_list, body_list = build_scene(body_count)
+    node_time, node_matrices = measure(lambda: animate_nodes(group_list, body_list, delta_time), frame_count)
+
+    bound_root, bound_group_list, bound_body_list = build_scene(body_count)
+    store = TransformStore()
+    start = time.perf_counter()
+    for group in bound_group_list:
+        store.bind_subtree(group)
+    bind_time = time.perf_counter() - start
+    group_slots = np.array([group.transform_slot for group in bound_group_list])
+    body_slots = np.array([body.transform_slot for body in bound_body_list])
+    store_time, store_matrices = measure(lambda: animate_store(store, group_slots, body_slots, delta_time),
+                                         frame_count)
+    # The same animation must give the same matrices
+    difference = np.abs(np.array(node_matrices) - store_matrices).max()
+    # Reading the matrices through the nodes, e.g. by the renderer
+    bound_node_time, _ = measure(lambda: (animate_store(store, group_slots, body_slots, delta_time),
+                                          [body.global_matrix for body in bound_body_list]), frame_count)
+
+    print(f"{body_count} bodies in {len(group_list)} groups, binding took {bind_time * 1000:.0f} ms")
+    print(f"{'transforms':>36}{'ms per frame':>15}")
+    print(f"{'Object3D methods':>36}{node_time * 1000:>15.1f}")
+    print(f"{'TransformStore batched':>36}{store_time * 1000:>15.1f}")
+    print(f"{'TransformStore + node matrices':>36}{bound_node_time * 1000:>15.1f}")
+    print(f"largest difference of world matrices: {difference:.1e}")
+    # Bound nodes below unbound nodes below bound nodes
+    for by_unbinding in (False, True):
+        chain_difference, stale_count = check_mixed_chain(by_unbinding=by_unbinding)
+        print(f"mixed bound/unbound chain{' (by unbinding)' if by_unbinding else ''}: "
+              f"largest difference {chain_difference:.1e}, {stale_count} stale versions")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,24 @@
+import argparse
+import contextlib
 import math
 import pygame
 import sys
+import time
+
+from scripts.core.headless_context import HeadlessContext
+
+# Without a display, the OpenGL platform must be selected before OpenGL is imported
+if __name__ == "__main__" and "--headless" in sys.argv:
+    HeadlessContext.select_platform()
 
 from scripts.render.renderer import Renderer
+from scripts.render.render_target import RenderTarget
 from scripts.scene import Scene
 from scripts.camera.camera import Camera
 from scripts.core.mesh import Mesh
-from scripts.material.texture import Texture
+from scripts.core.lod_mesh import LODMesh
+from scripts.material.texture_cache import TextureCache
+from scripts.material.texture_loader import TextureLoader
 
 from scripts.light.light import AmbientLight, DirectionalLight, PointLight
 from scripts.material.phong import PhongMaterial
@@ -18,34 +30,66 @@ from scripts.camera.movement_rig import MovementRig
 
 from scripts.core.input import Input
 from scripts.core.utils import Utils
+from scripts.core.program_cache import ProgramCache
+from scripts.core.profiler import Profiler
+from scripts.core.fixed_timestep import FixedTimestep
+from scripts.core.transform_interpolator import TransformInterpolator
+from scripts.render.profiler_overlay import ProfilerOverlay
 
 class Example():
     """
     Render shadows using shadow pass by depth buffers for the directional light.
     """
 
-    def __init__(self, screen_size=(512, 512)):
+    def __init__(self, screen_size=(512, 512), asynchronous_loading=True, headless=False, profile_file_name=None,
+                 capture_directory=None, capture_format="png", frame_rate_cap=60, max_catch_up_steps=5):
         # Initialize all pygame modules
         pygame.init()
-        # Indicate rendering details
-        display_flags = pygame.DOUBLEBUF | pygame.OPENGL
-        # Initialize buffers to perform antialiasing
-        pygame.display.gl_set_attribute(pygame.GL_MULTISAMPLEBUFFERS, 1)
-        pygame.display.gl_set_attribute(pygame.GL_MULTISAMPLESAMPLES, 4)
-        # Use a core OpenGL profile for cross-platform compatibility
-        pygame.display.gl_set_attribute(pygame.GL_CONTEXT_PROFILE_MASK, pygame.GL_CONTEXT_PROFILE_CORE)
-        # Create and display the window
-        self._screen = pygame.display.set_mode(screen_size, display_flags)
-        # Set the text that appears in the title bar of the window
-        pygame.display.set_caption("Graphics Window")
+        # Without a window, render into a framebuffer object of a context without display;
+        # HeadlessContext.select_platform must have been called before OpenGL was imported
+        self._headless = headless
+        if headless:
+            self._headless_context = HeadlessContext()
+            self._screen = None
+            self._render_target = RenderTarget(screen_size)
+        else:
+            self._headless_context = None
+            self._render_target = None
+            # Indicate rendering details
+            display_flags = pygame.DOUBLEBUF | pygame.OPENGL
+            # Initialize buffers to perform antialiasing
+            pygame.display.gl_set_attribute(pygame.GL_MULTISAMPLEBUFFERS, 1)
+            pygame.display.gl_set_attribute(pygame.GL_MULTISAMPLESAMPLES, 4)
+            # Use a core OpenGL profile for cross-platform compatibility
+            pygame.display.gl_set_attribute(pygame.GL_CONTEXT_PROFILE_MASK, pygame.GL_CONTEXT_PROFILE_CORE)
+            # Create and display the window
+            self._screen = pygame.display.set_mode(screen_size, display_flags)
+            # Set the text that appears in the title bar of the window
+            pygame.display.set_caption("Graphics Window")
         # Determine if main loop is active
         self._running = True
         # Manage time-related data and operations
         self._clock = pygame.time.Clock()
+        # Frames per second at most; 0 renders as fast as possible, e.g. for benchmarks.
+        # The simulation runs with fixed steps of 1/60 s at any frame rate,
+        # at most max_catch_up_steps per frame
+        self._frame_rate_cap = frame_rate_cap
+        self._timestep = FixedTimestep(1 / 60, max_catch_up_steps)
+        self._delta_time = 0
         # Manage user input
         self._input = Input()
         # number of seconds application has been running
         self._time = 0
+        # Decode images in background threads, showing placeholders until loaded
+        self._asynchronous_loading = asynchronous_loading
+        # Measure CPU and GPU time of each frame and write them to this file at exit;
+        # the averages are shown in an overlay, toggled with F3
+        self._profile_file_name = profile_file_name
+        self._profiler = None
+        self._profiler_overlay = None
+        # Record all frames as image files in this directory
+        self._capture_directory = capture_directory
+        self._capture_format = capture_format
         # Print the system information
         Utils.print_system_info()
     
@@ -53,10 +97,28 @@ class Example():
     def delta_time(self):
         return self._delta_time
 
+    @delta_time.setter
+    def delta_time(self, value):
+        self._delta_time = value
+
+    @property
+    def timestep(self):
+        return self._timestep
+
     @property
     def input(self):
         return self._input
 
+    @property
+    def profiler(self):
+        """ Profiler of the frames, or None if profiling is off """
+        return self._profiler
+
+    @property
+    def render_target(self):
+        """ Target the renderer draws to without a window; None when rendering to the window """
+        return self._render_target
+
     @property
     def time(self):
         return self._time
@@ -66,7 +128,10 @@ class Example():
         self._time = value
 
     def initialize(self):
-        self.renderer = Renderer()
+        if self._profile_file_name is not None:
+            self._profiler = Profiler()
+            self._profiler_overlay = ProfilerOverlay(self._profiler)
+        self.renderer = Renderer(default_render_target=self._render_target, profiler=self._profiler)
         self.scene = Scene()
         self.camera = Camera(aspect_ratio=800/600)
         self.rig = MovementRig(units_per_second=5)
@@ -83,47 +148,58 @@ class Example():
         # direct_helper = DirectionalLightHelper(self.directional_light)
         # self.directional_light.add(direct_helper)
 
-        sky_geometry = SphereGeometry(radius=50)
-        sky_material = TextureMaterial(texture=Texture(file_name="images/space.jpg"))
+        sky_geometry = SphereGeometry(radius=50, indexed=True)
+        sky_material = TextureMaterial(
+            texture=TextureCache.acquire("images/space.jpg", asynchronous=self._asynchronous_loading)
+        )
         sky = Mesh(sky_geometry, sky_material)
+        # The sky surrounds the whole scene and would only darken it in the shadow map
+        sky.cast_shadow = False
+        sky.receive_shadow = False
         self.scene.add(sky)
 
-        Geometry_earth = SphereGeometry(radius=1.0)
-        Geometry_sun = SphereGeometry(radius=3)
-        Geometry_moon = SphereGeometry(radius=0.5)
+        # Levels of detail, from 64 x 128 segments near the camera to 8 x 16 segments far away
+        Geometry_earth = SphereGeometry.make_levels(radius=1.0)
+        Geometry_sun = SphereGeometry.make_levels(radius=3)
+        Geometry_moon = SphereGeometry.make_levels(radius=0.5)
         Geometry_airplane = OBJGeometry(size=0.1)
        
         phong_material_earth = PhongMaterial(
-            texture=Texture("images/earth.jpeg"),
+            texture=TextureCache.acquire("images/earth.jpeg", asynchronous=self._asynchronous_loading),
             number_of_light_sources=2,
-            use_shadow=True
+            use_shadow=True,
+            cascaded_shadow=True
         )
         
         phong_material_sun = TextureMaterial(
-            texture=Texture("images/sun.jpeg")
+            texture=TextureCache.acquire("images/sun.jpeg", asynchronous=self._asynchronous_loading)
         )
 
         phong_material_moon = PhongMaterial(
-            texture=Texture("images/moon.png"),
+            texture=TextureCache.acquire("images/moon.png", asynchronous=self._asynchronous_loading),
             number_of_light_sources=2,
-            use_shadow=True
+            use_shadow=True,
+            cascaded_shadow=True
         )
         
         phong_material_airplane = PhongMaterial(
-            texture=Texture("images/metal.png"),
+            texture=TextureCache.acquire("images/metal.png", asynchronous=self._asynchronous_loading),
             number_of_light_sources=2,
-            use_shadow=True
+            use_shadow=True,
+            cascaded_shadow=True
         )
 
-        earth = Mesh(Geometry_earth, phong_material_earth)
+        earth = LODMesh(Geometry_earth, phong_material_earth)
         earth.set_position([0, 0, 0])
         self.scene.add(earth)
 
-        sun = Mesh(Geometry_sun, phong_material_sun)
+        sun = LODMesh(Geometry_sun, phong_material_sun)
         sun.set_position([20, 0, 0])
+        # The sun is the light source and must not block its own light
+        sun.cast_shadow = False
         self.scene.add(sun)
 
-        moon = Mesh(Geometry_moon, phong_material_moon)
+        moon = LODMesh(Geometry_moon, phong_material_moon)
         moon.set_position([-5, 0, 0])
         self.scene.add(moon)
 
@@ -136,9 +212,10 @@ class Example():
         Geometry_box = BoxGeometry()
 
         phong_material_box = PhongMaterial(
-            texture=Texture("images/crate.jpg"),
+            texture=TextureCache.acquire("images/crate.jpg", asynchronous=self._asynchronous_loading),
             number_of_light_sources=2,
-            use_shadow=True
+            use_shadow=True,
+            cascaded_shadow=True
         )
 
         box = Mesh(Geometry_box, phong_material_box)
@@ -151,47 +228,158 @@ class Example():
         self.moon = moon
         self.airplane = airplane
         
-        self.renderer.enable_shadows(self.directional_light)
+        # Cascaded shadow maps give shadows everywhere up to the sky, detailed near the camera
+        self.renderer.enable_shadows(self.directional_light, resolution=(1024, 1024), cascade_count=4,
+                                     max_distance=60)
 
-    def update(self):
+    def simulate(self, delta_time):
+        """ Advance the animation by delta_time seconds; speeds are given in radians per second """
         #"""
-        self.sun.rotate_y(0.00005, True)
+        self.sun.rotate_y(0.003 * delta_time, True)
 
-        self.directional_light.rotate_y(0.0005, False)
-        self.sun.rotate_y(0.0005, False)
+        self.directional_light.rotate_y(0.03 * delta_time, False)
+        self.sun.rotate_y(0.03 * delta_time, False)
 
-        self.earth.rotate_y(0.01, True)
-        self.moon.rotate_y(0.005, True)
-        self.moon.rotate_y(0.005, False)
-        self.airplane.rotate_z(0.005, True)
+        self.earth.rotate_y(0.6 * delta_time, True)
+        self.moon.rotate_y(0.3 * delta_time, True)
+        self.moon.rotate_y(0.3 * delta_time, False)
+        self.airplane.rotate_z(0.3 * delta_time, True)
         #"""
-        self.rig.update(self.input, self.delta_time)
+        self.rig.update(self.input, delta_time)
 
+    def render(self):
         self.renderer.render(self.scene, self.camera)
 
-    def run(self):
+    def update(self):
+        """ Simulate one step of delta_time seconds and render the result, for callers with their own loop """
+        self.simulate(self.delta_time)
+        self.render()
+
+    def run(self, frame_count=None, image_file_name=None):
+        """
+        Run the main loop until the window is closed, or until frame_count frames are rendered;
+        if image_file_name is given, the last frame is saved (only without a window)
+        """
         # Startup #
+        start_time = time.perf_counter()
         self.initialize()
+        if self._capture_directory is not None:
+            self.renderer.start_capture(self._capture_directory, file_format=self._capture_format)
+        # Report time spent creating shader programs
+        ProgramCache.print_statistics()
+        rendered_frame_count = 0
+        textures_loaded = False
+        # Objects are shown between the last two simulation steps, so that motion is smooth at any frame rate
+        interpolator = TransformInterpolator([self.scene, self.rig])
+        loop_start_time = time.perf_counter()
+        frame_start_time = loop_start_time
         # main loop #
         while self._running:
-            # process input #
-            self._input.update()
-            if self._input.quit:
-                self._running = False
-            # seconds since iteration of run loop
-            self._delta_time = self._clock.get_time() / 1000
-            # Increment time application has been running
-            self._time += self._delta_time
+            if self._profiler is not None:
+                self._profiler.begin_frame()
+            if self._headless:
+                # No input without a window; one step per frame makes the frames reproducible
+                self._delta_time = self._timestep.step
+            else:
+                # process input #
+                self._input.update()
+                if self._input.quit:
+                    self._running = False
+                # seconds since iteration of run loop
+                current_time = time.perf_counter()
+                self._delta_time = current_time - frame_start_time
+                frame_start_time = current_time
+                if self._profiler_overlay is not None and self._input.is_key_down("f3"):
+                    self._profiler_overlay.visible = not self._profiler_overlay.visible
             # Update #
-            self.update()
+            with self._profile_scope("simulate"):
+                step_count = self._timestep.advance(self._delta_time)
+                if step_count > 0:
+                    # The simulation continues from the simulated state, not the interpolated one
+                    interpolator.restore()
+                for step_index in range(step_count):
+                    if step_index == step_count - 1:
+                        interpolator.save_previous()
+                    self.simulate(self._timestep.step)
+                    # Increment time application has been running
+                    self._time += self._timestep.step
+                if step_count > 0:
+                    interpolator.save_current()
+                interpolator.interpolate(self._timestep.alpha)
             # Render #
+            self.render()
+            # Frames are recorded without the overlay
+            self.renderer.capture_frame()
+            if self._profiler_overlay is not None and self._profiler_overlay.visible:
+                with self._profile_scope("overlay"):
+                    self._profiler_overlay.draw(self.renderer)
             # Display image on screen
-            pygame.display.flip()
-            # Pause if necessary to achieve 60 FPS
-            self._clock.tick(60)
+            if not self._headless:
+                with self._profile_scope("swap"):
+                    pygame.display.flip()
+            if self._profiler is not None:
+                self._profiler.end_frame()
+            rendered_frame_count += 1
+            if rendered_frame_count == frame_count:
+                self._running = False
+            if rendered_frame_count == 1:
+                print(f"Time to first frame: {(time.perf_counter() - start_time) * 1000:.0f} ms "
+                      f"({'asynchronous' if self._asynchronous_loading else 'synchronous'} texture loading)")
+            if not textures_loaded and TextureLoader.get_pending_count() == 0:
+                textures_loaded = True
+                print(f"All textures loaded after {(time.perf_counter() - start_time) * 1000:.0f} ms")
+                # Report memory used by textures
+                TextureCache.print_statistics()
+            # Pause if necessary to stay below the frame rate cap
+            if not self._headless and self._frame_rate_cap > 0:
+                self._clock.tick(self._frame_rate_cap)
         # Shutdown #
+        interpolator.restore()
+        loop_time = time.perf_counter() - loop_start_time
+        print(f"{rendered_frame_count} frames in {loop_time:.1f} s ({rendered_frame_count / loop_time:.1f} FPS), "
+              f"{self._timestep.step_count} simulation steps, {self._timestep.dropped_time:.2f} s dropped")
+        if self._capture_directory is not None:
+            captured_frame_count = self.renderer.stop_capture()
+            print(f"{captured_frame_count} frames written to {self._capture_directory}")
+        if self._profiler is not None:
+            self._profiler.write_log(self._profile_file_name)
+            print(f"Profile of the last {len(self._profiler.history)} frames written to {self._profile_file_name}")
+        if image_file_name is not None and self._render_target is not None:
+            self._render_target.save_image(image_file_name)
+        if self._headless_context is not None:
+            self._headless_context.destroy()
         pygame.quit()
         sys.exit()
 
+    def _profile_scope(self, name):
+        """ Profiler scope with given name, or a context doing nothing when profiling is off """
+        if self._profiler is None:
+            return contextlib.nullcontext()
+        return self._profiler.scope(name)
+
 if __name__ == "__main__":
-    Example(screen_size=[800, 600]).run()
\ No newline at end of file
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sync", action="store_true", help="load textures before the first frame")
+    parser.add_argument("--headless", action="store_true",
+                        help="render without window (EGL), e.g. on machines without display")
+    parser.add_argument("--frames", type=int, default=None,
+                        help="stop after this many frames (default: 60 when headless)")
+    parser.add_argument("--image", default=None, help="save the last frame to this file when headless")
+    parser.add_argument("--profile", default=None, metavar="FILE",
+                        help="measure CPU and GPU times of passes, show them (F3) and write them to a CSV or JSON file")
+    parser.add_argument("--capture", default=None, metavar="DIRECTORY",
+                        help="record all frames as image files in this directory")
+    parser.add_argument("--capture-format", default="png", choices=["png", "raw"],
+                        help="PNG images, or raw RGBA frames (size in capture.json)")
+    parser.add_argument("--fps", type=int, default=60,
+                        help="frames per second at most; 0 for no limit (the simulation speed does not change)")
+    parser.add_argument("--max-catch-up-steps", type=int, default=5,
+                        help="simulation steps per frame at most; slower frames slow down the simulation")
+    arguments = parser.parse_args()
+    frame_count = arguments.frames
+    if arguments.headless and frame_count is None:
+        frame_count = 60
+    Example(screen_size=[800, 600], asynchronous_loading=not arguments.sync,
+            headless=arguments.headless, profile_file_name=arguments.profile,
+            capture_directory=arguments.capture, capture_format=arguments.capture_format,
+            frame_rate_cap=arguments.fps, max_catch_up_steps=arguments.max_catch_up_steps).run(frame_count, arguments.image)
\ No newline at end of file
@@ -1,3 +1,4 @@
+import numpy as np
 from numpy.linalg import inv
 
 from scripts.core.matrix import Matrix
@@ -25,5 +26,18 @@ class Camera(Object3D):
     def set_orthographic(self, left=-1, right=1, bottom=-1, top=1, near=-1, far=1):
         self._projection_matrix = Matrix.make_orthographic(left, right, bottom, top, near, far)
 
+    def get_ray(self, x, y):
+        """
+        Return (origin, direction) in world coordinates of the ray through the point (x, y)
+        in normalized device coordinates (-1...1), e.g. for mouse picking
+        """
+        inverse_matrix = inv(self._projection_matrix @ inv(self.global_matrix))
+        near_point = inverse_matrix @ np.array([x, y, -1, 1])
+        far_point = inverse_matrix @ np.array([x, y, 1, 1])
+        near_point = near_point[0:3] / near_point[3]
+        far_point = far_point[0:3] / far_point[3]
+        direction = far_point - near_point
+        return near_point, direction / np.linalg.norm(direction)
+
     def update_view_matrix(self):
         self._view_matrix = inv(self.global_matrix)
\ No newline at end of file
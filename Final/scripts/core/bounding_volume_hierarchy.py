@@ -0,0 +1,406 @@
+import numpy as np
+
+
+class _Node:
+    """ Node of the hierarchy; leaves store one mesh, inner nodes have two children """
+    __slots__ = ("box_min", "box_max", "parent", "left", "right", "mesh", "center", "radius", "order")
+
+    def __init__(self):
+        # Axis-aligned box containing the boxes of all leaves below this node
+        self.box_min = None
+        self.box_max = None
+        self.parent = None
+        self.left = None
+        self.right = None
+        # Leaf data: mesh, its bounding sphere in world coordinates and its position in the scene
+        self.mesh = None
+        self.center = None
+        self.radius = None
+        self.order = 0
+
+    @property
+    def is_leaf(self):
+        return self.left is None
+
+
+class BoundingVolumeHierarchy:
+    """
+    Dynamic bounding volume hierarchy (binary tree of axis-aligned boxes)
+    over the world-space bounding spheres of meshes.
+    Boxes of leaves are enlarged by a margin (loose boxes), so that small movements
+    do not change the tree; a moved mesh leaving its loose box is removed and inserted again.
+    Meshes report transform changes through Mesh.invalidate_bounds(),
+    and the hierarchy is refitted for these meshes only.
+    """
+    # Margin added to leaf boxes, relative to the radius of the bounding sphere
+    LOOSE_MARGIN = 0.25
+
+    def __init__(self):
+        self._root = None
+        # mesh -> leaf node
+        self._leaf_dict = {}
+        # Meshes without bounds (no vertex positions); returned by every frustum query
+        self._unbounded_list = []
+        # Meshes whose bounds changed since the last refit
+        self._moved_set = set()
+        # mesh -> position in the scene, used to return query results in scene order
+        self._order_dict = {}
+
+    @property
+    def mesh_count(self):
+        return len(self._leaf_dict) + len(self._unbounded_list)
+
+    @property
+    def depth(self):
+        """ Return the number of levels of the tree """
+        if self._root is None:
+            return 0
+        depth = 0
+        level_list = [self._root]
+        while level_list:
+            depth += 1
+            level_list = [child for node in level_list if not node.is_leaf for child in (node.left, node.right)]
+        return depth
+
+    def set_meshes(self, mesh_list):
+        """
+        Make the hierarchy contain exactly the meshes of the list;
+        query results are returned in the order of this list
+        """
+        mesh_set = set(mesh_list)
+        for mesh in list(self._order_dict.keys()):
+            if mesh not in mesh_set:
+                self.remove(mesh)
+        new_list = [mesh for mesh in mesh_list if mesh not in self._order_dict]
+        self._order_dict = {mesh: order for order, mesh in enumerate(mesh_list)}
+        # Building from scratch gives a better tree than many insertions
+        if len(new_list) > len(self._leaf_dict):
+            self._build(mesh_list)
+            return
+        for mesh in new_list:
+            self._attach(mesh)
+        for mesh, leaf in self._leaf_dict.items():
+            leaf.order = self._order_dict[mesh]
+        self._unbounded_list.sort(key=lambda mesh: self._order_dict[mesh])
+
+    def insert(self, mesh):
+        """ Add a mesh; it is ordered after the meshes already contained """
+        self._order_dict[mesh] = max(self._order_dict.values(), default=-1) + 1
+        self._attach(mesh)
+
+    def remove(self, mesh):
+        self._detach(mesh)
+        mesh.bounds_listener = None
+        self._moved_set.discard(mesh)
+        del self._order_dict[mesh]
+
+    def mark_moved(self, mesh):
+        """ Called when the world-space bounds of a mesh may have changed """
+        self._moved_set.add(mesh)
+
+    def refit(self):
+        """ Update the leaves of moved meshes and the boxes above them """
+        moved_set = self._moved_set
+        self._moved_set = set()
+        for mesh in moved_set:
+            sphere = mesh.world_bounding_sphere
+            leaf = self._leaf_dict.get(mesh)
+            if leaf is None or sphere is None:
+                # Mesh gained or lost its bounds
+                self._detach(mesh)
+                self._attach(mesh)
+                continue
+            center, radius = sphere
+            leaf.center = center
+            leaf.radius = radius
+            # Keep the tree unchanged while the sphere stays inside the loose box
+            if (center - radius >= leaf.box_min).all() and (center + radius <= leaf.box_max).all():
+                continue
+            self._remove_leaf(leaf)
+            self._set_leaf_bounds(leaf, center, radius)
+            self._insert_leaf(leaf)
+
+    def frustum_query(self, frustum):
+        """
+        Return meshes whose bounding spheres are not completely outside the frustum, in scene order.
+        Subtrees completely inside the frustum are accepted without testing their leaves.
+        """
+        self.refit()
+        leaf_list = []
+        if self._root is not None:
+            nodes_to_process = [self._root]
+            while nodes_to_process:
+                node = nodes_to_process.pop()
+                if node.is_leaf:
+                    if frustum.intersects_sphere(node.center, node.radius):
+                        leaf_list.append(node)
+                    continue
+                location = frustum.classify_box(node.box_min, node.box_max)
+                if location == frustum.OUTSIDE:
+                    continue
+                if location == frustum.INSIDE:
+                    self._collect_leaves(node, leaf_list)
+                else:
+                    nodes_to_process.append(node.left)
+                    nodes_to_process.append(node.right)
+        return self._sorted_meshes(leaf_list) + self._unbounded_list
+
+    def ray_query(self, origin, direction, max_distance=np.inf):
+        """
+        Return list of (distance, mesh) of meshes whose bounding spheres are hit by the ray,
+        sorted by distance from the origin; direction need not be normalized
+        """
+        self.refit()
+        origin = np.asarray(origin, dtype=float)
+        direction = np.asarray(direction, dtype=float)
+        direction = direction / np.linalg.norm(direction)
+        # Avoid division by zero for rays parallel to an axis
+        with np.errstate(divide="ignore"):
+            inverse_direction = 1 / direction
+        hit_list = []
+        if self._root is None:
+            return hit_list
+        nodes_to_process = [self._root]
+        while nodes_to_process:
+            node = nodes_to_process.pop()
+            if node.is_leaf:
+                distance = self._ray_sphere_distance(origin, direction, node.center, node.radius)
+                if distance is not None and distance <= max_distance:
+                    hit_list.append((distance, node.mesh))
+                continue
+            if self._ray_hits_box(origin, inverse_direction, node.box_min, node.box_max, max_distance):
+                nodes_to_process.append(node.left)
+                nodes_to_process.append(node.right)
+        hit_list.sort(key=lambda hit: hit[0])
+        return hit_list
+
+    def sphere_query(self, center, radius):
+        """ Return meshes whose bounding spheres intersect the given sphere, in scene order """
+        self.refit()
+        center = np.asarray(center, dtype=float)
+        leaf_list = []
+        if self._root is None:
+            return leaf_list
+        nodes_to_process = [self._root]
+        while nodes_to_process:
+            node = nodes_to_process.pop()
+            if node.is_leaf:
+                if np.linalg.norm(node.center - center) <= node.radius + radius:
+                    leaf_list.append(node)
+                continue
+            # Distance from the center to the closest point of the box
+            closest = np.clip(center, node.box_min, node.box_max)
+            if np.linalg.norm(closest - center) <= radius:
+                nodes_to_process.append(node.left)
+                nodes_to_process.append(node.right)
+        return self._sorted_meshes(leaf_list)
+
+    def box_query(self, box_min, box_max):
+        """ Return meshes whose bounding spheres intersect the axis-aligned box, in scene order """
+        self.refit()
+        box_min = np.asarray(box_min, dtype=float)
+        box_max = np.asarray(box_max, dtype=float)
+        leaf_list = []
+        if self._root is None:
+            return leaf_list
+        nodes_to_process = [self._root]
+        while nodes_to_process:
+            node = nodes_to_process.pop()
+            if node.is_leaf:
+                closest = np.clip(node.center, box_min, box_max)
+                if np.linalg.norm(closest - node.center) <= node.radius:
+                    leaf_list.append(node)
+                continue
+            if (node.box_min <= box_max).all() and (node.box_max >= box_min).all():
+                nodes_to_process.append(node.left)
+                nodes_to_process.append(node.right)
+        return self._sorted_meshes(leaf_list)
+
+    def _attach(self, mesh):
+        """ Add the mesh to the tree, or to the list of meshes without bounds """
+        sphere = mesh.world_bounding_sphere
+        mesh.bounds_listener = self
+        if sphere is None:
+            self._unbounded_list.append(mesh)
+            self._unbounded_list.sort(key=lambda mesh: self._order_dict[mesh])
+            return
+        leaf = _Node()
+        leaf.mesh = mesh
+        leaf.order = self._order_dict[mesh]
+        self._set_leaf_bounds(leaf, *sphere)
+        self._leaf_dict[mesh] = leaf
+        self._insert_leaf(leaf)
+
+    def _detach(self, mesh):
+        if mesh in self._leaf_dict:
+            self._remove_leaf(self._leaf_dict.pop(mesh))
+        else:
+            self._unbounded_list.remove(mesh)
+
+    def _build(self, mesh_list):
+        """ Rebuild the whole tree top-down, splitting at the median along the longest axis """
+        self._root = None
+        self._leaf_dict = {}
+        self._unbounded_list = []
+        self._moved_set = set()
+        leaf_list = []
+        for order, mesh in enumerate(mesh_list):
+            mesh.bounds_listener = self
+            sphere = mesh.world_bounding_sphere
+            if sphere is None:
+                self._unbounded_list.append(mesh)
+                continue
+            leaf = _Node()
+            leaf.mesh = mesh
+            leaf.order = order
+            self._set_leaf_bounds(leaf, *sphere)
+            self._leaf_dict[mesh] = leaf
+            leaf_list.append(leaf)
+        if not leaf_list:
+            return
+        centers = np.array([leaf.center for leaf in leaf_list])
+        # Stack of (parent, attribute name, leaf indices) of subtrees to build
+        tasks_to_process = [(None, None, np.arange(len(leaf_list)))]
+        while tasks_to_process:
+            parent, side, indices = tasks_to_process.pop()
+            if len(indices) == 1:
+                node = leaf_list[indices[0]]
+            else:
+                node = _Node()
+                extents = centers[indices].max(axis=0) - centers[indices].min(axis=0)
+                axis = int(np.argmax(extents))
+                sorted_indices = indices[np.argsort(centers[indices, axis], kind="stable")]
+                half = len(sorted_indices) // 2
+                tasks_to_process.append((node, "left", sorted_indices[:half]))
+                tasks_to_process.append((node, "right", sorted_indices[half:]))
+            node.parent = parent
+            if parent is None:
+                self._root = node
+            else:
+                setattr(parent, side, node)
+        # Boxes of inner nodes, children before parents
+        inner_list = []
+        nodes_to_process = [self._root]
+        while nodes_to_process:
+            node = nodes_to_process.pop()
+            if not node.is_leaf:
+                inner_list.append(node)
+                nodes_to_process.append(node.left)
+                nodes_to_process.append(node.right)
+        for node in reversed(inner_list):
+            node.box_min = np.minimum(node.left.box_min, node.right.box_min)
+            node.box_max = np.maximum(node.left.box_max, node.right.box_max)
+
+    @staticmethod
+    def _set_leaf_bounds(leaf, center, radius):
+        margin = radius * (1 + BoundingVolumeHierarchy.LOOSE_MARGIN)
+        leaf.center = center
+        leaf.radius = radius
+        leaf.box_min = center - margin
+        leaf.box_max = center + margin
+
+    def _insert_leaf(self, leaf):
+        if self._root is None:
+            leaf.parent = None
+            self._root = leaf
+            return
+        # Descend to the sibling whose box grows the least by adding the leaf
+        sibling = self._root
+        while not sibling.is_leaf:
+            left_cost = self._union_area(sibling.left, leaf) - self._area(sibling.left.box_min, sibling.left.box_max)
+            right_cost = self._union_area(sibling.right, leaf) - self._area(sibling.right.box_min, sibling.right.box_max)
+            sibling = sibling.left if left_cost <= right_cost else sibling.right
+        # Replace the sibling by a new node with children sibling and leaf
+        old_parent = sibling.parent
+        new_parent = _Node()
+        new_parent.parent = old_parent
+        new_parent.left = sibling
+        new_parent.right = leaf
+        sibling.parent = new_parent
+        leaf.parent = new_parent
+        if old_parent is None:
+            self._root = new_parent
+        elif old_parent.left is sibling:
+            old_parent.left = new_parent
+        else:
+            old_parent.right = new_parent
+        self._refit_ancestors(new_parent)
+
+    def _remove_leaf(self, leaf):
+        parent = leaf.parent
+        leaf.parent = None
+        if parent is None:
+            self._root = None
+            return
+        # The sibling takes the place of the parent
+        sibling = parent.right if parent.left is leaf else parent.left
+        grandparent = parent.parent
+        sibling.parent = grandparent
+        if grandparent is None:
+            self._root = sibling
+            return
+        if grandparent.left is parent:
+            grandparent.left = sibling
+        else:
+            grandparent.right = sibling
+        self._refit_ancestors(grandparent)
+
+    @staticmethod
+    def _refit_ancestors(node):
+        """ Recalculate the boxes of the node and its ancestors """
+        while node is not None:
+            node.box_min = np.minimum(node.left.box_min, node.right.box_min)
+            node.box_max = np.maximum(node.left.box_max, node.right.box_max)
+            node = node.parent
+
+    @staticmethod
+    def _area(box_min, box_max):
+        size = box_max - box_min
+        return size[0] * size[1] + size[1] * size[2] + size[2] * size[0]
+
+    @staticmethod
+    def _union_area(node, leaf):
+        return BoundingVolumeHierarchy._area(np.minimum(node.box_min, leaf.box_min),
+                                             np.maximum(node.box_max, leaf.box_max))
+
+    @staticmethod
+    def _collect_leaves(node, leaf_list):
+        nodes_to_process = [node]
+        while nodes_to_process:
+            node = nodes_to_process.pop()
+            if node.is_leaf:
+                leaf_list.append(node)
+            else:
+                nodes_to_process.append(node.left)
+                nodes_to_process.append(node.right)
+
+    @staticmethod
+    def _sorted_meshes(leaf_list):
+        leaf_list.sort(key=lambda leaf: leaf.order)
+        return [leaf.mesh for leaf in leaf_list]
+
+    @staticmethod
+    def _ray_sphere_distance(origin, direction, center, radius):
+        """ Return distance along the normalized direction to the first hit of the sphere, or None """
+        offset = origin - center
+        b = offset @ direction
+        c = offset @ offset - radius * radius
+        discriminant = b * b - c
+        if discriminant < 0:
+            return None
+        root = np.sqrt(discriminant)
+        if -b + root < 0:
+            # Sphere is behind the origin
+            return None
+        # Origin inside the sphere hits at distance 0
+        return float(max(-b - root, 0.0))
+
+    @staticmethod
+    def _ray_hits_box(origin, inverse_direction, box_min, box_max, max_distance):
+        with np.errstate(invalid="ignore"):
+            t1 = (box_min - origin) * inverse_direction
+            t2 = (box_max - origin) * inverse_direction
+        # nan appears for rays in the plane of a box face; treat as not limiting
+        t_near = np.nanmax(np.minimum(t1, t2))
+        t_far = np.nanmin(np.maximum(t1, t2))
+        return t_near <= t_far and t_far >= 0 and t_near <= max_distance
@@ -0,0 +1,61 @@
+class FixedTimestep:
+    """
+    Divides the elapsed real time into simulation steps of fixed length, so that the results
+    of the simulation do not depend on the frame rate. Time not yet simulated is kept for the next frame;
+    its fraction of a step (alpha) is used to interpolate between the last two simulated states.
+    At most max_step_count steps are simulated per frame: after a long frame the simulation slows down
+    instead of taking ever longer to catch up; the skipped time is added to dropped_time.
+    """
+    def __init__(self, step=1 / 60, max_step_count=5):
+        if step <= 0:
+            raise Exception("The time step must be positive")
+        self._step = step
+        self._max_step_count = max_step_count
+        # Real time not simulated yet, less than one step after each advance
+        self._accumulator = 0.0
+        self._step_count = 0
+        self._dropped_time = 0.0
+
+    @property
+    def step(self):
+        return self._step
+
+    @property
+    def max_step_count(self):
+        return self._max_step_count
+
+    @max_step_count.setter
+    def max_step_count(self, max_step_count):
+        self._max_step_count = max_step_count
+
+    @property
+    def alpha(self):
+        """ Fraction of a step between the last simulated state and the current time, from 0 to 1 """
+        return min(max(self._accumulator / self._step, 0.0), 1.0)
+
+    @property
+    def step_count(self):
+        """ Number of steps simulated so far """
+        return self._step_count
+
+    @property
+    def simulated_time(self):
+        return self._step_count * self._step
+
+    @property
+    def dropped_time(self):
+        """ Seconds of real time skipped because of the limit of steps per frame """
+        return self._dropped_time
+
+    def advance(self, elapsed_time):
+        """ Add the real time elapsed since the last frame; return the number of steps to simulate now """
+        self._accumulator += elapsed_time
+        # Rounding errors must not turn a frame of exactly n steps into n - 1 steps
+        step_count = int(self._accumulator / self._step + 1e-9)
+        self._accumulator -= step_count * self._step
+        if step_count > self._max_step_count:
+            # The steps beyond the limit are skipped, not postponed
+            self._dropped_time += (step_count - self._max_step_count) * self._step
+            step_count = self._max_step_count
+        self._step_count += step_count
+        return step_count
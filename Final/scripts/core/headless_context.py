@@ -0,0 +1,114 @@
+import ctypes
+import os
+import sys
+
+
+class HeadlessContext:
+    """
+    OpenGL context without a window or display server, for rendering on machines without a screen
+    (continuous integration, render nodes), e.g. with the Mesa llvmpipe software rasterizer.
+    Uses EGL without surfaces, or OSMesa. There is no window framebuffer to draw to,
+    so rendering goes to framebuffer objects, e.g. a RenderTarget given to the Renderer as default target.
+    PyOpenGL chooses its platform when OpenGL is first imported,
+    so select_platform must be called before importing any module that uses OpenGL.
+    """
+    PLATFORM_LIST = ("egl", "osmesa")
+    # From EGL_MESA_platform_surfaceless: a display without window system
+    EGL_PLATFORM_SURFACELESS_MESA = 0x31DD
+
+    @staticmethod
+    def select_platform(platform="egl"):
+        """ Make PyOpenGL load the EGL or OSMesa library instead of the one of the window system """
+        if platform not in HeadlessContext.PLATFORM_LIST:
+            raise Exception(f"Unknown headless platform: {platform}")
+        if "OpenGL.GL" in sys.modules and os.environ.get("PYOPENGL_PLATFORM") != platform:
+            raise Exception("The headless platform must be selected before OpenGL is imported")
+        os.environ["PYOPENGL_PLATFORM"] = platform
+
+    def __init__(self, major_version=3, minor_version=3):
+        self._platform = os.environ.get("PYOPENGL_PLATFORM")
+        if self._platform not in HeadlessContext.PLATFORM_LIST:
+            raise Exception("Call HeadlessContext.select_platform before importing OpenGL")
+        self._display = None
+        self._context = None
+        # OSMesa needs a color buffer in memory, even if only framebuffer objects are drawn to
+        self._buffer = None
+        if self._platform == "egl":
+            self._create_egl_context(major_version, minor_version)
+        else:
+            self._create_osmesa_context(major_version, minor_version)
+
+    @property
+    def platform(self):
+        return self._platform
+
+    def _create_egl_context(self, major_version, minor_version):
+        from OpenGL import EGL
+        # Prefer a display without window system; fall back to the default display
+        try:
+            self._display = EGL.eglGetPlatformDisplay(HeadlessContext.EGL_PLATFORM_SURFACELESS_MESA,
+                                                      EGL.EGL_DEFAULT_DISPLAY, None)
+        except Exception:
+            self._display = EGL.EGL_NO_DISPLAY
+        if not self._display:
+            self._display = EGL.eglGetDisplay(EGL.EGL_DEFAULT_DISPLAY)
+        major, minor = EGL.EGLint(), EGL.EGLint()
+        if not EGL.eglInitialize(self._display, ctypes.pointer(major), ctypes.pointer(minor)):
+            raise Exception("EGL display could not be initialized")
+        config_attributes = (EGL.EGLint * 7)(
+            EGL.EGL_SURFACE_TYPE, EGL.EGL_PBUFFER_BIT,
+            EGL.EGL_RENDERABLE_TYPE, EGL.EGL_OPENGL_BIT,
+            EGL.EGL_DEPTH_SIZE, 24,
+            EGL.EGL_NONE
+        )
+        config = EGL.EGLConfig()
+        config_count = EGL.EGLint()
+        if not EGL.eglChooseConfig(self._display, config_attributes, ctypes.pointer(config), 1,
+                                   ctypes.pointer(config_count)) or config_count.value == 0:
+            raise Exception("No EGL configuration supports OpenGL")
+        EGL.eglBindAPI(EGL.EGL_OPENGL_API)
+        # Use a core OpenGL profile, as in the main application
+        context_attributes = (EGL.EGLint * 7)(
+            EGL.EGL_CONTEXT_MAJOR_VERSION, major_version,
+            EGL.EGL_CONTEXT_MINOR_VERSION, minor_version,
+            EGL.EGL_CONTEXT_OPENGL_PROFILE_MASK, EGL.EGL_CONTEXT_OPENGL_CORE_PROFILE_BIT,
+            EGL.EGL_NONE
+        )
+        self._context = EGL.eglCreateContext(self._display, config, EGL.EGL_NO_CONTEXT, context_attributes)
+        if not self._context:
+            raise Exception("EGL context could not be created")
+        # Without surfaces (EGL_KHR_surfaceless_context), only framebuffer objects are drawn to
+        if not EGL.eglMakeCurrent(self._display, EGL.EGL_NO_SURFACE, EGL.EGL_NO_SURFACE, self._context):
+            raise Exception("EGL context could not be made current")
+
+    def _create_osmesa_context(self, major_version, minor_version):
+        import OpenGL.GL as GL
+        from OpenGL import osmesa
+        context_attributes = (ctypes.c_int * 11)(
+            osmesa.OSMESA_FORMAT, osmesa.OSMESA_RGBA,
+            osmesa.OSMESA_DEPTH_BITS, 24,
+            osmesa.OSMESA_PROFILE, osmesa.OSMESA_CORE_PROFILE,
+            osmesa.OSMESA_CONTEXT_MAJOR_VERSION, major_version,
+            osmesa.OSMESA_CONTEXT_MINOR_VERSION, minor_version,
+            0
+        )
+        self._context = osmesa.OSMesaCreateContextAttribs(context_attributes, None)
+        if not self._context:
+            raise Exception("OSMesa context could not be created")
+        self._buffer = (ctypes.c_ubyte * 4)()
+        if not osmesa.OSMesaMakeCurrent(self._context, self._buffer, GL.GL_UNSIGNED_BYTE, 1, 1):
+            raise Exception("OSMesa context could not be made current")
+
+    def destroy(self):
+        """ Release the context; OpenGL objects created in it must not be used afterwards """
+        if self._context is None:
+            return
+        if self._platform == "egl":
+            from OpenGL import EGL
+            EGL.eglMakeCurrent(self._display, EGL.EGL_NO_SURFACE, EGL.EGL_NO_SURFACE, EGL.EGL_NO_CONTEXT)
+            EGL.eglDestroyContext(self._display, self._context)
+            EGL.eglTerminate(self._display)
+        else:
+            from OpenGL import osmesa
+            osmesa.OSMesaDestroyContext(self._context)
+        self._context = None
@@ -0,0 +1,86 @@
+import OpenGL.GL as GL
+import numpy as np
+
+from scripts.core.mesh import Mesh
+from scripts.geometry.geometry import Attribute
+
+
+class InstancedMesh(Mesh):
+    """
+    Draws one geometry with one material many times with a single draw call.
+    Each instance is transformed by its own model matrix (applied before the global matrix of the mesh),
+    stored in a per-instance vertex attribute.
+    The material must have an instanced shader variant, e.g. PhongMaterial(instanced=True).
+    """
+    # Fixed location of the instance matrix in all instanced shaders,
+    # so that the vertex array object also works with the instanced depth material of the shadow pass
+    INSTANCE_MATRIX_LOCATION = 8
+    INSTANCE_MATRIX_CODE = f"""
+            layout (location = {INSTANCE_MATRIX_LOCATION}) in mat4 instanceMatrix;
+    """
+
+    def __init__(self, geometry, material, instance_matrices, usage="static"):
+        if GL.glGetAttribLocation(material.program_ref, "instanceMatrix") == -1:
+            raise Exception("Material of InstancedMesh has no instanceMatrix attribute; use an instanced material")
+        # Matrices are stored transposed, so that each shader location receives one column
+        self._instance_attribute = Attribute("mat4", self._transpose(instance_matrices), usage, divisor=1)
+        # Sphere containing all instances, cached until the instance matrices or the geometry bounds change
+        self._bounds_version = None
+        self._geometry_sphere = None
+        self._bounding_sphere = None
+        super().__init__(geometry, material)
+        GL.glBindVertexArray(self.vao_ref)
+        self._instance_attribute.associate_variable(material.program_ref, "instanceMatrix")
+        GL.glBindVertexArray(0)
+
+    @property
+    def bounding_sphere(self):
+        """ Return (center, radius) of a sphere containing all instances in local coordinates, or None """
+        geometry_sphere = self.geometry.bounding_sphere
+        # The geometry returns the same tuple until its bounds change
+        if self._bounds_version == self._instance_attribute.version and self._geometry_sphere is geometry_sphere:
+            return self._bounding_sphere
+        self._bounds_version = self._instance_attribute.version
+        self._geometry_sphere = geometry_sphere
+        if geometry_sphere is None or self.instance_count == 0:
+            self._bounding_sphere = None
+            return None
+        center, radius = geometry_sphere
+        matrices = self.instance_matrices.astype(float)
+        # Bounding spheres of all instances
+        centers = matrices[:, 0:3, 0:3] @ center + matrices[:, 0:3, 3]
+        radii = radius * np.sqrt((matrices[:, 0:3, 0:3] ** 2).sum(axis=1).max(axis=1))
+        # Sphere around the box containing the spheres of all instances
+        box_center = ((centers - radii[:, None]).min(axis=0) + (centers + radii[:, None]).max(axis=0)) / 2
+        box_radius = (np.linalg.norm(centers - box_center, axis=1) + radii).max()
+        self._bounding_sphere = (box_center, float(box_radius))
+        return self._bounding_sphere
+
+    @property
+    def shadow_signature(self):
+        return super().shadow_signature + (self._instance_attribute.version,)
+
+    @property
+    def instance_count(self):
+        return len(self._instance_attribute.data)
+
+    @property
+    def instance_matrices(self):
+        """ Return array of shape (N, 4, 4) of instance model matrices """
+        return self._transpose(self._instance_attribute.data)
+
+    def set_instance_matrices(self, instance_matrices):
+        """ Replace all instance matrices; the number of instances may change """
+        self._instance_attribute.data = self._transpose(instance_matrices)
+        self._instance_attribute.upload_data()
+        self.invalidate_bounds()
+
+    def update_instance_matrices(self, instance_matrices, start=0):
+        """ Replace the matrices of instances start, start + 1, ... and upload only this range """
+        self._instance_attribute.update_data(self._transpose(instance_matrices), start)
+        self.invalidate_bounds()
+
+    @staticmethod
+    def _transpose(matrices):
+        matrices = np.asarray(matrices, dtype=np.float32).reshape(-1, 4, 4)
+        return np.ascontiguousarray(matrices.transpose(0, 2, 1))
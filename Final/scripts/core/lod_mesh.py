@@ -0,0 +1,82 @@
+import numpy as np
+
+from scripts.core.mesh import Mesh
+
+
+class LODMesh(Mesh):
+    """
+    Mesh with several levels of detail: geometries of the same shape, from finest to coarsest
+    (e.g. from SphereGeometry.make_levels), sharing one material.
+    Each frame the renderer selects the level by the projected size of the bounding sphere on screen.
+    The shadow pass may draw a coarser level than the main pass.
+    """
+    def __init__(self, geometry_list, material, screen_size_list=None, hysteresis=0.1, shadow_level_offset=1):
+        super().__init__(geometry_list[0], material)
+        self._geometry_list = geometry_list
+        self._vao_ref_list = [self._vao_ref] + [self._create_vertex_array(geometry, material)
+                                                for geometry in geometry_list[1:]]
+        # Minimum projected diameter in pixels of each level but the last
+        if screen_size_list is None:
+            screen_size_list = [256 / 2 ** level for level in range(len(geometry_list) - 1)]
+        if len(screen_size_list) != len(geometry_list) - 1:
+            raise Exception("LODMesh needs one screen size less than the number of levels")
+        self._screen_size_list = screen_size_list
+        # Fraction by which the size must leave the range of the current level before switching,
+        # so that the level does not change back and forth for sizes close to a threshold
+        self._hysteresis = hysteresis
+        # Number of levels coarser than the current level used in the shadow pass
+        self._shadow_level_offset = shadow_level_offset
+        self._level = 0
+
+    @property
+    def geometry(self):
+        return self._geometry_list[self._level]
+
+    @property
+    def geometry_list(self):
+        return self._geometry_list
+
+    @property
+    def level(self):
+        return self._level
+
+    @property
+    def shadow_geometry(self):
+        return self._geometry_list[self.shadow_level]
+
+    @property
+    def shadow_level(self):
+        return min(self._level + self._shadow_level_offset, len(self._geometry_list) - 1)
+
+    @property
+    def shadow_vao_ref(self):
+        return self._vao_ref_list[self.shadow_level]
+
+    @property
+    def vao_ref(self):
+        return self._vao_ref_list[self._level]
+
+    def select_level(self, camera, viewport_height):
+        """ Choose the level for a camera with up-to-date view matrix and a viewport of the given height """
+        screen_size = self.get_screen_size(camera, viewport_height)
+        level = self._level
+        lower_size = self._screen_size_list[level] * (1 - self._hysteresis) \
+            if level < len(self._screen_size_list) else 0
+        upper_size = self._screen_size_list[level - 1] * (1 + self._hysteresis) if level > 0 else np.inf
+        if not lower_size <= screen_size < upper_size:
+            # Number of thresholds the size is below
+            self._level = sum(screen_size < size for size in self._screen_size_list)
+
+    def get_screen_size(self, camera, viewport_height):
+        """ Return the projected diameter of the bounding sphere in pixels """
+        bounding_sphere = self.world_bounding_sphere
+        if bounding_sphere is None:
+            return np.inf
+        center, radius = bounding_sphere
+        view_center = camera.view_matrix @ np.append(center, 1)
+        # w coordinate after projection: distance for perspective, 1 for orthographic projection
+        w = camera.projection_matrix[3] @ view_center
+        # Perspective camera inside or close to the sphere
+        if camera.projection_matrix[3, 3] == 0 and w <= radius:
+            return np.inf
+        return radius * camera.projection_matrix[1, 1] / w * viewport_height
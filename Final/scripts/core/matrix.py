@@ -111,3 +111,69 @@ class Matrix:
              [right[2], up[2], -forward[2], position[2]],
              [0, 0, 0, 1]]
         ).astype(float)
+
+    @staticmethod
+    def make_rotation_from_quaternion(quaternion):
+        """ Return the rotation matrix of a unit quaternion (x, y, z, w) """
+        x, y, z, w = quaternion
+        return np.array(
+            [[1 - 2 * (y * y + z * z), 2 * (x * y - z * w), 2 * (x * z + y * w), 0],
+             [2 * (x * y + z * w), 1 - 2 * (x * x + z * z), 2 * (y * z - x * w), 0],
+             [2 * (x * z - y * w), 2 * (y * z + x * w), 1 - 2 * (x * x + y * y), 0],
+             [0, 0, 0, 1]]
+        ).astype(float)
+
+    @staticmethod
+    def get_quaternion(rotation):
+        """ Return the unit quaternion (x, y, z, w) of the rotation in the upper left 3x3 part of a matrix """
+        m = rotation
+        trace = m[0][0] + m[1][1] + m[2][2]
+        # Divide by the largest of the four possible values, for numerical stability
+        if trace > 0:
+            s = 2 * math.sqrt(trace + 1)
+            quaternion = [(m[2][1] - m[1][2]) / s, (m[0][2] - m[2][0]) / s, (m[1][0] - m[0][1]) / s, s / 4]
+        elif m[0][0] > m[1][1] and m[0][0] > m[2][2]:
+            s = 2 * math.sqrt(1 + m[0][0] - m[1][1] - m[2][2])
+            quaternion = [s / 4, (m[0][1] + m[1][0]) / s, (m[0][2] + m[2][0]) / s, (m[2][1] - m[1][2]) / s]
+        elif m[1][1] > m[2][2]:
+            s = 2 * math.sqrt(1 + m[1][1] - m[0][0] - m[2][2])
+            quaternion = [(m[0][1] + m[1][0]) / s, s / 4, (m[1][2] + m[2][1]) / s, (m[0][2] - m[2][0]) / s]
+        else:
+            s = 2 * math.sqrt(1 + m[2][2] - m[0][0] - m[1][1])
+            quaternion = [(m[0][2] + m[2][0]) / s, (m[1][2] + m[2][1]) / s, s / 4, (m[1][0] - m[0][1]) / s]
+        quaternion = np.array(quaternion)
+        return quaternion / np.linalg.norm(quaternion)
+
+    @staticmethod
+    def slerp(quaternion_a, quaternion_b, alpha):
+        """ Return the unit quaternion at fraction alpha of the shortest rotation from a to b """
+        quaternion_a = np.asarray(quaternion_a, dtype=float)
+        quaternion_b = np.asarray(quaternion_b, dtype=float)
+        cos_angle = float(np.dot(quaternion_a, quaternion_b))
+        # q and -q are the same rotation; take the shorter way
+        if cos_angle < 0:
+            quaternion_b = -quaternion_b
+            cos_angle = -cos_angle
+        # Nearly equal rotations: linear interpolation avoids dividing by sin(angle) close to 0
+        if cos_angle > 0.9995:
+            quaternion = quaternion_a + alpha * (quaternion_b - quaternion_a)
+            return quaternion / np.linalg.norm(quaternion)
+        angle = math.acos(cos_angle)
+        sin_angle = math.sin(angle)
+        return (math.sin((1 - alpha) * angle) * quaternion_a + math.sin(alpha * angle) * quaternion_b) / sin_angle
+
+    @staticmethod
+    def interpolate(matrix_a, matrix_b, alpha):
+        """
+        Return the transform at fraction alpha between two transforms made of
+        translation, rotation and scale: translation and scale are interpolated linearly,
+        rotation along the shortest arc
+        """
+        scale_a = np.linalg.norm(matrix_a[0:3, 0:3], axis=0)
+        scale_b = np.linalg.norm(matrix_b[0:3, 0:3], axis=0)
+        quaternion = Matrix.slerp(Matrix.get_quaternion(matrix_a[0:3, 0:3] / scale_a),
+                                  Matrix.get_quaternion(matrix_b[0:3, 0:3] / scale_b), alpha)
+        matrix = Matrix.make_rotation_from_quaternion(quaternion)
+        matrix[0:3, 0:3] *= scale_a + alpha * (scale_b - scale_a)
+        matrix[0:3, 3] = matrix_a[0:3, 3] + alpha * (matrix_b[0:3, 3] - matrix_a[0:3, 3])
+        return matrix
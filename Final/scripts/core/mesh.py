@@ -1,4 +1,5 @@
 import OpenGL.GL as GL
+import numpy as np
 
 from scripts.core.object3d import Object3D
 
@@ -14,27 +15,122 @@ class Mesh(Object3D):
         self._material = material
         # Should this object be rendered?
         self._visible = True
-        # Set up associations between attributes stored in geometry
-        # and shader program stored in material
-        self._vao_ref = GL.glGenVertexArrays(1)
-        GL.glBindVertexArray(self._vao_ref)
-        for variable_name, attribute_object in geometry.attribute_dict.items():
-            attribute_object.associate_variable(material.program_ref, variable_name)
-        # Unbind this vertex array object
-        GL.glBindVertexArray(0)
+        # Is this object drawn in the shadow pass, i.e. does it cast shadows?
+        self._cast_shadow = True
+        # Are shadows drawn on this object (by materials supporting shadows)?
+        self._receive_shadow = True
+        # Object notified when the world-space bounds change (BoundingVolumeHierarchy of the scene)
+        self._bounds_listener = None
+        self._vao_ref = self._create_vertex_array(geometry, material)
+
+    @property
+    def bounds_listener(self):
+        return self._bounds_listener
+
+    @bounds_listener.setter
+    def bounds_listener(self, bounds_listener):
+        self._bounds_listener = bounds_listener
+
+    @property
+    def cast_shadow(self):
+        return self._cast_shadow
+
+    @cast_shadow.setter
+    def cast_shadow(self, cast_shadow):
+        self._cast_shadow = cast_shadow
+
+    @property
+    def receive_shadow(self):
+        return self._receive_shadow
+
+    @receive_shadow.setter
+    def receive_shadow(self, receive_shadow):
+        self._receive_shadow = receive_shadow
+
+    @property
+    def shadow_signature(self):
+        """ Return a value that changes whenever the depth drawn in the shadow pass may change """
+        position_attribute = self.shadow_geometry.attribute_dict.get("vertexPosition")
+        return (self, self.transform_version, self.shadow_vao_ref,
+                None if position_attribute is None else position_attribute.version)
+
+    @property
+    def bounding_sphere(self):
+        """ Return (center, radius) of a sphere containing the mesh in its local coordinates, or None """
+        return self._geometry.bounding_sphere
 
     @property
     def geometry(self):
         return self._geometry
 
+    @property
+    def world_bounding_sphere(self):
+        """ Return (center, radius) of a sphere containing the mesh in world coordinates, or None """
+        bounding_sphere = self.bounding_sphere
+        if bounding_sphere is None:
+            return None
+        center, radius = bounding_sphere
+        matrix = self.global_matrix
+        world_center = matrix[0:3, 0:3] @ center + matrix[0:3, 3]
+        # Scale the radius by the largest scale factor of the matrix
+        scale = np.sqrt((matrix[0:3, 0:3] ** 2).sum(axis=0).max())
+        return world_center, radius * scale
+
+    @property
+    def shadow_geometry(self):
+        """ Geometry drawn in the shadow pass """
+        return self.geometry
+
+    @property
+    def shadow_vao_ref(self):
+        return self.vao_ref
+
+    @property
+    def instance_count(self):
+        """ Number of instances drawn by instanced drawing; None for a single mesh """
+        return None
+
     @property
     def material(self):
         return self._material
 
+    def select_level(self, camera, viewport_height):
+        """ Choose the geometry to draw for the camera; only meshes with several levels of detail do so """
+        pass
+
+    def invalidate_bounds(self):
+        """
+        Report that the world-space bounds have changed.
+        Called automatically when the transform changes;
+        call after changing the vertex positions of the geometry.
+        """
+        if self._bounds_listener is not None:
+            self._bounds_listener.mark_moved(self)
+
+    def _global_matrix_changed(self):
+        self.invalidate_bounds()
+
     @property
     def vao_ref(self):
         return self._vao_ref
 
+    @staticmethod
+    def _create_vertex_array(geometry, material):
+        """
+        Set up associations between attributes stored in geometry
+        and shader program stored in material; return reference of the vertex array object
+        """
+        vao_ref = GL.glGenVertexArrays(1)
+        GL.glBindVertexArray(vao_ref)
+        for variable_name, attribute_object in geometry.attribute_dict.items():
+            attribute_object.associate_variable(material.program_ref, variable_name)
+        # Indexed geometry: the element buffer is stored in the vertex array object
+        if geometry.index_attribute is not None:
+            geometry.index_attribute.bind()
+        # Unbind this vertex array object
+        GL.glBindVertexArray(0)
+        return vao_ref
+
     @property
     def visible(self):
         return self._visible
@@ -4,11 +4,29 @@ from scripts.core.matrix import Matrix
 
 class Object3D:
     """ Represent a node in the scene graph tree structure """
+    # Incremented whenever global matrices become outdated; source of transform versions
+    _transform_stamp = 0
+    # TransformStores with changes not yet composed into matrices;
+    # updated before any global matrix or transform version is read
+    _pending_transform_store_set = set()
+
     def __init__(self):
         # local transform matrix with respect to the parent of the object
         self._matrix = Matrix.make_identity()
         self._parent = None
         self._children_list = []
+        # Cached transform relative to the root of the scene graph;
+        # recalculated when this object or one of its ancestors has changed
+        self._global_matrix = None
+        self._global_matrix_dirty = True
+        # Changes whenever the global matrix changes, so that results depending on it can be cached
+        self._transform_version = 0
+        # Cached list of this object and all its descendants;
+        # None when the subtree has changed since the list was made
+        self._descendant_list = None
+        # TransformStore and slot holding the transform instead of the matrices above, if bound
+        self._transform_store = None
+        self._transform_slot = None
 
     @property
     def children_list(self):
@@ -17,50 +35,97 @@ class Object3D:
     @children_list.setter
     def children_list(self, children_list):
         self._children_list = children_list
+        self.invalidate_descendant_list()
 
     @property
     def descendant_list(self):
-        """ Return a single list containing all descendants """
-        # master list of all descendant nodes
-        descendant_list = []
-        # nodes to be added to descendant list,
-        # and whose children will be added to this list
-        nodes_to_process = [self]
-        # continue processing nodes while any are left
-        while len(nodes_to_process) > 0:
-            # remove first node from list
-            node = nodes_to_process.pop(0)
-            # add this node to descendant list
-            descendant_list.append(node)
-            # children of this node must also be processed
-            nodes_to_process = node._children_list + nodes_to_process
-        return descendant_list
+        """
+        Return a single list containing all descendants.
+        The list is cached until a node is added to or removed from the subtree;
+        do not modify it.
+        """
+        if self._descendant_list is None:
+            # master list of all descendant nodes
+            descendant_list = []
+            # stack of nodes to be added to descendant list,
+            # and whose children will be added to this list
+            nodes_to_process = [self]
+            # continue processing nodes while any are left
+            while nodes_to_process:
+                # remove last node from stack
+                node = nodes_to_process.pop()
+                # add this node to descendant list
+                descendant_list.append(node)
+                # children of this node must also be processed;
+                # push them in reverse order, so that the first child is processed next
+                nodes_to_process.extend(reversed(node._children_list))
+            self._descendant_list = descendant_list
+        return self._descendant_list
 
     @property
     def global_matrix(self):
         """
         Calculate the transformation of this Object3D
-        relative to the root Object3D of the scene graph
+        relative to the root Object3D of the scene graph.
+        The result is cached until this object or one of its ancestors changes.
         """
-        if self._parent is None:
-            return self._matrix
-        else:
-            return self._parent.global_matrix @ self._matrix
+        if Object3D._pending_transform_store_set:
+            Object3D.update_transform_stores()
+        if self._transform_store is not None:
+            return self._transform_store.get_world_matrix(self._transform_slot)
+        if self._global_matrix_dirty:
+            if self._parent is None:
+                self._global_matrix = self._matrix
+            else:
+                self._global_matrix = self._parent.global_matrix @ self._matrix
+            self._global_matrix_dirty = False
+        return self._global_matrix
 
     @property
     def global_position(self):
         """ Return the global or world position of the object """
-        return [self.global_matrix.item((0, 3)),
-                self.global_matrix.item((1, 3)),
-                self.global_matrix.item((2, 3))]
+        global_matrix = self.global_matrix
+        return [global_matrix.item((0, 3)),
+                global_matrix.item((1, 3)),
+                global_matrix.item((2, 3))]
+
+    @property
+    def transform_version(self):
+        """ Return a number that changes whenever the global matrix of this object changes """
+        if Object3D._pending_transform_store_set:
+            Object3D.update_transform_stores()
+        if self._transform_store is not None:
+            return self._transform_store.get_version(self._transform_slot)
+        return self._transform_version
+
+    @property
+    def transform_store(self):
+        """ TransformStore holding the transform of this object, or None """
+        return self._transform_store
+
+    @property
+    def transform_slot(self):
+        """ Slot of this object in its TransformStore, or None """
+        return self._transform_slot
 
     @property
     def local_matrix(self):
+        """
+        Return the local transform matrix.
+        Do not modify the returned matrix in place; assign a new matrix instead,
+        so that cached global matrices are updated.
+        """
+        if self._transform_store is not None:
+            return self._transform_store.get_local_matrix(self._transform_slot)
         return self._matrix
 
     @local_matrix.setter
     def local_matrix(self, matrix):
+        if self._transform_store is not None:
+            self._transform_store.set_local_matrix(self._transform_slot, matrix)
+            return
         self._matrix = matrix
+        self.invalidate_global_matrix()
 
     @property
     def local_position(self):
@@ -69,9 +134,10 @@ class Object3D:
         """
         # The position of an object can be determined from entries in the
         # last column of the transform matrix
-        return [self._matrix.item((0, 3)),
-                self._matrix.item((1, 3)),
-                self._matrix.item((2, 3))]
+        local_matrix = self.local_matrix
+        return [local_matrix.item((0, 3)),
+                local_matrix.item((1, 3)),
+                local_matrix.item((2, 3))]
 
     @property
     def parent(self):
@@ -80,6 +146,10 @@ class Object3D:
     @parent.setter
     def parent(self, parent):
         self._parent = parent
+        if self._transform_store is not None:
+            self._transform_store.update_parent(self)
+        else:
+            self.invalidate_global_matrix()
 
     @property
     def rotation_matrix(self):
@@ -87,10 +157,11 @@ class Object3D:
         Returns 3x3 submatrix with rotation data.
         3x3 top-left submatrix contains only rotation data.
         """
+        local_matrix = self.local_matrix
         return np.array(
-            [self._matrix[0][0:3],
-             self._matrix[1][0:3],
-             self._matrix[2][0:3]]
+            [local_matrix[0][0:3],
+             local_matrix[1][0:3],
+             local_matrix[2][0:3]]
         ).astype(float)
 
     @property
@@ -98,22 +169,75 @@ class Object3D:
         forward = np.array([0, 0, -1]).astype(float)
         return list(self.rotation_matrix @ forward)
 
+    def invalidate_global_matrix(self):
+        """ Mark the cached global matrices of this object and all its descendants as outdated """
+        Object3D._transform_stamp += 1
+        nodes_to_process = [self]
+        while nodes_to_process:
+            node = nodes_to_process.pop()
+            # Bound nodes and their descendants are updated by their store
+            if node._transform_store is not None:
+                node._transform_store.mark_changed(node._transform_slot)
+                continue
+            # Descendants of an outdated node are already outdated
+            if node._global_matrix_dirty and node is not self:
+                continue
+            node._global_matrix_dirty = True
+            node._transform_version = Object3D._transform_stamp
+            node._global_matrix_changed()
+            nodes_to_process.extend(node._children_list)
+
+    def _global_matrix_changed(self):
+        """ Called when the global matrix becomes outdated; overridden by subclasses depending on it """
+        pass
+
+    def _bind_transform(self, transform_store, transform_slot):
+        """ Called by TransformStore.bind """
+        self._transform_store = transform_store
+        self._transform_slot = transform_slot
+
+    def _unbind_transform(self, matrix):
+        """ Called by TransformStore.unbind with the local matrix """
+        self._transform_store = None
+        self._transform_slot = None
+        self._matrix = matrix
+        self.invalidate_global_matrix()
+
+    @staticmethod
+    def update_transform_stores():
+        """ Compose the matrices of all TransformStores with changes """
+        # Updating a store may invalidate unbound nodes above slots of another store (or of itself),
+        # which are then pending again
+        while Object3D._pending_transform_store_set:
+            next(iter(Object3D._pending_transform_store_set)).update()
+
+    def invalidate_descendant_list(self):
+        """ Mark the cached descendant lists of this object and all its ancestors as outdated """
+        node = self
+        while node is not None:
+            node._descendant_list = None
+            node = node._parent
+
     def add(self, child):
         self._children_list.append(child)
         child.parent = self
+        self.invalidate_descendant_list()
+        if self._transform_store is not None and child.transform_store is not self._transform_store:
+            self._transform_store.add_unbound_child(self)
 
     def remove(self, child):
         self._children_list.remove(child)
         child.parent = None
+        self.invalidate_descendant_list()
 
     # apply geometric transformations
     def apply_matrix(self, matrix, local=True):
         if local:
             # local transform
-            self._matrix = self._matrix @ matrix
+            self.local_matrix = self.local_matrix @ matrix
         else:
             # global transform
-            self._matrix = matrix @ self._matrix
+            self.local_matrix = matrix @ self.local_matrix
 
     def translate(self, x, y, z, local=True):
         m = Matrix.make_translation(x, y, z)
@@ -137,12 +261,16 @@ class Object3D:
 
     def set_position(self, position):
         """ Set the local position of the object """
+        if self._transform_store is not None:
+            self._transform_store.set_positions(self._transform_slot, position)
+            return
         self._matrix.itemset((0, 3), position[0])
         self._matrix.itemset((1, 3), position[1])
         self._matrix.itemset((2, 3), position[2])
+        self.invalidate_global_matrix()
 
     def look_at(self, target_position):
-        self._matrix = Matrix.make_look_at(self.global_position, target_position)
+        self.local_matrix = Matrix.make_look_at(self.global_position, target_position)
 
     def set_direction(self, direction):
         position = self.local_position
@@ -0,0 +1,190 @@
+import csv
+import ctypes
+import json
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import OpenGL.GL as GL
+from OpenGL.raw.GL.VERSION.GL_3_3 import glGetQueryObjectui64v
+
+
+class Profiler:
+    """
+    Measures the CPU and GPU time of nested named scopes in each frame, and collects counters
+    (draw calls, triangles, uniform uploads, program switches) added by the renderer.
+    GPU times come from GL_TIMESTAMP queries at the start and end of each scope; unlike
+    GL_TIME_ELAPSED queries, these may be nested. Queries are double-buffered: the results of a frame
+    are read when the next frame ends, when the GPU has usually finished it, so reading does not stall.
+    Results of the last history_length frames are kept for averages and logs.
+    Scope names are joined by "/" with the names of the enclosing scopes.
+    """
+    BUFFER_COUNT = 2
+
+    def __init__(self, gpu_timing=True, history_length=300):
+        self._gpu_timing = gpu_timing
+        # Finished frames: {"frame": number, "cpu_ms": {path: ms}, "gpu_ms": {path: ms}, "counters": {name: count}}
+        self._history = deque(maxlen=history_length)
+        self._frame_number = 0
+        # Frame being measured, and frame whose queries are not yet read
+        self._frame = None
+        self._pending_frame = None
+        # Names of the open scopes
+        self._scope_name_list = []
+        # Query objects of each buffer, reused by later frames
+        self._query_list_list = [[] for _ in range(Profiler.BUFFER_COUNT)]
+        self._used_query_count = 0
+
+    @property
+    def history(self):
+        return self._history
+
+    @property
+    def latest_frame(self):
+        """ Results of the most recent frame whose GPU times are known, or None """
+        return self._history[-1] if self._history else None
+
+    def begin_frame(self):
+        if self._frame is not None:
+            raise Exception("Profiler frame already begun")
+        self._frame = {"frame": self._frame_number, "cpu_ms": {}, "gpu_ms": {}, "counters": {},
+                       # (path, start query, end query) of each scope
+                       "query_list": []}
+        self._frame_number += 1
+        self._used_query_count = 0
+
+    def end_frame(self):
+        if self._frame is None:
+            raise Exception("Profiler frame not begun")
+        # The queries of the previous frame are read now, and those of this frame at the end of the next one
+        if self._pending_frame is not None:
+            self._finish_frame(self._pending_frame)
+        self._pending_frame = self._frame
+        self._frame = None
+
+    def flush(self):
+        """ Read the queries of the last frame, waiting for the GPU if needed, e.g. before writing a log """
+        if self._pending_frame is not None:
+            self._finish_frame(self._pending_frame)
+            self._pending_frame = None
+
+    @contextmanager
+    def scope(self, name):
+        """ Measure the enclosed code as scope with given name; use in a with statement """
+        if self._frame is None:
+            yield
+            return
+        self._scope_name_list.append(name)
+        path = "/".join(self._scope_name_list)
+        # Added on entry, so that enclosing scopes come before the nested ones in reports
+        self._frame["cpu_ms"].setdefault(path, 0.0)
+        start_query = self._query_timestamp()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            cpu_ms = (time.perf_counter() - start) * 1000
+            end_query = self._query_timestamp()
+            # Scopes entered several times in a frame are added up
+            self._frame["cpu_ms"][path] += cpu_ms
+            if start_query is not None:
+                self._frame["query_list"].append((path, start_query, end_query))
+            self._scope_name_list.pop()
+
+    def add_counters(self, counter_dict):
+        """ Add counts (e.g. draw calls of a render call) to the counters of the current frame """
+        if self._frame is None:
+            return
+        counters = self._frame["counters"]
+        for name, count in counter_dict.items():
+            counters[name] = counters.get(name, 0) + count
+
+    def get_averages(self, frame_count=60):
+        """ Return {"cpu_ms": {path: ms}, "gpu_ms": {path: ms}, "counters": {name: count}} averaged over recent frames """
+        frame_list = list(self._history)[-frame_count:]
+        average_dict = {"cpu_ms": {}, "gpu_ms": {}, "counters": {}}
+        for frame in frame_list:
+            for key, average in average_dict.items():
+                for name, value in frame[key].items():
+                    average[name] = average.get(name, 0) + value / len(frame_list)
+        return average_dict
+
+    def get_report_rows(self, frame_count=60):
+        """ Return rows (name, CPU ms, GPU ms) of text with averaged times of all scopes, then (name, count, "") of counters """
+        average_dict = self.get_averages(frame_count)
+        row_list = [("scope", "CPU ms", "GPU ms")]
+        for path, cpu_ms in average_dict["cpu_ms"].items():
+            gpu_ms = average_dict["gpu_ms"].get(path)
+            # Indent nested scopes and show only the last name
+            name = "  " * path.count("/") + path.rsplit("/", 1)[-1]
+            row_list.append((name, f"{cpu_ms:.2f}", f"{gpu_ms:.2f}" if gpu_ms is not None else "-"))
+        for name, count in average_dict["counters"].items():
+            row_list.append((name, f"{count:.0f}", ""))
+        return row_list
+
+    def format_report(self, frame_count=60):
+        """ Return lines of text with averaged times of all scopes and counters, in aligned columns """
+        return [f"{name[:36]:<36}{cpu_text:>8}{gpu_text:>8}"
+                for name, cpu_text, gpu_text in self.get_report_rows(frame_count)]
+
+    def write_csv(self, file_name):
+        """ Write the kept frames to a CSV file, one row per frame and columns for all scopes and counters """
+        self.flush()
+        counter_name_list = []
+        path_list = []
+        for frame in self._history:
+            counter_name_list.extend(name for name in frame["counters"] if name not in counter_name_list)
+            path_list.extend(path for path in frame["cpu_ms"] if path not in path_list)
+        with open(file_name, "w", newline="") as csv_file:
+            writer = csv.writer(csv_file)
+            writer.writerow(["frame"] + counter_name_list
+                            + [f"{path} {kind}" for path in path_list for kind in ("cpu_ms", "gpu_ms")])
+            for frame in self._history:
+                row = [frame["frame"]] + [frame["counters"].get(name, 0) for name in counter_name_list]
+                for path in path_list:
+                    row.append(frame["cpu_ms"].get(path, ""))
+                    row.append(frame["gpu_ms"].get(path, ""))
+                writer.writerow(row)
+
+    def write_json(self, file_name):
+        self.flush()
+        with open(file_name, "w") as json_file:
+            json.dump(list(self._history), json_file, indent=1)
+
+    def write_log(self, file_name):
+        """ Write the kept frames as JSON or CSV, depending on the file name extension """
+        if file_name.endswith(".json"):
+            self.write_json(file_name)
+        else:
+            self.write_csv(file_name)
+
+    def delete(self):
+        """ Delete the query objects """
+        for query_list in self._query_list_list:
+            if query_list:
+                GL.glDeleteQueries(len(query_list), query_list)
+        self._query_list_list = [[] for _ in range(Profiler.BUFFER_COUNT)]
+
+    def _query_timestamp(self):
+        """ Record the GPU time when the commands issued so far have been executed; return the query """
+        if not self._gpu_timing:
+            return None
+        query_list = self._query_list_list[self._frame["frame"] % Profiler.BUFFER_COUNT]
+        if self._used_query_count == len(query_list):
+            query_list.append(int(GL.glGenQueries(1)))
+        query = query_list[self._used_query_count]
+        self._used_query_count += 1
+        GL.glQueryCounter(query, GL.GL_TIMESTAMP)
+        return query
+
+    def _finish_frame(self, frame):
+        """ Read the GPU times of the frame and add it to the history """
+        result = ctypes.c_uint64()
+        for path, start_query, end_query in frame["query_list"]:
+            glGetQueryObjectui64v(start_query, GL.GL_QUERY_RESULT, ctypes.byref(result))
+            start = result.value
+            glGetQueryObjectui64v(end_query, GL.GL_QUERY_RESULT, ctypes.byref(result))
+            gpu_ms = (result.value - start) / 1e6
+            frame["gpu_ms"][path] = frame["gpu_ms"].get(path, 0.0) + gpu_ms
+        del frame["query_list"]
+        self._history.append(frame)
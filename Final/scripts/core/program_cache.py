@@ -0,0 +1,167 @@
+import hashlib
+import os
+import time
+
+import OpenGL.GL as GL
+import numpy as np
+from OpenGL.error import GLError
+
+from scripts.core.uniform import Uniform
+from scripts.core.utils import Utils
+
+
+class ProgramCache:
+    """
+    Process-wide cache of linked shader programs, keyed by a hash of the vertex and fragment shader code,
+    so that materials generating identical code share one program.
+    If the driver supports program binaries (GL_ARB_get_program_binary),
+    linked programs are also stored on disk and loaded from there by later runs;
+    a binary rejected by the driver (e.g. after a driver update) is replaced by compiling the code.
+    Time spent creating programs is recorded for reporting.
+    """
+    # Increase when the layout of cached files changes
+    VERSION = 1
+    DIRECTORY_NAME = os.path.join(".cache", "programs")
+    # Store binaries on disk; set to False to always compile
+    use_binary_cache = True
+    # program key -> program reference
+    _program_dict = {}
+    # Statistics since the last reset
+    _hit_count = 0
+    _compile_count = 0
+    _binary_load_count = 0
+    _compile_time = 0.0
+    _binary_load_time = 0.0
+
+    @staticmethod
+    def get_program(vertex_shader_code, fragment_shader_code):
+        """ Return reference of a program made from the code, creating the program if needed """
+        key = ProgramCache.program_key(vertex_shader_code, fragment_shader_code)
+        program_ref = ProgramCache._program_dict.get(key)
+        if program_ref is not None:
+            ProgramCache._hit_count += 1
+            return program_ref
+        binary_enabled = ProgramCache.use_binary_cache and ProgramCache.binary_supported()
+        start = time.perf_counter()
+        program_ref = ProgramCache.load_binary(key) if binary_enabled else None
+        if program_ref is not None:
+            ProgramCache._binary_load_count += 1
+            ProgramCache._binary_load_time += time.perf_counter() - start
+        else:
+            program_ref = Utils.initialize_program(vertex_shader_code, fragment_shader_code,
+                                                   retrievable=binary_enabled)
+            ProgramCache._compile_count += 1
+            ProgramCache._compile_time += time.perf_counter() - start
+            if binary_enabled:
+                ProgramCache.save_binary(key, program_ref)
+        ProgramCache._program_dict[key] = program_ref
+        return program_ref
+
+    @staticmethod
+    def program_key(vertex_shader_code, fragment_shader_code):
+        """ Return hash of the shader code; binaries are only valid for the same driver, so it is included """
+        renderer = GL.glGetString(GL.GL_RENDERER) or b""
+        version = GL.glGetString(GL.GL_VERSION) or b""
+        hash_object = hashlib.sha1()
+        for part in (str(ProgramCache.VERSION).encode("utf-8"), renderer, version,
+                     vertex_shader_code.encode("utf-8"), fragment_shader_code.encode("utf-8")):
+            hash_object.update(part)
+            # Separator, so that different splits of the same text give different keys
+            hash_object.update(b"\0")
+        return hash_object.hexdigest()
+
+    @staticmethod
+    def binary_supported():
+        return GL.glGetIntegerv(GL.GL_NUM_PROGRAM_BINARY_FORMATS) > 0
+
+    @staticmethod
+    def file_path(key):
+        return os.path.join(ProgramCache.DIRECTORY_NAME, key + ".bin")
+
+    @staticmethod
+    def load_binary(key):
+        """ Return reference of a program created from the stored binary, or None if unavailable """
+        file_name = ProgramCache.file_path(key)
+        if not os.path.isfile(file_name):
+            return None
+        try:
+            with open(file_name, "rb") as binary_file:
+                data = binary_file.read()
+        except OSError:
+            return None
+        # First four bytes store the binary format
+        if len(data) <= 4:
+            return None
+        binary_format = int(np.frombuffer(data[:4], dtype=np.uint32)[0])
+        binary = np.frombuffer(data[4:], dtype=np.uint8)
+        program_ref = GL.glCreateProgram()
+        try:
+            GL.glProgramBinary(program_ref, binary_format, binary, len(binary))
+            link_success = GL.glGetProgramiv(program_ref, GL.GL_LINK_STATUS)
+        except GLError:
+            link_success = False
+        if not link_success:
+            GL.glDeleteProgram(program_ref)
+            os.remove(file_name)
+            return None
+        return program_ref
+
+    @staticmethod
+    def save_binary(key, program_ref):
+        length = GL.glGetProgramiv(program_ref, GL.GL_PROGRAM_BINARY_LENGTH)
+        if length <= 0:
+            return
+        binary = np.zeros(length, dtype=np.uint8)
+        binary_format = np.zeros(1, dtype=np.uint32)
+        written_length = np.zeros(1, dtype=np.int32)
+        GL.glGetProgramBinary(program_ref, length, written_length, binary_format, binary)
+        file_name = ProgramCache.file_path(key)
+        os.makedirs(ProgramCache.DIRECTORY_NAME, exist_ok=True)
+        # Write to a temporary file first, so that an interrupted save never leaves a partial file
+        temporary_file_name = f"{file_name}.{os.getpid()}.tmp"
+        with open(temporary_file_name, "wb") as binary_file:
+            binary_file.write(binary_format.tobytes())
+            binary_file.write(binary[:written_length[0]].tobytes())
+        os.replace(temporary_file_name, file_name)
+
+    @staticmethod
+    def clear(delete_files=False):
+        """
+        Delete all cached programs, e.g. before the OpenGL context is destroyed;
+        materials using them must not be used afterwards
+        """
+        for program_ref in ProgramCache._program_dict.values():
+            GL.glDeleteProgram(program_ref)
+            Uniform.forget_program(program_ref)
+        ProgramCache._program_dict = {}
+        if delete_files and os.path.isdir(ProgramCache.DIRECTORY_NAME):
+            for file_name in os.listdir(ProgramCache.DIRECTORY_NAME):
+                os.remove(os.path.join(ProgramCache.DIRECTORY_NAME, file_name))
+
+    @staticmethod
+    def reset_statistics():
+        ProgramCache._hit_count = 0
+        ProgramCache._compile_count = 0
+        ProgramCache._binary_load_count = 0
+        ProgramCache._compile_time = 0.0
+        ProgramCache._binary_load_time = 0.0
+
+    @staticmethod
+    def get_statistics():
+        """ Return dictionary of numbers of programs and seconds spent creating them """
+        return {
+            "program_count": len(ProgramCache._program_dict),
+            "hit_count": ProgramCache._hit_count,
+            "compile_count": ProgramCache._compile_count,
+            "binary_load_count": ProgramCache._binary_load_count,
+            "compile_time": ProgramCache._compile_time,
+            "binary_load_time": ProgramCache._binary_load_time,
+        }
+
+    @staticmethod
+    def print_statistics():
+        statistics = ProgramCache.get_statistics()
+        print(f"Shader programs: {statistics['program_count']} "
+              f"({statistics['hit_count']} shared, {statistics['compile_count']} compiled "
+              f"in {statistics['compile_time'] * 1000:.1f} ms, {statistics['binary_load_count']} loaded "
+              f"from binary cache in {statistics['binary_load_time'] * 1000:.1f} ms)")
@@ -0,0 +1,54 @@
+import numpy as np
+
+from scripts.core.matrix import Matrix
+
+
+class TransformInterpolator:
+    """
+    Shows the nodes of scene graphs at a time between two simulation steps.
+    Before the last simulation step of a frame, the local matrices of all nodes are saved
+    as previous state; after it, as current state. Nodes whose matrix changed in the step
+    are then set to a matrix interpolated between both states. Before the first step of
+    the next frame, restore sets them to the current state again, so that the simulation
+    always continues from the simulated matrices and its results do not depend on the
+    interpolation. Unchanged nodes are never touched, so that caches depending on their
+    transforms (e.g. of the shadow pass) stay valid.
+    """
+    def __init__(self, root_list):
+        self._root_list = root_list
+        # Local matrices of the nodes, indexed by node
+        self._previous_matrix_dict = {}
+        self._current_matrix_dict = {}
+        # Nodes showing interpolated matrices
+        self._moving_node_list = []
+        self._interpolated = False
+
+    def save_previous(self):
+        """ Save the state before the last simulation step of the frame """
+        self._previous_matrix_dict = self._save()
+
+    def save_current(self):
+        """ Save the state after the last simulation step of the frame """
+        self._current_matrix_dict = self._save()
+        self._moving_node_list = [node for node, matrix in self._current_matrix_dict.items()
+                                  if node in self._previous_matrix_dict
+                                  and not np.array_equal(matrix, self._previous_matrix_dict[node])]
+
+    def interpolate(self, alpha):
+        """ Set the moving nodes to the state at fraction alpha from the previous to the current state """
+        for node in self._moving_node_list:
+            node.local_matrix = Matrix.interpolate(self._previous_matrix_dict[node],
+                                                   self._current_matrix_dict[node], alpha)
+        self._interpolated = bool(self._moving_node_list)
+
+    def restore(self):
+        """ Set the moving nodes to the current state again, e.g. before simulating """
+        if not self._interpolated:
+            return
+        for node in self._moving_node_list:
+            node.local_matrix = self._current_matrix_dict[node].copy()
+        self._interpolated = False
+
+    def _save(self):
+        # Copies, as some transformations (e.g. set_position) change matrices in place
+        return {node: node.local_matrix.copy() for root in self._root_list for node in root.descendant_list}
@@ -0,0 +1,449 @@
+import numpy as np
+
+from scripts.core.matrix import Matrix
+from scripts.core.object3d import Object3D
+
+
+class TransformStore:
+    """
+    Stores the transforms of many nodes in contiguous numpy arrays (structure of arrays):
+    position, rotation (unit quaternion x, y, z, w) and scale of each slot, with the index
+    of the parent slot. Batched methods change many slots with a few array operations, and
+    update() composes the local matrices (translation @ rotation @ scale) of the changed slots
+    and the world matrices of these slots and their descendants in one vectorized pass per
+    level of the hierarchy, parents before children. Rotations applied in local coordinates
+    are applied inside the scale, which equals the Object3D transformation for uniform scales.
+
+    Object3D nodes (e.g. meshes) are bound to slots with bind(); their transformation methods
+    and matrices then use the store, and the store is updated automatically before a global matrix
+    or transform version of any node is read. The parent of a root slot may be a node that is not bound.
+    Matrices returned by the store are views of its arrays, valid until the next update.
+    """
+    INITIAL_CAPACITY = 64
+
+    def __init__(self, capacity=INITIAL_CAPACITY):
+        self._capacity = 0
+        self._count = 0
+        self._free_slot_list = []
+        self._position = np.zeros((0, 3))
+        self._rotation = np.zeros((0, 4))
+        self._scale = np.zeros((0, 3))
+        # Index of the parent slot, -1 for root slots
+        self._parent = np.zeros(0, dtype=np.int64)
+        self._local = np.zeros((0, 4, 4))
+        self._world = np.zeros((0, 4, 4))
+        self._active = np.zeros(0, dtype=bool)
+        # Slots whose local transform (or the world matrix of an unbound parent) changed since the last update
+        self._changed = np.zeros(0, dtype=bool)
+        # Transform version of each slot; see Object3D.transform_version
+        self._version = np.zeros(0, dtype=np.int64)
+        # Slots whose node must be told when its world matrix changes
+        self._notify = np.zeros(0, dtype=bool)
+        # Bound node of each slot, or None
+        self._node_list = []
+        # Unbound parents of root slots, and the index in this list of the parent of each slot (-1 for none)
+        self._external_parent_list = []
+        self._external_parent_index_dict = {}
+        self._external_parent_index = np.zeros(0, dtype=np.int64)
+        # Slot of the nearest bound ancestor of each external parent (through unbound nodes), or -1;
+        # root slots below it are composed after it, in a later level
+        self._external_dependency_list = []
+        # Set while updating, when invalidated unbound nodes mark slots of a later level as changed
+        self._updating = False
+        # Slots of each level of the hierarchy, parents before children; None when the hierarchy changed
+        self._level_list = None
+        self._grow(capacity)
+
+    @property
+    def count(self):
+        """ Number of allocated slots """
+        return self._count
+
+    @property
+    def positions(self):
+        """ Array of shape (capacity, 3) of local positions; call mark_changed after modifying it """
+        return self._position
+
+    @property
+    def rotations(self):
+        """ Array of shape (capacity, 4) of local rotations as unit quaternions (x, y, z, w) """
+        return self._rotation
+
+    @property
+    def scales(self):
+        return self._scale
+
+    def allocate(self, position=(0, 0, 0), rotation=(0, 0, 0, 1), scale=(1, 1, 1), parent_slot=-1):
+        """ Return a new slot with given local transform """
+        if not self._free_slot_list:
+            self._grow(max(2 * self._capacity, TransformStore.INITIAL_CAPACITY))
+        slot = self._free_slot_list.pop()
+        self._position[slot] = position
+        self._rotation[slot] = rotation
+        self._scale[slot] = scale
+        self._parent[slot] = parent_slot
+        self._external_parent_index[slot] = -1
+        self._active[slot] = True
+        self._notify[slot] = False
+        self._node_list[slot] = None
+        self._count += 1
+        self._level_list = None
+        self.mark_changed(slot)
+        return slot
+
+    def allocate_many(self, count, parent_slot=-1):
+        """ Return an array of count new slots with identity transforms """
+        return np.array([self.allocate(parent_slot=parent_slot) for _ in range(count)], dtype=np.int64)
+
+    def release(self, slot):
+        """ Free the slot; its children become root slots """
+        if self._node_list[slot] is not None:
+            raise Exception("Unbind the node before releasing its slot")
+        self._active[slot] = False
+        self._changed[slot] = False
+        self._external_parent_index[slot] = -1
+        children = np.nonzero(self._active & (self._parent == slot))[0]
+        self._parent[children] = -1
+        self.mark_changed(children)
+        self._free_slot_list.append(slot)
+        self._count -= 1
+        self._level_list = None
+
+    def bind(self, node):
+        """ Store the transform of the node in a new slot from now on; return the slot """
+        if node.transform_store is not None:
+            raise Exception("Node is already bound to a transform store")
+        matrix = node.local_matrix
+        position, rotation, scale = TransformStore.decompose(matrix)
+        slot = self.allocate(position, rotation, scale)
+        self._node_list[slot] = node
+        self._set_parent(slot, node.parent)
+        # Meshes update their bounds; unbound children must be invalidated
+        self._notify[slot] = (type(node)._global_matrix_changed is not Object3D._global_matrix_changed
+                              or any(child.transform_store is not self for child in node.children_list))
+        node._bind_transform(self, slot)
+        # Bound children of the node are now children of its slot
+        for child in node.children_list:
+            if child.transform_store is self:
+                self.update_parent(child)
+        return slot
+
+    def bind_subtree(self, root):
+        """ Bind the node and all its descendants; return the array of their slots, in scene graph order """
+        return np.array([self.bind(node) for node in root.descendant_list], dtype=np.int64)
+
+    def unbind(self, node):
+        """ Store the transform in the node again, and release its slot """
+        if node.transform_store is not self:
+            raise Exception("Node is not bound to this transform store")
+        slot = node.transform_slot
+        matrix = self.get_local_matrix(slot).copy()
+        node._unbind_transform(matrix)
+        self._node_list[slot] = None
+        self.release(slot)
+        # A bound parent must invalidate the node from now on
+        if node.parent is not None and node.parent.transform_store is self:
+            self.add_unbound_child(node.parent)
+        # Bound children now have an unbound parent
+        for child in node.children_list:
+            if child.transform_store is self:
+                self.update_parent(child)
+
+    def update_parent(self, node):
+        """ Take over a new parent of a bound node """
+        self._set_parent(node.transform_slot, node.parent)
+
+    def add_unbound_child(self, node):
+        """ Called when a node not bound to this store is added as child of the bound node """
+        self._notify[node.transform_slot] = True
+
+    def mark_changed(self, slots):
+        """ Mark slots (an index or array of indices) whose transform has changed, e.g. by modifying the arrays """
+        self._changed[slots] = True
+        # While updating, later levels are composed anyway
+        if not self._updating:
+            Object3D._pending_transform_store_set.add(self)
+
+    # Batched transformations; slots is an index or an array of indices
+
+    def set_positions(self, slots, positions):
+        self._position[slots] = positions
+        self.mark_changed(slots)
+
+    def set_rotations(self, slots, quaternions):
+        self._rotation[slots] = quaternions
+        self.mark_changed(slots)
+
+    def set_scales(self, slots, scales):
+        self._scale[slots] = scales
+        self.mark_changed(slots)
+
+    def translate(self, slots, offsets, local=True):
+        """ Move the slots by offsets, given in their local coordinates, or in the coordinates of their parents """
+        offsets = np.broadcast_to(np.asarray(offsets, dtype=float), self._position[slots].shape)
+        if local:
+            offsets = np.einsum("...ij,...j->...i", TransformStore.quaternion_to_matrix(self._rotation[slots]),
+                                offsets * self._scale[slots])
+        self._position[slots] += offsets
+        self.mark_changed(slots)
+
+    def rotate(self, slots, axis, angles, local=True):
+        """
+        Rotate the slots by angles (radians; one value, or one per slot) around an axis ("x", "y", "z"
+        or a vector), in their local coordinates, or around the origin of the coordinates of their parents
+        """
+        quaternions = TransformStore.axis_angle_to_quaternion(axis, angles)
+        if local:
+            rotations = TransformStore.multiply_quaternions(self._rotation[slots], quaternions)
+        else:
+            quaternions = np.broadcast_to(quaternions, self._rotation[slots].shape)
+            rotations = TransformStore.multiply_quaternions(quaternions, self._rotation[slots])
+            self._position[slots] = np.einsum("...ij,...j->...i", TransformStore.quaternion_to_matrix(quaternions),
+                                              self._position[slots])
+        # Normalized, so that rounding errors of repeated rotations do not accumulate
+        self._rotation[slots] = rotations / np.linalg.norm(rotations, axis=-1, keepdims=True)
+        self.mark_changed(slots)
+
+    def scale(self, slots, factors, local=True):
+        """ Scale the slots uniformly by factors (one value, or one per slot) """
+        factors = np.asarray(factors, dtype=float)[..., None]
+        self._scale[slots] *= factors
+        if not local:
+            self._position[slots] *= factors
+        self.mark_changed(slots)
+
+    # Matrices
+
+    def set_local_matrix(self, slot, matrix):
+        """ Set the transform of the slot from a matrix made of translation, rotation and scale """
+        self._position[slot], self._rotation[slot], self._scale[slot] = TransformStore.decompose(matrix)
+        self.mark_changed(slot)
+
+    def get_local_matrix(self, slot):
+        self._update_if_changed()
+        return self._local[slot]
+
+    def get_world_matrix(self, slot):
+        self._update_if_changed()
+        return self._world[slot]
+
+    def get_world_matrices(self, slots):
+        """ Return array of shape (N, 4, 4) of the world matrices of the slots, e.g. for instance matrices """
+        self._update_if_changed()
+        return self._world[slots]
+
+    def get_version(self, slot):
+        self._update_if_changed()
+        return int(self._version[slot])
+
+    def update(self):
+        """
+        Compose the local and world matrices of all changed slots and their descendants.
+        Meshes and unbound children of changed slots are notified level by level, so that unbound
+        parents of root slots in later levels are up to date when their global matrices are read.
+        """
+        Object3D._pending_transform_store_set.discard(self)
+        if self._level_list is None:
+            self._remove_unused_external_parents()
+        if self._update_external_dependencies():
+            self._level_list = None
+        changed = self._changed & self._active
+        if not changed.any():
+            return
+        slots = np.nonzero(changed)[0]
+        self._local[slots] = TransformStore.compose(self._position[slots], self._rotation[slots], self._scale[slots])
+        if self._level_list is None:
+            self._level_list = self._make_level_list()
+        dependency = self._get_dependency()
+        Object3D._transform_stamp += 1
+        self._updating = True
+        try:
+            for level, level_slots in enumerate(self._level_list):
+                if level > 0:
+                    # Descendants of changed slots have changed world matrices, too
+                    level_changed = changed[level_slots] | changed[dependency[level_slots]]
+                    changed[level_slots] = level_changed
+                else:
+                    level_changed = changed[level_slots]
+                slots = level_slots[level_changed]
+                if len(slots) == 0:
+                    continue
+                parent_slots = self._parent[slots]
+                child_slots = slots[parent_slots >= 0]
+                self._world[child_slots] = self._world[parent_slots[parent_slots >= 0]] @ self._local[child_slots]
+                root_slots = slots[parent_slots < 0]
+                self._world[root_slots] = self._local[root_slots]
+                # Root slots of bound nodes with an unbound parent, usually a few distinct parents (e.g. the scene)
+                parent_indices = self._external_parent_index[root_slots]
+                has_parent = parent_indices >= 0
+                if has_parent.any():
+                    used_indices, inverse = np.unique(parent_indices[has_parent], return_inverse=True)
+                    parent_matrices = np.array([self._external_parent_list[index].global_matrix
+                                                for index in used_indices])
+                    self._world[root_slots[has_parent]] = parent_matrices[inverse] \
+                        @ self._local[root_slots[has_parent]]
+                self._version[slots] = Object3D._transform_stamp
+                # Tell meshes (which update their bounds) and unbound children about the new world matrices
+                for slot in slots[self._notify[slots]]:
+                    node = self._node_list[slot]
+                    if node is None:
+                        continue
+                    node._global_matrix_changed()
+                    for child in node.children_list:
+                        if child.transform_store is not self:
+                            child.invalidate_global_matrix()
+        finally:
+            self._updating = False
+        self._changed[:] = False
+
+    def _update_if_changed(self):
+        if self in Object3D._pending_transform_store_set:
+            self.update()
+
+    def _set_parent(self, slot, parent):
+        """ Make the slot a child of the slot of a bound parent node, else a root slot (with unbound parent) """
+        self._parent[slot] = -1
+        self._external_parent_index[slot] = -1
+        if parent is not None and parent.transform_store is self:
+            self._parent[slot] = parent.transform_slot
+        elif parent is not None:
+            if parent not in self._external_parent_index_dict:
+                self._external_parent_index_dict[parent] = len(self._external_parent_list)
+                self._external_parent_list.append(parent)
+            self._external_parent_index[slot] = self._external_parent_index_dict[parent]
+        self._level_list = None
+        self.mark_changed(slot)
+
+    def _remove_unused_external_parents(self):
+        """ Drop unbound parents no active slot refers to any more (e.g. removed from the scene) """
+        used = self._active & (self._external_parent_index >= 0)
+        used_indices = np.unique(self._external_parent_index[used])
+        if len(used_indices) == len(self._external_parent_list):
+            return
+        # New index of each old index; the appended -1 keeps -1 (no external parent)
+        new_index = np.full(len(self._external_parent_list) + 1, -1, dtype=np.int64)
+        new_index[used_indices] = np.arange(len(used_indices))
+        self._external_parent_index = new_index[self._external_parent_index]
+        self._external_parent_list = [self._external_parent_list[index] for index in used_indices]
+        self._external_parent_index_dict = {parent: index for index, parent in enumerate(self._external_parent_list)}
+        # Recomputed for the new indices
+        self._external_dependency_list = None
+
+    def _update_external_dependencies(self):
+        """ Find the nearest bound ancestors of the external parents again; return True if one has changed """
+        dependency_list = []
+        for parent in self._external_parent_list:
+            node = parent
+            while node is not None and node.transform_store is not self:
+                node = node.parent
+            dependency_list.append(-1 if node is None else node.transform_slot)
+        if dependency_list == self._external_dependency_list:
+            return False
+        self._external_dependency_list = dependency_list
+        return True
+
+    def _get_dependency(self):
+        """ Return the slot each slot depends on: its parent slot, or the nearest bound ancestor of its unbound parent """
+        # Index -1 (no external parent) selects the appended -1
+        external_dependency = np.array(self._external_dependency_list + [-1], dtype=np.int64)
+        return np.where(self._parent >= 0, self._parent, external_dependency[self._external_parent_index])
+
+    def _make_level_list(self):
+        """ Return arrays of the active slots at each depth of the hierarchy, counting unbound nodes in between """
+        active_slots = np.nonzero(self._active)[0]
+        depth = np.full(self._capacity, -1, dtype=np.int64)
+        parents = self._get_dependency()[active_slots]
+        depth[active_slots[parents < 0]] = 0
+        level_list = []
+        level = 0
+        while True:
+            level_slots = active_slots[depth[active_slots] == level]
+            if len(level_slots) == 0:
+                break
+            level_list.append(level_slots)
+            # Children of this level
+            unresolved = depth[active_slots] < 0
+            children = active_slots[unresolved][np.isin(parents[unresolved], level_slots)]
+            depth[children] = level + 1
+            level += 1
+        if sum(len(level_slots) for level_slots in level_list) != len(active_slots):
+            raise Exception("Transform store hierarchy contains a cycle")
+        return level_list
+
+    def _grow(self, capacity):
+        """ Enlarge the arrays; matrices returned before become outdated """
+        old_capacity = self._capacity
+
+        def enlarge(array, fill=0):
+            enlarged = np.full((capacity,) + array.shape[1:], fill, dtype=array.dtype)
+            enlarged[:old_capacity] = array
+            return enlarged
+
+        self._position = enlarge(self._position)
+        self._rotation = enlarge(self._rotation)
+        self._scale = enlarge(self._scale, 1)
+        self._parent = enlarge(self._parent, -1)
+        self._external_parent_index = enlarge(self._external_parent_index, -1)
+        self._local = enlarge(self._local)
+        self._world = enlarge(self._world)
+        self._local[old_capacity:] = np.identity(4)
+        self._world[old_capacity:] = np.identity(4)
+        self._active = enlarge(self._active, False)
+        self._changed = enlarge(self._changed, False)
+        self._version = enlarge(self._version)
+        self._notify = enlarge(self._notify, False)
+        self._node_list.extend([None] * (capacity - old_capacity))
+        # Lowest slots are used first
+        self._free_slot_list.extend(reversed(range(old_capacity, capacity)))
+        self._capacity = capacity
+
+    # Batched quaternion and matrix functions
+
+    @staticmethod
+    def axis_angle_to_quaternion(axis, angles):
+        """ Return quaternions of shape (..., 4) of rotations by angles around the axis ("x", "y", "z" or a vector) """
+        if isinstance(axis, str):
+            axis = {"x": (1, 0, 0), "y": (0, 1, 0), "z": (0, 0, 1)}[axis]
+        axis = np.asarray(axis, dtype=float)
+        axis = axis / np.linalg.norm(axis)
+        half_angles = np.asarray(angles, dtype=float)[..., None] / 2
+        return np.concatenate([axis * np.sin(half_angles), np.cos(half_angles)], axis=-1)
+
+    @staticmethod
+    def multiply_quaternions(a, b):
+        """ Return the quaternions a * b (rotation b, then a), of shape (..., 4) """
+        ax, ay, az, aw = np.moveaxis(np.asarray(a, dtype=float), -1, 0)
+        bx, by, bz, bw = np.moveaxis(np.asarray(b, dtype=float), -1, 0)
+        return np.stack([aw * bx + ax * bw + ay * bz - az * by,
+                         aw * by - ax * bz + ay * bw + az * bx,
+                         aw * bz + ax * by - ay * bx + az * bw,
+                         aw * bw - ax * bx - ay * by - az * bz], axis=-1)
+
+    @staticmethod
+    def quaternion_to_matrix(quaternions):
+        """ Return rotation matrices of shape (..., 3, 3) of unit quaternions of shape (..., 4) """
+        x, y, z, w = np.moveaxis(np.asarray(quaternions, dtype=float), -1, 0)
+        return np.stack([np.stack([1 - 2 * (y * y + z * z), 2 * (x * y - z * w), 2 * (x * z + y * w)], axis=-1),
+                         np.stack([2 * (x * y + z * w), 1 - 2 * (x * x + z * z), 2 * (y * z - x * w)], axis=-1),
+                         np.stack([2 * (x * z - y * w), 2 * (y * z + x * w), 1 - 2 * (x * x + y * y)], axis=-1)],
+                        axis=-2)
+
+    @staticmethod
+    def compose(positions, quaternions, scales):
+        """ Return matrices of shape (N, 4, 4) equal to translation @ rotation @ scale """
+        matrices = np.zeros((len(positions), 4, 4))
+        # Quaternions set directly may not be normalized
+        quaternions = quaternions / np.linalg.norm(quaternions, axis=-1, keepdims=True)
+        matrices[:, 0:3, 0:3] = TransformStore.quaternion_to_matrix(quaternions) * scales[:, None, :]
+        matrices[:, 0:3, 3] = positions
+        matrices[:, 3, 3] = 1
+        return matrices
+
+    @staticmethod
+    def decompose(matrix):
+        """ Return (position, quaternion, scale) of a matrix made of translation, rotation and scale """
+        matrix = np.asarray(matrix, dtype=float)
+        scale = np.linalg.norm(matrix[0:3, 0:3], axis=0)
+        quaternion = Matrix.get_quaternion(matrix[0:3, 0:3] / scale)
+        return matrix[0:3, 3].copy(), quaternion, scale
+
@@ -1,15 +1,21 @@
 import OpenGL.GL as GL
+import numpy as np
 
 
 class Uniform:
+    # Last value stored in each program variable, indexed by (program reference, variable reference)
+    _uploaded_value_dict = {}
+
     def __init__(self, data_type, data):
         # type of data:
-        # int | bool | float | vec2 | vec3 | vec4
+        # int | bool | float | vec2 | vec3 | vec4 | mat4 | sampler2D | sampler2DArrayShadow | Light | Shadow
         self._data_type = data_type
         # data to be sent to uniform variable
         self._data = data
         # reference for variable location in program
         self._variable_ref = None
+        # reference of program containing the variable
+        self._program_ref = None
 
     @property
     def data(self):
@@ -19,8 +25,13 @@ class Uniform:
     def data(self, data):
         self._data = data
 
+    @property
+    def data_type(self):
+        return self._data_type
+
     def locate_variable(self, program_ref, variable_name):
         """ Get and store reference for program variable with given name """
+        self._program_ref = program_ref
         if self._data_type == 'Light':
             self._variable_ref = {
                 "lightType":    GL.glGetUniformLocation(program_ref, variable_name + ".lightType"),
@@ -41,47 +52,107 @@ class Uniform:
         else:
             self._variable_ref = GL.glGetUniformLocation(program_ref, variable_name)
 
-    def upload_data(self):
-        """ Store data in uniform variable previously located """
+    def upload_data(self, render_state=None):
+        """
+        Store data in uniform variable previously located.
+        Values equal to the last value stored in the same program variable are not uploaded again.
+        If a RenderState is given, textures are bound through it,
+        so that binding an already bound texture is skipped,
+        and issued and skipped uniform calls are counted there.
+        """
         # If the program does not reference the variable, then exit
         if self._variable_ref != -1:
             if self._data_type == 'int':
-                GL.glUniform1i(self._variable_ref, self._data)
+                self._upload("glUniform1i", self._variable_ref, int(self._data), render_state)
             elif self._data_type == 'bool':
-                GL.glUniform1i(self._variable_ref, self._data)
+                self._upload("glUniform1i", self._variable_ref, int(self._data), render_state)
             elif self._data_type == 'float':
-                GL.glUniform1f(self._variable_ref, self._data)
+                self._upload("glUniform1f", self._variable_ref, float(self._data), render_state)
             elif self._data_type == 'vec2':
-                GL.glUniform2f(self._variable_ref, *self._data)
+                self._upload("glUniform2f", self._variable_ref, tuple(self._data), render_state)
             elif self._data_type == 'vec3':
-                GL.glUniform3f(self._variable_ref, *self._data)
+                self._upload("glUniform3f", self._variable_ref, tuple(self._data), render_state)
             elif self._data_type == 'vec4':
-                GL.glUniform4f(self._variable_ref, *self._data)
+                self._upload("glUniform4f", self._variable_ref, tuple(self._data), render_state)
             elif self._data_type == 'mat4':
-                GL.glUniformMatrix4fv(self._variable_ref, 1, GL.GL_TRUE, self._data)
+                self._upload("glUniformMatrix4fv", self._variable_ref, self._data, render_state)
             elif self._data_type == "sampler2D":
                 texture_object_ref, texture_unit_ref = self._data
-                # Activate texture unit
-                GL.glActiveTexture(GL.GL_TEXTURE0 + texture_unit_ref)
-                # Associate texture object reference to currently active texture unit
-                GL.glBindTexture(GL.GL_TEXTURE_2D, texture_object_ref)
+                # Texture bindings belong to the context, not to the program; always bind
+                self._bind_texture(texture_object_ref, texture_unit_ref, render_state)
                 # Upload texture unit number (0...15) to uniform variable in shader
-                GL.glUniform1i(self._variable_ref, texture_unit_ref)
+                self._upload("glUniform1i", self._variable_ref, texture_unit_ref, render_state)
+            elif self._data_type == "sampler2DArrayShadow":
+                texture_object_ref, texture_unit_ref = self._data
+                self._bind_texture(texture_object_ref, texture_unit_ref, render_state, GL.GL_TEXTURE_2D_ARRAY)
+                self._upload("glUniform1i", self._variable_ref, texture_unit_ref, render_state)
             elif self._data_type == "Light":
-                GL.glUniform1i(self._variable_ref["lightType"], self._data.light_type)
-                GL.glUniform3f(self._variable_ref["color"], *self._data.color)
-                GL.glUniform3f(self._variable_ref["direction"], *self._data.direction)
-                GL.glUniform3f(self._variable_ref["position"], *self._data.local_position)
-                GL.glUniform3f(self._variable_ref["attenuation"], *self._data.attenuation)
+                self._upload("glUniform1i", self._variable_ref["lightType"], self._data.light_type, render_state)
+                self._upload("glUniform3f", self._variable_ref["color"], tuple(self._data.color), render_state)
+                self._upload("glUniform3f", self._variable_ref["direction"], tuple(self._data.direction), render_state)
+                self._upload("glUniform3f", self._variable_ref["position"], tuple(self._data.local_position), render_state)
+                self._upload("glUniform3f", self._variable_ref["attenuation"], tuple(self._data.attenuation), render_state)
             elif self._data_type == "Shadow":
-                GL.glUniform3f(self._variable_ref["lightDirection"], *self._data.light_source.direction)
-                GL.glUniformMatrix4fv(self._variable_ref["projectionMatrix"], 1, GL.GL_TRUE, self._data.camera.projection_matrix)
-                GL.glUniformMatrix4fv(self._variable_ref["viewMatrix"], 1, GL.GL_TRUE, self._data.camera.view_matrix)
+                self._upload("glUniform3f", self._variable_ref["lightDirection"],
+                             tuple(self._data.light_source.direction), render_state)
+                self._upload("glUniformMatrix4fv", self._variable_ref["projectionMatrix"],
+                             self._data.camera.projection_matrix, render_state)
+                self._upload("glUniformMatrix4fv", self._variable_ref["viewMatrix"],
+                             self._data.camera.view_matrix, render_state)
                 # Configure depth texture
                 texture_object_ref = self._data.render_target.texture.texture_ref
                 texture_unit_ref = 3
-                GL.glActiveTexture(GL.GL_TEXTURE0 + texture_unit_ref)
-                GL.glBindTexture(GL.GL_TEXTURE_2D, texture_object_ref)
-                GL.glUniform1i(self._variable_ref["depthTextureSampler"], texture_unit_ref)
-                GL.glUniform1f(self._variable_ref["strength"], self._data.strength)
-                GL.glUniform1f(self._variable_ref["bias"], self._data.bias)
+                self._bind_texture(texture_object_ref, texture_unit_ref, render_state)
+                self._upload("glUniform1i", self._variable_ref["depthTextureSampler"], texture_unit_ref, render_state)
+                self._upload("glUniform1f", self._variable_ref["strength"], float(self._data.strength), render_state)
+                self._upload("glUniform1f", self._variable_ref["bias"], float(self._data.bias), render_state)
+
+    def _upload(self, function_name, variable_ref, value, render_state=None):
+        """
+        Store value in program variable, unless the variable already holds it.
+        The last value stored in each variable is remembered per program,
+        so materials sharing a program also share these values.
+        """
+        if variable_ref == -1:
+            return
+        if function_name == "glUniformMatrix4fv":
+            # Compare matrices by their 32-bit float data, as stored in the program
+            key = np.asarray(value, dtype=np.float32).tobytes()
+        else:
+            key = value
+        cache_key = (self._program_ref, variable_ref)
+        if Uniform._uploaded_value_dict.get(cache_key) == key:
+            if render_state is not None:
+                render_state.count(function_name, False)
+            return
+        if function_name == "glUniform1i":
+            GL.glUniform1i(variable_ref, value)
+        elif function_name == "glUniform1f":
+            GL.glUniform1f(variable_ref, value)
+        elif function_name == "glUniform2f":
+            GL.glUniform2f(variable_ref, *value)
+        elif function_name == "glUniform3f":
+            GL.glUniform3f(variable_ref, *value)
+        elif function_name == "glUniform4f":
+            GL.glUniform4f(variable_ref, *value)
+        elif function_name == "glUniformMatrix4fv":
+            GL.glUniformMatrix4fv(variable_ref, 1, GL.GL_TRUE, value)
+        Uniform._uploaded_value_dict[cache_key] = key
+        if render_state is not None:
+            render_state.count(function_name, True)
+
+    @staticmethod
+    def forget_program(program_ref):
+        """ Forget the values stored in a program, e.g. after the program has been deleted """
+        for cache_key in [cache_key for cache_key in Uniform._uploaded_value_dict if cache_key[0] == program_ref]:
+            del Uniform._uploaded_value_dict[cache_key]
+
+    @staticmethod
+    def _bind_texture(texture_object_ref, texture_unit_ref, render_state=None, target=GL.GL_TEXTURE_2D):
+        if render_state is not None:
+            render_state.bind_texture(texture_unit_ref, texture_object_ref, target)
+            return
+        # Activate texture unit
+        GL.glActiveTexture(GL.GL_TEXTURE0 + texture_unit_ref)
+        # Associate texture object reference to currently active texture unit
+        GL.glBindTexture(target, texture_object_ref)
@@ -0,0 +1,177 @@
+import OpenGL.GL as GL
+import numpy as np
+
+
+class UniformBuffer:
+    """
+    Uniform buffer object storing a std140 uniform block.
+    The buffer is attached to a fixed binding point, and every program declaring
+    the block reads from it, so the data is uploaded once for all programs.
+    """
+    # Binding points shared by all programs
+    CAMERA_BINDING = 0
+    LIGHT_BINDING = 1
+    SHADOW_BINDING = 2
+    CASCADE_BINDING = 3
+    # binding point of each block, indexed by block name
+    BINDING_DICT = {
+        "CameraBlock": CAMERA_BINDING,
+        "LightBlock": LIGHT_BINDING,
+        "ShadowBlock": SHADOW_BINDING,
+        "CascadeBlock": CASCADE_BINDING,
+    }
+    # Length of the light array in LightBlock
+    MAX_LIGHTS = 8
+    # Length of the cascade arrays in CascadeBlock; splitDistances is a vec4
+    MAX_CASCADES = 4
+
+    # GLSL declarations of the blocks, to be inserted into shader code.
+    # Matrices are stored row by row, as in numpy arrays.
+    CAMERA_BLOCK_CODE = """
+            layout (std140, row_major) uniform CameraBlock
+            {
+                mat4 projectionMatrix;
+                mat4 viewMatrix;
+                vec3 viewPosition;
+            };
+    """
+    LIGHT_BLOCK_CODE = """
+            struct Light
+            {
+                int lightType;  // 1 = AMBIENT, 2 = DIRECTIONAL, 3 = POINT
+                vec3 color;  // used by all lights
+                vec3 direction;  // used by point lights
+                vec3 position;  // used by point lights
+                vec3 attenuation;  // used by point lights
+            };
+
+            layout (std140) uniform LightBlock
+            {
+                Light lights[""" + str(MAX_LIGHTS) + """];
+            };
+    """
+    SHADOW_BLOCK_CODE = """
+            layout (std140, row_major) uniform ShadowBlock
+            {
+                // direction of light that casts shadow
+                vec3 lightDirection;
+                // regions in shadow multiplied by (1-strength)
+                float strength;
+                // data from camera that produces depth texture
+                mat4 projectionMatrix;
+                mat4 viewMatrix;
+                // reduces unwanted visual artifacts
+                float bias;
+            } shadow0;
+    """
+    CASCADE_BLOCK_CODE = """
+            layout (std140, row_major) uniform CascadeBlock
+            {
+                // projection * view matrix of the camera of each cascade
+                mat4 matrices[""" + str(MAX_CASCADES) + """];
+                // distance from the viewing camera where each cascade ends
+                vec4 splitDistances;
+                // direction of light that casts shadow
+                vec3 lightDirection;
+                // regions in shadow multiplied by (1-strength)
+                float strength;
+                // reduces unwanted visual artifacts
+                float bias;
+                int cascadeCount;
+            } cascades;
+    """
+
+    # Sizes of the blocks in 4-byte words, following the std140 layout rules
+    CAMERA_BLOCK_SIZE = 36
+    # Each Light struct takes 20 words: lightType at 0, vec3 members at 4, 8, 12, 16
+    LIGHT_STRUCT_SIZE = 20
+    LIGHT_BLOCK_SIZE = LIGHT_STRUCT_SIZE * MAX_LIGHTS
+    SHADOW_BLOCK_SIZE = 40
+    # matrices at 0, splitDistances at 64, lightDirection at 68, strength at 71, bias at 72, cascadeCount at 73
+    CASCADE_BLOCK_SIZE = 76
+
+    def __init__(self, binding_point, size):
+        # binding point the buffer is attached to
+        self._binding_point = binding_point
+        # Last uploaded data; None before the first upload
+        self._data = None
+        # reference of available buffer from GPU
+        self._buffer_ref = GL.glGenBuffers(1)
+        GL.glBindBuffer(GL.GL_UNIFORM_BUFFER, self._buffer_ref)
+        # Allocate zero-filled storage of size words
+        GL.glBufferData(GL.GL_UNIFORM_BUFFER, size * 4, np.zeros(size, dtype=np.float32), GL.GL_DYNAMIC_DRAW)
+        GL.glBindBufferBase(GL.GL_UNIFORM_BUFFER, self._binding_point, self._buffer_ref)
+
+    @property
+    def binding_point(self):
+        return self._binding_point
+
+    @property
+    def buffer_ref(self):
+        return self._buffer_ref
+
+    def upload_data(self, data, render_state=None):
+        """ Store data (float32 array in std140 layout) in the buffer, unless it is unchanged """
+        if self._data is not None and np.array_equal(self._data, data):
+            if render_state is not None:
+                render_state.count("glBufferSubData", False)
+            return
+        self._data = data.copy()
+        GL.glBindBuffer(GL.GL_UNIFORM_BUFFER, self._buffer_ref)
+        GL.glBufferSubData(GL.GL_UNIFORM_BUFFER, 0, data.nbytes, data)
+        if render_state is not None:
+            render_state.count("glBufferSubData", True)
+
+    @staticmethod
+    def bind_blocks(program_ref):
+        """ Connect the uniform blocks declared in a program to their binding points """
+        for block_name, binding_point in UniformBuffer.BINDING_DICT.items():
+            block_index = GL.glGetUniformBlockIndex(program_ref, block_name)
+            if block_index != GL.GL_INVALID_INDEX:
+                GL.glUniformBlockBinding(program_ref, block_index, binding_point)
+
+    @staticmethod
+    def pack_camera(camera):
+        """ Return CameraBlock data of a camera whose view matrix is up to date """
+        data = np.zeros(UniformBuffer.CAMERA_BLOCK_SIZE, dtype=np.float32)
+        data[0:16] = np.ravel(camera.projection_matrix)
+        data[16:32] = np.ravel(camera.view_matrix)
+        data[32:35] = camera.global_position
+        return data
+
+    @staticmethod
+    def pack_lights(light_list):
+        """ Return LightBlock data; array elements without a light have lightType 0 and add no light """
+        data = np.zeros((UniformBuffer.MAX_LIGHTS, UniformBuffer.LIGHT_STRUCT_SIZE), dtype=np.float32)
+        light_type_data = data.view(np.int32)
+        for light_number, light in enumerate(light_list[:UniformBuffer.MAX_LIGHTS]):
+            light_type_data[light_number, 0] = light.light_type
+            data[light_number, 4:7] = light.color
+            data[light_number, 8:11] = light.direction
+            data[light_number, 12:15] = light.local_position
+            data[light_number, 16:19] = light.attenuation
+        return data.ravel()
+
+    @staticmethod
+    def pack_shadow(shadow):
+        """ Return ShadowBlock data of a shadow whose camera view matrix is up to date """
+        data = np.zeros(UniformBuffer.SHADOW_BLOCK_SIZE, dtype=np.float32)
+        data[0:3] = shadow.light_source.direction
+        data[3] = shadow.strength
+        data[4:20] = np.ravel(shadow.camera.projection_matrix)
+        data[20:36] = np.ravel(shadow.camera.view_matrix)
+        data[36] = shadow.bias
+        return data
+
+    @staticmethod
+    def pack_cascades(cascaded_shadow):
+        """ Return CascadeBlock data of a cascaded shadow fitted to the current camera """
+        data = np.zeros(UniformBuffer.CASCADE_BLOCK_SIZE, dtype=np.float32)
+        for index, shadow_camera in enumerate(cascaded_shadow.camera_list[:UniformBuffer.MAX_CASCADES]):
+            data[index * 16:(index + 1) * 16] = np.ravel(shadow_camera.projection_matrix @ shadow_camera.view_matrix)
+            data[64 + index] = cascaded_shadow.split_distance_list[index]
+        data[68:71] = cascaded_shadow.light_source.direction
+        data[71] = cascaded_shadow.strength
+        data[72] = cascaded_shadow.bias
+        data[73:74].view(np.int32)[0] = cascaded_shadow.cascade_count
+        return data
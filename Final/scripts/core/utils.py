@@ -41,7 +41,8 @@ class Utils:
         return shader_ref
 
     @staticmethod
-    def initialize_program(vertex_shader_code, fragment_shader_code):
+    def initialize_program(vertex_shader_code, fragment_shader_code, retrievable=False):
+        """ Compile and link a program; if retrievable is True, its binary can be read after linking """
         vertex_shader_ref = Utils.initialize_shader(vertex_shader_code, GL.GL_VERTEX_SHADER)
         fragment_shader_ref = Utils.initialize_shader(fragment_shader_code, GL.GL_FRAGMENT_SHADER)
         # Create empty program object and store reference to it
@@ -49,6 +50,8 @@ class Utils:
         # Attach previously compiled shader programs
         GL.glAttachShader(program_ref, vertex_shader_ref)
         GL.glAttachShader(program_ref, fragment_shader_ref)
+        if retrievable:
+            GL.glProgramParameteri(program_ref, GL.GL_PROGRAM_BINARY_RETRIEVABLE_HINT, GL.GL_TRUE)
         # Link vertex shader to fragment shader
         GL.glLinkProgram(program_ref)
         # queries whether program link was successful
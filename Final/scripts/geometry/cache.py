@@ -0,0 +1,124 @@
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+
+
+class GeometryCache:
+    """
+    Stores flattened vertex data of geometries loaded from model files
+    in a binary cache, so that later loads skip parsing the model file.
+    Each cache entry is a directory with one .npy file per attribute
+    (memory-mapped when loaded) and a meta.json file describing the source file.
+    Entries are keyed by source path, modification time, file size and scale factor.
+    """
+    # Increase when the layout of cached data changes
+    VERSION = 1
+    DIRECTORY_NAME = ".cache"
+
+    @staticmethod
+    def source_info(file_name, size):
+        """ Return the values identifying a cache entry """
+        stat = os.stat(file_name)
+        return {
+            "version": GeometryCache.VERSION,
+            "source": os.path.abspath(file_name),
+            "mtime_ns": stat.st_mtime_ns,
+            "file_size": stat.st_size,
+            "size": float(size),
+        }
+
+    @staticmethod
+    def entry_path(file_name, size):
+        """ Return the directory of the cache entry for a model file and scale factor """
+        info = GeometryCache.source_info(file_name, size)
+        key = hashlib.sha1(json.dumps(info, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+        stem = os.path.splitext(os.path.basename(file_name))[0]
+        cache_directory = os.path.join(os.path.dirname(os.path.abspath(file_name)), GeometryCache.DIRECTORY_NAME)
+        return os.path.join(cache_directory, f"{stem}-{key}")
+
+    @staticmethod
+    def is_valid(entry_path, file_name, size):
+        """ Check that a cache entry exists and was made from the current version of the model file """
+        meta_file_name = os.path.join(entry_path, "meta.json")
+        if not os.path.isfile(meta_file_name):
+            return False
+        try:
+            with open(meta_file_name) as meta_file:
+                meta = json.load(meta_file)
+        except (OSError, ValueError):
+            return False
+        info = GeometryCache.source_info(file_name, size)
+        if any(meta.get(name) != value for name, value in info.items()):
+            return False
+        return all(os.path.isfile(os.path.join(entry_path, f"{variable_name}.npy"))
+                   for variable_name in meta.get("variable_names", []))
+
+    @staticmethod
+    def load(file_name, size):
+        """ Return dictionary of memory-mapped arrays indexed by variable name, or None if not cached """
+        entry_path = GeometryCache.entry_path(file_name, size)
+        if not GeometryCache.is_valid(entry_path, file_name, size):
+            return None
+        with open(os.path.join(entry_path, "meta.json")) as meta_file:
+            meta = json.load(meta_file)
+        return {variable_name: np.load(os.path.join(entry_path, f"{variable_name}.npy"), mmap_mode="r")
+                for variable_name in meta["variable_names"]}
+
+    @staticmethod
+    def save(file_name, size, data_dict):
+        """ Store dictionary of arrays indexed by variable name """
+        entry_path = GeometryCache.entry_path(file_name, size)
+        cache_directory = os.path.dirname(entry_path)
+        os.makedirs(cache_directory, exist_ok=True)
+        # Remove entries made from older versions of the model file
+        GeometryCache.remove_stale(file_name)
+        # Write into a temporary directory first,
+        # so that an interrupted save never leaves a partial entry
+        temporary_path = f"{entry_path}.{os.getpid()}.tmp"
+        shutil.rmtree(temporary_path, ignore_errors=True)
+        os.makedirs(temporary_path)
+        for variable_name, data in data_dict.items():
+            np.save(os.path.join(temporary_path, f"{variable_name}.npy"),
+                    np.ascontiguousarray(data, dtype=np.float32))
+        meta = GeometryCache.source_info(file_name, size)
+        meta["variable_names"] = list(data_dict.keys())
+        with open(os.path.join(temporary_path, "meta.json"), "w") as meta_file:
+            json.dump(meta, meta_file, indent=4)
+        shutil.rmtree(entry_path, ignore_errors=True)
+        os.replace(temporary_path, entry_path)
+
+    @staticmethod
+    def remove_stale(file_name):
+        """ Remove cache entries of a model file that do not match its current modification time and size """
+        stem = os.path.splitext(os.path.basename(file_name))[0]
+        cache_directory = os.path.join(os.path.dirname(os.path.abspath(file_name)), GeometryCache.DIRECTORY_NAME)
+        if not os.path.isdir(cache_directory):
+            return
+        info = GeometryCache.source_info(file_name, 1)
+        for entry_name in os.listdir(cache_directory):
+            if not entry_name.startswith(stem + "-"):
+                continue
+            entry_path = os.path.join(cache_directory, entry_name)
+            try:
+                with open(os.path.join(entry_path, "meta.json")) as meta_file:
+                    meta = json.load(meta_file)
+            except (OSError, ValueError):
+                meta = {}
+            if meta.get("source") != info["source"]:
+                continue
+            if any(meta.get(name) != info[name] for name in ("version", "mtime_ns", "file_size")):
+                shutil.rmtree(entry_path, ignore_errors=True)
+
+    @staticmethod
+    def clear(file_name):
+        """ Remove all cache entries of a model file """
+        stem = os.path.splitext(os.path.basename(file_name))[0]
+        cache_directory = os.path.join(os.path.dirname(os.path.abspath(file_name)), GeometryCache.DIRECTORY_NAME)
+        if not os.path.isdir(cache_directory):
+            return
+        for entry_name in os.listdir(cache_directory):
+            if entry_name.startswith(stem + "-"):
+                shutil.rmtree(os.path.join(cache_directory, entry_name), ignore_errors=True)
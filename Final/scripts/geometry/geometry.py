@@ -1,37 +1,117 @@
 import OpenGL.GL as GL
 import numpy as np
 import math
+import ctypes
 from scripts.core.matrix import Matrix
+from scripts.geometry.cache import GeometryCache
 import pywavefront
 
 
 class Attribute:
-    def __init__(self, data_type, data):
-        # type of elements in data array: int | float | vec2 | vec3 | vec4
+    # Buffer usage hints:
+    # static data is uploaded once, dynamic data is updated repeatedly,
+    # stream data is updated about every time it is drawn
+    USAGE_DICT = {
+        "static": GL.GL_STATIC_DRAW,
+        "dynamic": GL.GL_DYNAMIC_DRAW,
+        "stream": GL.GL_STREAM_DRAW,
+    }
+
+    def __init__(self, data_type, data, usage="static", divisor=0):
+        # type of elements in data array: int | float | vec2 | vec3 | vec4 | mat4
         self._data_type = data_type
-        # array of data to be stored in buffer
-        self._data = data
+        if usage not in Attribute.USAGE_DICT:
+            raise Exception(f'Attribute has unknown usage {usage}')
+        # how often the data will be updated: static | dynamic | stream
+        self._usage = usage
+        # 0: one element per vertex; 1: one element per instance (instanced drawing)
+        self._divisor = divisor
+        # array of data to be stored in buffer;
+        # contiguous numpy array, one row per vertex
+        self._data = None
+        # Incremented whenever the data changes, so that values derived from the data can be cached
+        self._version = 0
+        self.data = data
         # reference of available buffer from GPU
         self._buffer_ref = GL.glGenBuffers(1)
+        # size of buffer storage in bytes
+        self._buffer_size = 0
         # Upload data immediately
         self.upload_data()
 
+    @property
+    def buffer_ref(self):
+        return self._buffer_ref
+
     @property
     def data(self):
         return self._data
 
     @data.setter
     def data(self, data):
-        self._data = data
+        # Convert data to numpy array format; no copy is made for a contiguous array of the right type
+        self._data = np.ascontiguousarray(data, dtype=self.dtype)
+        self._version += 1
+
+    @property
+    def data_type(self):
+        return self._data_type
+
+    @property
+    def dtype(self):
+        """ Type of numbers stored in the buffer """
+        if self._data_type == "int":
+            return np.int32
+        return np.float32
+
+    @property
+    def usage(self):
+        return self._usage
+
+    @property
+    def version(self):
+        return self._version
+
+    @usage.setter
+    def usage(self, usage):
+        """ Change the usage hint; takes effect at the next upload_data() """
+        if usage not in Attribute.USAGE_DICT:
+            raise Exception(f'Attribute has unknown usage {usage}')
+        self._usage = usage
+
+    @property
+    def _upload_target(self):
+        """ Buffer binding point used for uploading """
+        return GL.GL_ARRAY_BUFFER
 
     def upload_data(self):
-        """ Upload the data to a GPU buffer """
-        # Convert data to numpy array format; convert numbers to 32-bit floats
-        data = np.array(self._data).astype(np.float32)
+        """ Upload the data to a GPU buffer; storage is (re)allocated """
         # Select buffer used by the following functions
-        GL.glBindBuffer(GL.GL_ARRAY_BUFFER, self._buffer_ref)
-        # Store data in currently bound buffer
-        GL.glBufferData(GL.GL_ARRAY_BUFFER, data.ravel(), GL.GL_STATIC_DRAW)
+        GL.glBindBuffer(self._upload_target, self._buffer_ref)
+        # Store data in currently bound buffer; the array is passed without copying
+        GL.glBufferData(self._upload_target, self._data.nbytes, self._data, Attribute.USAGE_DICT[self._usage])
+        self._buffer_size = self._data.nbytes
+
+    def update_data(self, data, start=0):
+        """
+        Replace the rows start, start + 1, ... of the data with the given rows
+        and upload only this range to the existing buffer storage
+        """
+        data = np.asarray(data, dtype=self.dtype)
+        end = start + len(data)
+        if start < 0 or end > len(self._data):
+            raise Exception(f'Attribute range [{start}, {end}) is out of bounds for {len(self._data)} rows')
+        # Memory-mapped or borrowed arrays may be read-only
+        if not self._data.flags.writeable:
+            self._data = self._data.copy()
+        self._data[start:end] = data.reshape((-1,) + self._data.shape[1:])
+        self._version += 1
+        if self._data.nbytes != self._buffer_size:
+            self.upload_data()
+            return
+        row_size = self._data.strides[0] if self._data.ndim > 0 else self._data.itemsize
+        GL.glBindBuffer(self._upload_target, self._buffer_ref)
+        GL.glBufferSubData(self._upload_target, start * row_size, self._data[start:end].nbytes, self._data[start:end])
 
     def associate_variable(self, program_ref, variable_name):
         """ Associate variable in program with the buffer """
@@ -52,10 +132,46 @@ class Attribute:
                 GL.glVertexAttribPointer(variable_ref, 3, GL.GL_FLOAT, False, 0, None)
             elif self._data_type == "vec4":
                 GL.glVertexAttribPointer(variable_ref, 4, GL.GL_FLOAT, False, 0, None)
+            elif self._data_type == "mat4":
+                # A mat4 variable takes four consecutive locations, one per column;
+                # data must be stored column by column (transposed numpy matrices)
+                for column in range(4):
+                    GL.glVertexAttribPointer(variable_ref + column, 4, GL.GL_FLOAT, False, 64,
+                                             ctypes.c_void_p(16 * column))
+                    GL.glEnableVertexAttribArray(variable_ref + column)
+                    GL.glVertexAttribDivisor(variable_ref + column, self._divisor)
+                return
             else:
                 raise Exception(f'Attribute {variable_name} has unknown type {self._data_type}')
             # Indicate that data will be streamed to this variable
             GL.glEnableVertexAttribArray(variable_ref)
+            if self._divisor:
+                GL.glVertexAttribDivisor(variable_ref, self._divisor)
+
+class IndexAttribute(Attribute):
+    """
+    Stores the vertex indices of an indexed geometry in an element buffer.
+    Every three indices define a triangle.
+    """
+    def __init__(self, data, usage="static"):
+        super().__init__("uint", data, usage)
+
+    @property
+    def dtype(self):
+        return np.uint32
+
+    @property
+    def _upload_target(self):
+        # Use the copy-write target for uploading,
+        # so that the element buffer of the currently bound vertex array object is not replaced
+        return GL.GL_COPY_WRITE_BUFFER
+
+    def bind(self):
+        """ Associate the element buffer with the currently bound vertex array object """
+        GL.glBindBuffer(GL.GL_ELEMENT_ARRAY_BUFFER, self._buffer_ref)
+
+    def associate_variable(self, program_ref, variable_name):
+        raise Exception("Indices are not associated with shader variables; use bind() instead")
 
 class Geometry:
     """ Stores attribute data and the total number of vertices """
@@ -65,23 +181,119 @@ class Geometry:
         self._attribute_dict = {}
         # number of vertices
         self._vertex_count = None
+        # Vertex indices of triangles; None if vertices are drawn in order
+        self._index_attribute = None
+        # Bounds of the vertex positions, calculated when first needed after the positions change;
+        # key identifies the position data the bounds were calculated from
+        self._bounds_key = None
+        self._bounding_box = None
+        self._bounding_sphere = None
 
     @property
     def attribute_dict(self):
         return self._attribute_dict
 
+    @property
+    def bounding_box(self):
+        """ Return (minimum, maximum) corners of the axis-aligned box containing all vertices, or None """
+        self._update_bounds()
+        return self._bounding_box
+
+    @property
+    def bounding_sphere(self):
+        """ Return (center, radius) of a sphere containing all vertices, or None """
+        self._update_bounds()
+        return self._bounding_sphere
+
+    @property
+    def index_attribute(self):
+        return self._index_attribute
+
+    @property
+    def index_count(self):
+        """ Return the number of indices, or None if geometry is not indexed """
+        if self._index_attribute is None:
+            return None
+        return len(self._index_attribute.data)
+
     @property
     def vertex_count(self):
         return self._vertex_count
 
-    def add_attribute(self, data_type, variable_name, data):
-        attribute = Attribute(data_type, data)
+    def add_attribute(self, data_type, variable_name, data, usage="static"):
+        attribute = Attribute(data_type, data, usage)
         self._attribute_dict[variable_name] = attribute
         # Update the vertex count
         if variable_name == "vertexPosition":
             # Number of vertices may be calculated from
             # the length of any Attribute object's array of data
-            self._vertex_count = len(data)
+            self._vertex_count = len(attribute.data)
+
+    def _update_bounds(self):
+        attribute = self._attribute_dict.get("vertexPosition")
+        bounds_key = None if attribute is None else (id(attribute), attribute.version)
+        if bounds_key == self._bounds_key:
+            return
+        self._bounds_key = bounds_key
+        if attribute is None or len(attribute.data) == 0:
+            self._bounding_box = None
+            self._bounding_sphere = None
+            return
+        position_data = attribute.data.reshape(-1, 3).astype(float)
+        minimum = position_data.min(axis=0)
+        maximum = position_data.max(axis=0)
+        self._bounding_box = (minimum, maximum)
+        # Sphere around the center of the box, just large enough to contain all vertices
+        center = (minimum + maximum) / 2
+        radius = np.sqrt(((position_data - center) ** 2).sum(axis=1).max())
+        self._bounding_sphere = (center, float(radius))
+
+    def set_indices(self, data):
+        """ Draw vertices by index; every three indices define a triangle """
+        if self._index_attribute is None:
+            self._index_attribute = IndexAttribute(data)
+        else:
+            self._index_attribute.data = data
+            self._index_attribute.upload_data()
+
+    def weld(self, exclude_variable_names=("faceNormal",), decimals=None):
+        """
+        Remove duplicate vertices, i.e. vertices with equal data in all attributes,
+        and draw the remaining vertices by index.
+        Attributes listed in exclude_variable_names are removed from the geometry
+        before welding, because per-face data cannot be shared by vertices of different faces.
+        If decimals is given, vertices are compared after rounding to this number of decimals.
+        Weld before creating a Mesh from this geometry.
+        """
+        for variable_name in exclude_variable_names:
+            self._attribute_dict.pop(variable_name, None)
+        variable_names = list(self._attribute_dict.keys())
+        data_list = [self._attribute_dict[variable_name].data for variable_name in variable_names]
+        # Each row holds all the data of one vertex.
+        # Adding 0.0 turns -0.0 into 0.0, so that equal numbers have equal bytes.
+        keys = np.hstack([data.reshape(self._vertex_count, -1).astype(np.float32)
+                          for data in data_list]) + np.float32(0.0)
+        if decimals is not None:
+            keys = np.round(keys, decimals)
+        keys = np.ascontiguousarray(keys)
+        # Compare whole rows as single values
+        rows = keys.view(np.dtype((np.void, keys.dtype.itemsize * keys.shape[1]))).ravel()
+        _, first_indices, inverse = np.unique(rows, return_index=True, return_inverse=True)
+        # Keep the remaining vertices in order of first appearance
+        order = np.argsort(first_indices)
+        new_position = np.empty_like(order)
+        new_position[order] = np.arange(len(order))
+        kept_indices = first_indices[order]
+        index_data = new_position[inverse.ravel()]
+        # Indices of an already indexed geometry refer to the old vertices
+        if self._index_attribute is not None:
+            index_data = index_data[self._index_attribute.data]
+        for variable_name, data in zip(variable_names, data_list):
+            attribute = self._attribute_dict[variable_name]
+            attribute.data = data[kept_indices]
+            attribute.upload_data()
+        self._vertex_count = len(kept_indices)
+        self.set_indices(index_data)
 
     def upload_data(self, variable_names=None):
         if not variable_names:
@@ -96,149 +308,185 @@ class Geometry:
 
     def apply_matrix(self, matrix):
         """ Transform the data in an attribute using a matrix """
-        old_position_data = self._attribute_dict["vertexPosition"].data
-        new_position_data = []
-        for old_pos in old_position_data:
-            # Avoid changing list references
-            new_pos = old_pos.copy()
-            # Add the homogeneous fourth coordinate
-            new_pos.append(1)
-            # Multiply by matrix.
-            # No need to transform new_pos to np.array.
-            new_pos = matrix @ new_pos
-            # Remove the homogeneous coordinate
-            new_pos = list(new_pos[0:3])
-            # Add to the new data list
-            new_position_data.append(new_pos)
-        self._attribute_dict["vertexPosition"].data = new_position_data
-        # New data must be uploaded
-        self._attribute_dict["vertexPosition"].upload_data()
-        self._vertex_count = len(new_position_data)
-
-        # Extract the rotation submatrix
-        rotation_matrix = np.array(
-            [matrix[0][0:3],
-             matrix[1][0:3],
-             matrix[2][0:3]]
-        ).astype(float)
-
-        old_vertex_normal_data = self._attribute_dict["vertexNormal"].data
-        new_vertex_normal_data = []
-        for old_normal in old_vertex_normal_data:
-            # Avoid changing list references
-            new_normal = old_normal.copy()
-            new_normal = rotation_matrix @ new_normal
-            new_vertex_normal_data.append(new_normal)
-        self._attribute_dict["vertexNormal"].data = new_vertex_normal_data
-        # New data must be uploaded
-        self._attribute_dict["vertexNormal"].upload_data()
-
-        old_face_normal_data = self._attribute_dict["faceNormal"].data
-        new_face_normal_data = []
-        for old_normal in old_face_normal_data:
-            # Avoid changing list references
-            new_normal = old_normal.copy()
-            new_normal = rotation_matrix @ new_normal
-            new_face_normal_data.append(new_normal)
-        self._attribute_dict["faceNormal"].data = new_face_normal_data
-        # New data must be uploaded
-        self._attribute_dict["faceNormal"].upload_data()
+        matrix = np.asarray(matrix, dtype=float)
+        for variable_name in ("vertexPosition", "vertexNormal", "faceNormal"):
+            # Indexed geometries have no face normals
+            if variable_name not in self._attribute_dict:
+                continue
+            attribute = self._attribute_dict[variable_name]
+            attribute.data = self.transform_data(variable_name, attribute.data, matrix)
+            # New data must be uploaded
+            attribute.upload_data()
+        self._vertex_count = len(self._attribute_dict["vertexPosition"].data)
+
+    @staticmethod
+    def transform_data(variable_name, data, matrix):
+        """
+        Return the data of an attribute transformed by a 4x4 matrix as array of shape (N, 3).
+        Only positions and normals are transformed; other data is returned unchanged.
+        """
+        if variable_name == "vertexPosition":
+            # Transform all positions at once: p' = M[0:3, 0:3] p + M[0:3, 3]
+            # (the homogeneous fourth coordinate of every position is 1)
+            return data.astype(float) @ matrix[0:3, 0:3].T + matrix[0:3, 3]
+        if variable_name in ("vertexNormal", "faceNormal"):
+            # Normals are transformed by the inverse transpose of the 3x3 submatrix,
+            # so that they stay perpendicular to the surface under non-uniform scaling
+            normal_matrix = np.linalg.inv(matrix[0:3, 0:3]).T
+            normal_data = data.astype(float) @ normal_matrix.T
+            lengths = np.linalg.norm(normal_data, axis=1, keepdims=True)
+            return normal_data / np.where(lengths > 0, lengths, 1)
+        return data
 
     def merge(self, other_geometry):
         """
         Merge data from attributes of other geometry into this object.
         Requires both geometries to have attributes with same names.
         """
-        for variable_name, attribute_instance in self._attribute_dict.items():
-            attribute_instance.data.extend(other_geometry.attribute_dict[variable_name].data)
-            # New data must be uploaded
-            attribute_instance.upload_data()
+        self._set_merged_data([self, other_geometry])
+
+    @staticmethod
+    def merge_all(geometry_list, matrix_list=None):
+        """
+        Combine many geometries into a single new geometry,
+        e.g. to draw static parts of a scene with one draw call.
+        If matrix_list is given, each geometry is transformed by its matrix
+        (such as Mesh.global_matrix); the geometries themselves are not changed.
+        Requires all geometries to have attributes with same names.
+        Each attribute buffer is uploaded once.
+        """
+        geometry = Geometry()
+        geometry._set_merged_data(geometry_list, matrix_list)
+        return geometry
+
+    def _set_merged_data(self, geometry_list, matrix_list=None):
+        """ Replace the data of this geometry with the concatenated data of the geometries """
+        first_geometry = geometry_list[0]
+        for geometry in geometry_list[1:]:
+            missing_names = set(first_geometry.attribute_dict.keys()) - set(geometry.attribute_dict.keys())
+            if missing_names:
+                raise Exception("Merged geometry has no attributes named: " + ", ".join(sorted(missing_names)))
+        vertex_count_list = [geometry.vertex_count for geometry in geometry_list]
+        # Index data is needed if any geometry is indexed
+        if any(geometry.index_attribute is not None for geometry in geometry_list):
+            offset_list = np.cumsum([0] + vertex_count_list[:-1])
+            index_data = np.concatenate([
+                (geometry.index_attribute.data if geometry.index_attribute is not None
+                 else np.arange(geometry.vertex_count, dtype=np.uint32)) + np.uint32(offset)
+                for geometry, offset in zip(geometry_list, offset_list)
+            ])
+        else:
+            index_data = None
+        for variable_name, first_attribute in list(first_geometry.attribute_dict.items()):
+            data_list = [geometry.attribute_dict[variable_name].data for geometry in geometry_list]
+            if matrix_list is not None:
+                data_list = [self.transform_data(variable_name, data, np.asarray(matrix, dtype=float))
+                             for data, matrix in zip(data_list, matrix_list)]
+            data = np.concatenate(data_list)
+            if variable_name in self._attribute_dict:
+                self._attribute_dict[variable_name].data = data
+                # New data must be uploaded
+                self._attribute_dict[variable_name].upload_data()
+            else:
+                self.add_attribute(first_attribute.data_type, variable_name, data)
+        self._vertex_count = sum(vertex_count_list)
+        if index_data is not None:
+            self.set_indices(index_data)
 
 class ParametricGeometry(Geometry):
     """
     Parametric geometry defined by
     (x, y, z) = surface_function(u, v),
-    where u and v are the parameters
+    where u and v are the parameters.
+
+    The surface function is evaluated over the whole (u, v) grid at once,
+    so it should be written with numpy functions (np.sin instead of math.sin)
+    and return [x, y, z] where each item is an array or a number.
+    A function that only accepts single numbers is still supported
+    and is evaluated point by point.
+
+    If indexed is True, neighboring triangles share the grid vertices
+    and are drawn by index; such a geometry has no face normals.
     """
     def __init__(self,
                  u_start, u_end, u_resolution,
                  v_start, v_end, v_resolution,
-                 surface_function):
+                 surface_function,
+                 vectorized=True,
+                 indexed=False):
         super().__init__()
         # Generate set of points on function
         delta_u = (u_end - u_start) / u_resolution
         delta_v = (v_end - v_start) / v_resolution
+        # Parameter values of all grid points; grid arrays have shape (u_resolution + 1, v_resolution + 1)
+        u_indices, v_indices = np.meshgrid(np.arange(u_resolution + 1),
+                                           np.arange(v_resolution + 1),
+                                           indexing="ij")
+        u_grid = u_start + u_indices * delta_u
+        v_grid = v_start + v_indices * delta_v
+
+        # 3D vertex coordinates and the two points used to estimate the normals;
+        # arrays of shape (u_resolution + 1, v_resolution + 1, 3)
+        position_grid = None
+        if vectorized:
+            try:
+                position_grid = self.evaluate_surface(surface_function, u_grid, v_grid)
+                position_grid_du = self.evaluate_surface(surface_function, u_grid + delta_u/1e3, v_grid)
+                position_grid_dv = self.evaluate_surface(surface_function, u_grid, v_grid + delta_v/1e3)
+            except (TypeError, ValueError):
+                # The surface function only accepts single numbers
+                position_grid = None
+        if position_grid is None:
+            position_grid = self.evaluate_surface_per_point(surface_function, u_grid, v_grid)
+            position_grid_du = self.evaluate_surface_per_point(surface_function, u_grid + delta_u/1e3, v_grid)
+            position_grid_dv = self.evaluate_surface_per_point(surface_function, u_grid, v_grid + delta_v/1e3)
+        # 3D normal coordinates
+        vertex_normal_grid = self.calculate_normals(position_grid, position_grid_du, position_grid_dv)
+        # 2D texture coordinates
+        uv_grid = np.stack([u_indices / u_resolution, v_indices / v_resolution], axis=-1)
 
-        position_list = []
-        texture_position_list = []
-        vertex_normal_list = []
-        for u_index in range(u_resolution + 1):
-            xyz_list = []
-            uv_list = []
-            n_list = []
-            for v_index in range(v_resolution + 1):
-                # 3D vertex coordinates
-                u = u_start + u_index * delta_u
-                v = v_start + v_index * delta_v
-                p = surface_function(u, v)
-                xyz_list.append(p)
-                # 3D normal coordinates
-                p1 = surface_function(u + delta_u/1e3, v)
-                p2 = surface_function(u, v + delta_v/1e3)
-                normal_vector = self.calculate_normal(p, p1, p2)
-                n_list.append(normal_vector)
-                # 2D texture coordinates
-                u_texture = u_index / u_resolution
-                v_texture = v_index / v_resolution
-                uv_list.append([u_texture, v_texture])
-            position_list.append(xyz_list)
-            vertex_normal_list.append(n_list)
-            texture_position_list.append(uv_list)
-
-        # Store vertex data
-        position_data = []
-        color_data = []
-        uv_data = []
         # default vertex colors
         c1, c2, c3 = [1, 0, 0], [0, 1, 0], [0, 0, 1]
         c4, c5, c6 = [0, 1, 1], [1, 0, 1], [1, 1, 0]
-        vertex_normal_data = []
-        face_normal_data = []
 
         # Group vertex data into triangles.
-        # Note: .copy() is necessary to avoid storing references.
-        # position_data will be also copied in apply_matrix() in the Geometry class.
-        for i_index in range(u_resolution):
-            for j_index in range(v_resolution):
-                # position data
-                p_a = position_list[i_index + 0][j_index + 0]
-                p_b = position_list[i_index + 1][j_index + 0]
-                p_c = position_list[i_index + 1][j_index + 1]
-                p_d = position_list[i_index + 0][j_index + 1]
-                position_data += [p_a.copy(), p_b.copy(), p_c.copy(),
-                                  p_a.copy(), p_c.copy(), p_d.copy()]
-                # color data
-                color_data += [c1, c2, c3,
-                               c4, c5, c6]
-                # uv data of texture coordinates
-                uv_a = texture_position_list[i_index + 0][j_index + 0]
-                uv_b = texture_position_list[i_index + 1][j_index + 0]
-                uv_c = texture_position_list[i_index + 1][j_index + 1]
-                uv_d = texture_position_list[i_index + 0][j_index + 1]
-                uv_data += [uv_a, uv_b, uv_c,
-                            uv_a, uv_c, uv_d]
-                # vertex normal vectors
-                n_a = vertex_normal_list[i_index + 0][j_index + 0]
-                n_b = vertex_normal_list[i_index + 1][j_index + 0]
-                n_c = vertex_normal_list[i_index + 1][j_index + 1]
-                n_d = vertex_normal_list[i_index + 0][j_index + 1]
-                vertex_normal_data += [n_a.copy(), n_b.copy(), n_c.copy(),
-                                       n_a.copy(), n_c.copy(), n_d.copy()]
-                # face normal vectors
-                fn0 = self.calculate_normal(p_a, p_b, p_c)
-                fn1 = self.calculate_normal(p_a, p_c, p_d)
-                face_normal_data += [fn0.copy(), fn0.copy(), fn0.copy(),
-                                     fn1.copy(), fn1.copy(), fn1.copy()]
+        # Corners of each grid cell:
+        # d - c
+        # | / |
+        # a - b
+        # The cell is split into triangles a-b-c and a-c-d.
+        def triangulate(grid):
+            a = grid[:-1, :-1]
+            b = grid[1:, :-1]
+            c = grid[1:, 1:]
+            d = grid[:-1, 1:]
+            return np.stack([a, b, c, a, c, d], axis=2).reshape(-1, grid.shape[-1])
+
+        if indexed:
+            # Each grid point is stored once
+            vertex_index_grid = np.arange(position_grid.shape[0] * position_grid.shape[1]) \
+                .reshape(position_grid.shape[0], position_grid.shape[1], 1)
+            index_data = triangulate(vertex_index_grid).ravel()
+            color_data = np.resize([c1, c2, c3, c4, c5, c6], (index_data.max() + 1, 3))
+            self.add_attribute("vec3", "vertexPosition", position_grid.reshape(-1, 3))
+            self.add_attribute("vec3", "vertexColor", color_data)
+            self.add_attribute("vec2", "vertexUV", uv_grid.reshape(-1, 2))
+            self.add_attribute("vec3", "vertexNormal", vertex_normal_grid.reshape(-1, 3))
+            self.set_indices(index_data)
+            return
+
+        position_data = triangulate(position_grid)
+        uv_data = triangulate(uv_grid)
+        vertex_normal_data = triangulate(vertex_normal_grid)
+        # face normal vectors
+        p_a = position_grid[:-1, :-1]
+        p_b = position_grid[1:, :-1]
+        p_c = position_grid[1:, 1:]
+        p_d = position_grid[:-1, 1:]
+        fn0 = self.calculate_normals(p_a, p_b, p_c)
+        fn1 = self.calculate_normals(p_a, p_c, p_d)
+        face_normal_data = np.stack([fn0, fn0, fn0, fn1, fn1, fn1], axis=2).reshape(-1, 3)
+        color_data = np.tile([c1, c2, c3, c4, c5, c6], (u_resolution * v_resolution, 1))
 
         self.add_attribute("vec3", "vertexPosition", position_data)
         self.add_attribute("vec3", "vertexColor", color_data)
@@ -246,6 +494,32 @@ class ParametricGeometry(Geometry):
         self.add_attribute("vec3", "vertexNormal", vertex_normal_data)
         self.add_attribute("vec3", "faceNormal", face_normal_data)
 
+    @staticmethod
+    def evaluate_surface(surface_function, u_grid, v_grid):
+        """ Evaluate surface function on whole parameter arrays and return points as array of shape (..., 3) """
+        x, y, z = surface_function(u_grid, v_grid)
+        # Coordinates given as numbers are broadcast over the grid
+        x, y, z, _ = np.broadcast_arrays(x, y, z, u_grid)
+        return np.stack([x, y, z], axis=-1).astype(float)
+
+    @staticmethod
+    def evaluate_surface_per_point(surface_function, u_grid, v_grid):
+        """ Evaluate surface function point by point and return points as array of shape (..., 3) """
+        points = [surface_function(u, v) for u, v in zip(u_grid.ravel().tolist(), v_grid.ravel().tolist())]
+        return np.array(points, dtype=float).reshape(u_grid.shape + (3,))
+
+    @staticmethod
+    def calculate_normals(p0, p1, p2):
+        """ Vectorized version of calculate_normal for arrays of points of shape (..., 3) """
+        orthogonal_vectors = np.cross(p1 - p0, p2 - p0)
+        norms = np.linalg.norm(orthogonal_vectors, axis=-1, keepdims=True)
+        # Degenerate triangles (e.g. at the poles of a sphere) use the position as normal
+        p0_norms = np.linalg.norm(p0, axis=-1, keepdims=True)
+        fallback_vectors = np.divide(p0, p0_norms, out=np.zeros_like(p0), where=p0_norms > 0)
+        return np.where(norms > 1e-6,
+                        orthogonal_vectors / np.maximum(norms, 1e-6),
+                        fallback_vectors)
+
     @staticmethod
     def calculate_normal(p0, p1, p2):
         v1 = np.array(p1) - np.array(p0)
@@ -333,7 +607,7 @@ class RectangleGeometry(Geometry):
         self.add_attribute("vec3", "faceNormal", normal_data)
 
 class EllipsoidGeometry(ParametricGeometry):
-    def __init__(self, width=1, height=1, depth=1, theta_segments=16, phi_segments=32):
+    def __init__(self, width=1, height=1, depth=1, theta_segments=16, phi_segments=32, vectorized=True, indexed=False):
         def surface_function(u, v):
             # [x, y, z] = surface_function(u, v)
             # Here,
@@ -343,11 +617,12 @@ class EllipsoidGeometry(ParametricGeometry):
             # where 0 <= theta < pi, 0 <= phi < 2*pi.
             # Then, u = phi / (2*pi), v = (1 - theta/pi).
             # Then, phi = 2 * pi * u, theta = (1 - v)*pi.
-            phi = 2 * math.pi * u
-            theta = (1 - v) * math.pi
-            return [width / 2 * math.sin(theta) * math.cos(phi),
-                    height / 2 * math.sin(theta) * math.sin(phi),
-                    depth / 2 * math.cos(theta)]
+            # u and v may be numbers or numpy arrays.
+            phi = 2 * np.pi * u
+            theta = (1 - v) * np.pi
+            return [width / 2 * np.sin(theta) * np.cos(phi),
+                    height / 2 * np.sin(theta) * np.sin(phi),
+                    depth / 2 * np.cos(theta)]
 
         super().__init__(u_start=0,
                          u_end=1,
@@ -355,54 +630,77 @@ class EllipsoidGeometry(ParametricGeometry):
                          v_start=0,
                          v_end=1,
                          v_resolution=theta_segments,
-                         surface_function=surface_function)
+                         surface_function=surface_function,
+                         vectorized=vectorized,
+                         indexed=indexed)
         # Rotate the ellipsoid around the x-axis on -90 degrees.
         # The vertices and normals will be recalculated.
         self.apply_matrix(Matrix.make_rotation_x(-math.pi/2))
 
 class SphereGeometry(EllipsoidGeometry):
-    def __init__(self, radius=1, theta_segments=16, phi_segments=32):
-        super().__init__(2*radius, 2*radius, 2*radius, theta_segments, phi_segments)
+    def __init__(self, radius=1, theta_segments=16, phi_segments=32, vectorized=True, indexed=False):
+        super().__init__(2*radius, 2*radius, 2*radius, theta_segments, phi_segments, vectorized, indexed)
+
+    @staticmethod
+    def make_levels(radius=1, segments_list=((64, 128), (32, 64), (16, 32), (8, 16)), indexed=True):
+        """
+        Return spheres tessellated with the given (theta_segments, phi_segments),
+        from finest to coarsest, as levels of detail for LODMesh
+        """
+        return [SphereGeometry(radius, theta_segments, phi_segments, indexed=indexed)
+                for theta_segments, phi_segments in segments_list]
 
 
 class OBJGeometry(Geometry):
-    def __init__(self, size=1.0):
+    """
+    Geometry loaded from a Wavefront OBJ file.
+    The flattened vertex data is stored in a binary cache on first load,
+    so that later loads of the unchanged file skip parsing.
+    """
+    def __init__(self, size=1.0, file_name='./model/satellite_obj.obj', use_cache=True):
         super().__init__()
-        model = pywavefront.Wavefront('./model/satellite_obj.obj', create_materials=True, collect_faces=True)
-        vertices = model.vertices
+        data_dict = GeometryCache.load(file_name, size) if use_cache else None
+        if data_dict is None:
+            data_dict = self.load_model(file_name, size)
+            if use_cache:
+                GeometryCache.save(file_name, size, data_dict)
+
+        self.add_attribute("vec3", "vertexPosition", data_dict["vertexPosition"])
+        self.add_attribute("vec3", "vertexNormal", data_dict["vertexNormal"])
+        self.add_attribute("vec2", "vertexUV", data_dict["vertexUV"])
+        self.add_attribute("vec3", "vertexColor", data_dict["vertexColor"])
+
+    @staticmethod
+    def load_model(file_name, size=1.0):
+        """ Parse the model file and return dictionary of flattened vertex data arrays indexed by variable name """
+        model = pywavefront.Wavefront(file_name, create_materials=True, collect_faces=True)
+        vertices = np.array(model.vertices, dtype=np.float32)
         faces = []
         for mesh in model.mesh_list:
             faces.extend(mesh.faces)
-
-        position_data = []
-        normal_data = []
-        uv_data = []
-        material_data = []
-
-        for face in faces:
-            for vertex_index in face:
-                vertex = vertices[vertex_index]
-                position_data.append(vertex[:3])
-                if len(vertex) >= 6:
-                    normal_data.append(vertex[3:6])
-                if len(vertex) == 8:
-                    uv_data.append(vertex[6:8])
-                
-                # Assuming one material per face (basic handling)
-                material = model.mesh_list[0].materials[0]
-                color = material.diffuse if material and hasattr(material, 'diffuse') else [1, 1, 1]
-                material_data.append(color)
-
-        if not normal_data:
-            normal_data = [[0.5, 0.5, 0.5]] * len(position_data)
-        if not uv_data:
-            uv_data = [[0.5, 0.5]] * len(position_data)
-
-        position_data_p = np.array(position_data)
-        position_data_p *= size
-        position_data = position_data_p.tolist()
-
-        self.add_attribute("vec3", "vertexPosition", position_data)
-        self.add_attribute("vec3", "vertexNormal", normal_data)
-        self.add_attribute("vec2", "vertexUV", uv_data)
-        self.add_attribute("vec3", "vertexColor", material_data)
+        # Vertex data of all face vertices in order
+        face_vertices = vertices[np.array(faces, dtype=np.int64).ravel()]
+        vertex_count = len(face_vertices)
+
+        position_data = face_vertices[:, 0:3] * size
+        if face_vertices.shape[1] >= 6:
+            normal_data = face_vertices[:, 3:6]
+        else:
+            normal_data = np.full((vertex_count, 3), 0.5, dtype=np.float32)
+        if face_vertices.shape[1] == 8:
+            uv_data = face_vertices[:, 6:8]
+        else:
+            uv_data = np.full((vertex_count, 2), 0.5, dtype=np.float32)
+
+        # Assuming one material per face (basic handling)
+        material = model.mesh_list[0].materials[0]
+        color = material.diffuse if material and hasattr(material, 'diffuse') else [1, 1, 1]
+        # Colors are stored in a vec3 attribute; drop the alpha component
+        material_data = np.tile(np.array(color[0:3], dtype=np.float32), (vertex_count, 1))
+
+        return {
+            "vertexPosition": np.ascontiguousarray(position_data, dtype=np.float32),
+            "vertexNormal": np.ascontiguousarray(normal_data, dtype=np.float32),
+            "vertexUV": np.ascontiguousarray(uv_data, dtype=np.float32),
+            "vertexColor": np.ascontiguousarray(material_data, dtype=np.float32),
+        }
@@ -1,13 +1,12 @@
 from scripts.material.material import Material
 from scripts.core.uniform import Uniform
+from scripts.core.uniform_buffer import UniformBuffer
 
 
 class BasicMaterial(Material):
     def __init__(self, vertex_shader_code=None, fragment_shader_code=None, use_vertex_colors=True):
         if vertex_shader_code is None:
-            vertex_shader_code = """
-                uniform mat4 projectionMatrix;
-                uniform mat4 viewMatrix;
+            vertex_shader_code = UniformBuffer.CAMERA_BLOCK_CODE + """
                 uniform mat4 modelMatrix;
                 in vec3 vertexPosition;
                 in vec3 vertexColor;
@@ -1,33 +1,47 @@
+from scripts.core.instanced_mesh import InstancedMesh
 from scripts.material.material import Material
 
 
 class DepthMaterial(Material):
-
-    def __init__(self):
+    """
+    Renders depth values of the shadow pass.
+    If instanced is True, the shader reads per-instance model matrices for InstancedMesh.
+    If depth_only is True, no color is written, for render targets with only a depth attachment.
+    """
+    def __init__(self, instanced=False, depth_only=False):
         # vertex shader code
         vertex_shader_code = """
         in vec3 vertexPosition;
         uniform mat4 projectionMatrix;
         uniform mat4 viewMatrix;
         uniform mat4 modelMatrix;
-        
+        """ + (InstancedMesh.INSTANCE_MATRIX_CODE if instanced else "") + """
         void main()
         {
-            gl_Position = projectionMatrix * viewMatrix * modelMatrix * vec4(vertexPosition, 1);
+            mat4 worldMatrix = """ + ("modelMatrix * instanceMatrix" if instanced else "modelMatrix") + """;
+            gl_Position = projectionMatrix * viewMatrix * worldMatrix * vec4(vertexPosition, 1);
         }
         """
 
         # fragment shader code
-        fragment_shader_code = """
-        out vec4 fragColor;
-        
-        void main()
-        {
-            float z = gl_FragCoord.z;
-            fragColor = vec4(z, z, z, 1);
-        }
-        """
-        
+        if depth_only:
+            # The depth buffer is written without fragment shader output
+            fragment_shader_code = """
+            void main()
+            {
+            }
+            """
+        else:
+            fragment_shader_code = """
+            out vec4 fragColor;
+
+            void main()
+            {
+                float z = gl_FragCoord.z;
+                fragColor = vec4(z, z, z, 1);
+            }
+            """
+
         # Initialize shaders
         super().__init__(vertex_shader_code, fragment_shader_code)
         self.locate_uniforms()
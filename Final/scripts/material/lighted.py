@@ -1,26 +1,26 @@
+from scripts.core.uniform_buffer import UniformBuffer
 from scripts.material.material import Material
 
 
 class LightedMaterial(Material):
     def __init__(self, number_of_light_sources=1):
+        if number_of_light_sources > UniformBuffer.MAX_LIGHTS:
+            raise Exception(f"Material supports at most {UniformBuffer.MAX_LIGHTS} light sources")
         self._number_of_light_sources = number_of_light_sources
         # Properties vertex_shader_code and fragment_shader_code
         # will be defined in inherited classes FlatMaterial, LambertMaterial,
-        # and PhongMaterial
+        # and PhongMaterial.
+        # Light data is read from the light uniform block, filled once per frame by the renderer.
         super().__init__(self.vertex_shader_code, self.fragment_shader_code)
-        # Add light uniforms to self._uniform_dict
-        for i in range(self._number_of_light_sources):
-            self.add_uniform("Light", f"light{i}", None)
 
     @property
     def declaring_light_uniforms_in_shader_code(self):
-        """ Create a text line with light uniforms to be inserted into a shader code """
-        return "\n" + "\n".join(f"\t\t\tuniform Light light{i};"
-                                for i in range(self._number_of_light_sources)) + "\n"
+        """ Create the light uniform block declaration to be inserted into a shader code """
+        return UniformBuffer.LIGHT_BLOCK_CODE
 
     @property
     def adding_lights_in_shader_code(self):
-        return "\n" + "\n".join(f"\t\t\t\tlight += calculateLight(light{i}, position, calcNormal);"
+        return "\n" + "\n".join(f"\t\t\t\tlight += calculateLight(lights[{i}], position, calcNormal);"
                                 for i in range(self._number_of_light_sources))
 
     @property
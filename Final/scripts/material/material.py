@@ -1,12 +1,17 @@
 import OpenGL.GL as GL
 
+from scripts.core.program_cache import ProgramCache
 from scripts.core.uniform import Uniform
-from scripts.core.utils import Utils
+from scripts.core.uniform_buffer import UniformBuffer
 
 
 class Material:
     def __init__(self, vertex_shader_code, fragment_shader_code):
-        self._program_ref = Utils.initialize_program(vertex_shader_code, fragment_shader_code)
+        # Materials with identical shader code share one program;
+        # uniform values are stored per material and uploaded when they differ from the program's values
+        self._program_ref = ProgramCache.get_program(vertex_shader_code, fragment_shader_code)
+        # Connect uniform blocks (camera, lights, shadow) declared in shaders to shared buffers
+        UniformBuffer.bind_blocks(self._program_ref)
         # Store Uniform objects, indexed by name of associated variable in shader.
         # Each shader typically contains these uniforms; values will be set during render process from Mesh / Camera.
         self._uniform_dict = {
@@ -31,6 +36,12 @@ class Material:
     def uniform_dict(self):
         return self._uniform_dict
 
+    @property
+    def texture_refs(self):
+        """ Return tuple of texture references used by sampler uniforms, e.g. for sorting draw calls """
+        return tuple(uniform_object.data[0] for uniform_object in self._uniform_dict.values()
+                     if uniform_object.data_type.startswith("sampler"))
+
     def add_uniform(self, data_type, variable_name, data):
         self._uniform_dict[variable_name] = Uniform(data_type, data)
 
@@ -39,8 +50,13 @@ class Material:
         for variable_name, uniform_object in self._uniform_dict.items():
             uniform_object.locate_variable(self._program_ref, variable_name)
 
-    def update_render_settings(self):
-        """ Configure OpenGL with render settings """
+    def upload_uniforms(self, render_state=None):
+        """ Store the data of all uniforms in the program; unchanged values are skipped """
+        for uniform_object in self._uniform_dict.values():
+            uniform_object.upload_data(render_state)
+
+    def update_render_settings(self, render_state):
+        """ Configure OpenGL with render settings through a RenderState """
         pass
 
     def set_properties(self, property_dict):
@@ -1,18 +1,28 @@
 import OpenGL.GL as GL
 
+from scripts.core.instanced_mesh import InstancedMesh
+from scripts.core.uniform_buffer import UniformBuffer
 from scripts.material.lighted import LightedMaterial
 
 
 class PhongMaterial(LightedMaterial):
     """
-    Phong material with at least one light source (or more)
+    Phong material with at least one light source (or more).
+    If instanced is True, the shader reads per-instance model matrices for InstancedMesh.
+    If cascaded_shadow is True, shadows are read from the cascaded shadow map of the renderer
+    (enable_shadows with cascade_count) instead of the single shadow map.
     """
     def __init__(self,
                  texture=None,
                  property_dict=None,
                  number_of_light_sources=1,
                  bump_texture=None,
-                 use_shadow=False):
+                 use_shadow=False,
+                 instanced=False,
+                 cascaded_shadow=False):
+        # Needed to generate the shader code
+        self._instanced = instanced
+        self._cascaded_shadow = cascaded_shadow
         super().__init__(number_of_light_sources)
         self.add_uniform("vec3", "baseColor", [1.0, 1.0, 1.0])
 
@@ -21,7 +31,6 @@ class PhongMaterial(LightedMaterial):
         else:
             self.add_uniform("bool", "useTexture", True)
             self.add_uniform("sampler2D", "textureSampler", [texture.texture_ref, 1])
-        self.add_uniform("vec3", "viewPosition", [0, 0, 0])
         self.add_uniform("float", "specularStrength", 1.0)
         self.add_uniform("float", "shininess", 32.0)
 
@@ -34,9 +43,15 @@ class PhongMaterial(LightedMaterial):
 
         if not use_shadow:
             self.add_uniform("bool", "useShadow", False)
+        elif not cascaded_shadow:
+            self.add_uniform("bool", "useShadow", True)
+            # Depth texture of the shadow pass; the renderer sets the texture reference.
+            # Other shadow data is read from the shadow uniform block.
+            self.add_uniform("sampler2D", "shadowDepthSampler0", [0, 3])
         else:
             self.add_uniform("bool", "useShadow", True)
-            self.add_uniform("Shadow", "shadow0", None)
+            # Depth texture array of the cascades; other data is read from the cascade uniform block
+            self.add_uniform("sampler2DArrayShadow", "shadowCascadeSampler", [0, 4])
 
         self.locate_uniforms()
 
@@ -50,9 +65,7 @@ class PhongMaterial(LightedMaterial):
 
     @property
     def vertex_shader_code(self):
-        return """
-            uniform mat4 projectionMatrix;
-            uniform mat4 viewMatrix;
+        return UniformBuffer.CAMERA_BLOCK_CODE + UniformBuffer.SHADOW_BLOCK_CODE + """
             uniform mat4 modelMatrix;
             in vec3 vertexPosition;
             in vec2 vertexUV;
@@ -61,53 +74,31 @@ class PhongMaterial(LightedMaterial):
             out vec2 UV;
             out vec3 normal;
             
-            struct Shadow
-            {
-                // direction of light that casts shadow
-                vec3 lightDirection;
-                // data from camera that produces depth texture
-                mat4 projectionMatrix;
-                mat4 viewMatrix;
-                // texture that stores depth values from shadow camera
-                sampler2D depthTextureSampler;
-                // regions in shadow multiplied by (1-strength)
-                float strength;
-                // reduces unwanted visual artifacts
-                float bias;
-            };
-            
             uniform bool useShadow;
-            uniform Shadow shadow0;
             out vec3 shadowPosition0;
-
+            """ + (InstancedMesh.INSTANCE_MATRIX_CODE if self._instanced else "") + """
             void main()
             {
-                gl_Position = projectionMatrix * viewMatrix * modelMatrix * vec4(vertexPosition, 1);
-                position = vec3(modelMatrix * vec4(vertexPosition, 1));
+                mat4 worldMatrix = """ + ("modelMatrix * instanceMatrix" if self._instanced else "modelMatrix") + """;
+                gl_Position = projectionMatrix * viewMatrix * worldMatrix * vec4(vertexPosition, 1);
+                position = vec3(worldMatrix * vec4(vertexPosition, 1));
                 UV = vertexUV;
-                normal = normalize(mat3(modelMatrix) * vertexNormal);
+                normal = normalize(mat3(worldMatrix) * vertexNormal);
                 
+                """ + ("" if self._cascaded_shadow else """
                 if (useShadow)
                 {
-                    vec4 temp0 = shadow0.projectionMatrix * shadow0.viewMatrix * modelMatrix * vec4(vertexPosition, 1);
+                    vec4 temp0 = shadow0.projectionMatrix * shadow0.viewMatrix * worldMatrix * vec4(vertexPosition, 1);
                     shadowPosition0 = vec3(temp0);
                 } 
+                """) + """
             }
         """
 
     @property
     def fragment_shader_code(self):
-        return """        
-            struct Light
-            {
-                int lightType;  // 1 = AMBIENT, 2 = DIRECTIONAL, 3 = POINT
-                vec3 color;  // used by all lights
-                vec3 direction;  // used by point lights
-                vec3 position;  // used by point lights
-                vec3 attenuation;  // used by point lights
-            };\n\n""" \
-            + self.declaring_light_uniforms_in_shader_code + """
-            uniform vec3 viewPosition;
+        return UniformBuffer.CAMERA_BLOCK_CODE + self.declaring_light_uniforms_in_shader_code \
+            + (UniformBuffer.CASCADE_BLOCK_CODE if self._cascaded_shadow else UniformBuffer.SHADOW_BLOCK_CODE) + """
             uniform float specularStrength;
             uniform float shininess;
 
@@ -163,24 +154,12 @@ class PhongMaterial(LightedMaterial):
             in vec3 normal;
             out vec4 fragColor;
             
-            struct Shadow
-            {
-                // direction of light that casts shadow
-                vec3 lightDirection;
-                // data from camera that produces depth texture
-                mat4 projectionMatrix;
-                mat4 viewMatrix;
-                // texture that stores depth values from shadow camera
-                sampler2D depthTextureSampler;
-                // regions in shadow multiplied by (1-strength)
-                float strength;
-                // reduces unwanted visual artifacts
-                float bias;
-            };
-            
             uniform bool useShadow;
-            uniform Shadow shadow0;
+            // texture that stores depth values from shadow camera
+            uniform sampler2D shadowDepthSampler0;
             in vec3 shadowPosition0;
+            // texture array that stores depth values from the camera of each cascade
+            uniform sampler2DArrayShadow shadowCascadeSampler;
 
             void main()
             {
@@ -197,7 +176,45 @@ class PhongMaterial(LightedMaterial):
                 // Calculate total effect of lights on color
                 vec3 light = vec3(0, 0, 0);""" + self.adding_lights_in_shader_code + """
                 color *= vec4(light, 1);
-                
+                """ + (self.cascaded_shadow_code if self._cascaded_shadow else self.shadow_code) + """
+                fragColor = color;
+            }
+        """
+
+    @property
+    def cascaded_shadow_code(self):
+        """ Fragment shader code darkening color where the cascaded shadow map shows an object towards the light """
+        return """
+                if (useShadow)
+                {
+                    // determine if surface is facing towards light direction
+                    float cosAngle = dot(normalize(normal), -normalize(cascades.lightDirection));
+                    bool facingLight = (cosAngle > 0.01);
+                    // choose the first cascade ending beyond the fragment
+                    float viewDistance = -(viewMatrix * vec4(position, 1)).z;
+                    int cascade = 0;
+                    while (cascade < cascades.cascadeCount && viewDistance > cascades.splitDistances[cascade])
+                    {
+                        cascade++;
+                    }
+                    if (facingLight && cascade < cascades.cascadeCount)
+                    {
+                        // convert range [-1, 1] to range [0, 1]
+                        // for UV coordinate and depth information
+                        vec3 shadowCoord = (vec3(cascades.matrices[cascade] * vec4(position, 1)) + 1.0) / 2.0;
+                        // fraction of nearby texels where the fragment is not behind another object
+                        float lit = texture(shadowCascadeSampler,
+                                            vec4(shadowCoord.xy, cascade, shadowCoord.z - cascades.bias));
+                        float s = 1.0 - cascades.strength * (1.0 - lit);
+                        color *= vec4(s, s, s, 1);
+                    }
+                }
+        """
+
+    @property
+    def shadow_code(self):
+        """ Fragment shader code darkening color where the shadow map shows an object towards the light """
+        return """
                 if (useShadow)
                 {
                     // determine if surface is facing towards light direction
@@ -206,7 +223,7 @@ class PhongMaterial(LightedMaterial):
                     // convert range [-1, 1] to range [0, 1]
                     // for UV coordinate and depth information
                     vec3 shadowCoord = (shadowPosition0.xyz + 1.0) / 2.0;
-                    float closestDistanceToLight = texture(shadow0.depthTextureSampler, shadowCoord.xy).r;
+                    float closestDistanceToLight = texture(shadowDepthSampler0, shadowCoord.xy).r;
                     float fragmentDistanceToLight = clamp(shadowCoord.z, 0, 1);
                     // determine if fragment lies in shadow of another object
                     bool inShadow = (fragmentDistanceToLight > closestDistanceToLight + shadow0.bias);
@@ -216,18 +233,12 @@ class PhongMaterial(LightedMaterial):
                         color *= vec4(s, s, s, 1);
                     }
                 }  
-                
-                fragColor = color;
-            }
         """
 
-    def update_render_settings(self):
-        if self.setting_dict["doubleSide"]:
-            GL.glDisable(GL.GL_CULL_FACE)
-        else:
-            GL.glEnable(GL.GL_CULL_FACE)
+    def update_render_settings(self, render_state):
+        render_state.set_capability(GL.GL_CULL_FACE, not self.setting_dict["doubleSide"])
         if self.setting_dict["wireframe"]:
-            GL.glPolygonMode(GL.GL_FRONT_AND_BACK, GL.GL_LINE)
+            render_state.set_polygon_mode(GL.GL_LINE)
         else:
-            GL.glPolygonMode(GL.GL_FRONT_AND_BACK, GL.GL_FILL)
-        GL.glLineWidth(self.setting_dict["lineWidth"])
+            render_state.set_polygon_mode(GL.GL_FILL)
+        render_state.set_line_width(self.setting_dict["lineWidth"])
@@ -0,0 +1,84 @@
+import OpenGL.GL as GL
+import numpy as np
+
+from scripts.material.texture import Texture
+
+
+class StreamingTexture(Texture):
+    """
+    Texture whose pixel data changes often, e.g. video frames or procedurally updated images.
+    Updates are copied into one of two pixel unpack buffers (used in turn, so that writing
+    the next update does not wait for the transfer of the previous one) and transferred
+    into the existing texture storage with glTexSubImage2D.
+    Pixel data is RGBA with 8 bits per channel, rows from bottom to top, given as
+    a numpy array of shape (height, width, 4), or any buffer (bytes, memoryview) of the same size;
+    it is passed to OpenGL without conversion.
+    """
+    BUFFER_COUNT = 2
+
+    def __init__(self, width, height, property_dict=None):
+        # Mipmaps would have to be generated again after every update
+        property_dict = {"minFilter": GL.GL_LINEAR, "wrap": GL.GL_CLAMP_TO_EDGE, **(property_dict or {})}
+        super().__init__(None, property_dict)
+        self._width = 0
+        self._height = 0
+        # Pixel unpack buffers, used in turn
+        self._buffer_ref_list = [GL.glGenBuffers(1) for _ in range(StreamingTexture.BUFFER_COUNT)]
+        self._buffer_index = 0
+        self.resize(width, height)
+
+    @property
+    def height(self):
+        return self._height
+
+    @property
+    def width(self):
+        return self._width
+
+    def resize(self, width, height):
+        """ Reallocate texture storage and buffers; the content is undefined until the next update """
+        self._width = width
+        self._height = height
+        self.upload_pixel_data(None, width, height)
+        for buffer_ref in self._buffer_ref_list:
+            GL.glBindBuffer(GL.GL_PIXEL_UNPACK_BUFFER, buffer_ref)
+            GL.glBufferData(GL.GL_PIXEL_UNPACK_BUFFER, width * height * 4, None, GL.GL_STREAM_DRAW)
+        GL.glBindBuffer(GL.GL_PIXEL_UNPACK_BUFFER, 0)
+
+    def update(self, pixel_data, x=0, y=0, width=None, height=None):
+        """
+        Replace the pixels of the region with lower left corner (x, y) and given size
+        (by default the whole texture); the region must be inside the texture
+        """
+        if width is None:
+            width = self._width - x
+        if height is None:
+            height = self._height - y
+        if x < 0 or y < 0 or x + width > self._width or y + height > self._height:
+            raise Exception(f'Region ({x}, {y}, {width}, {height}) is outside of texture '
+                            f'of size ({self._width}, {self._height})')
+        # View of the data without copying
+        pixel_array = np.frombuffer(pixel_data, dtype=np.uint8) if not isinstance(pixel_data, np.ndarray) \
+            else pixel_data
+        size = width * height * 4
+        if pixel_array.nbytes != size:
+            raise Exception(f'Pixel data has {pixel_array.nbytes} bytes, expected {size}')
+        pixel_array = np.ascontiguousarray(pixel_array)
+        buffer_ref = self._buffer_ref_list[self._buffer_index]
+        self._buffer_index = (self._buffer_index + 1) % len(self._buffer_ref_list)
+        GL.glBindBuffer(GL.GL_PIXEL_UNPACK_BUFFER, buffer_ref)
+        # Orphan the old storage, so that the driver need not wait until its last transfer has finished
+        GL.glBufferData(GL.GL_PIXEL_UNPACK_BUFFER, self._width * self._height * 4, None, GL.GL_STREAM_DRAW)
+        GL.glBufferSubData(GL.GL_PIXEL_UNPACK_BUFFER, 0, size, pixel_array)
+        GL.glBindTexture(GL.GL_TEXTURE_2D, self._texture_ref)
+        # With an unpack buffer bound, the data argument is an offset into the buffer
+        GL.glTexSubImage2D(GL.GL_TEXTURE_2D, 0, x, y, width, height, GL.GL_RGBA, GL.GL_UNSIGNED_BYTE, None)
+        # Unbind, so that later pixel transfers read from client memory again
+        GL.glBindBuffer(GL.GL_PIXEL_UNPACK_BUFFER, 0)
+        if self.uses_mipmaps:
+            GL.glGenerateMipmap(GL.GL_TEXTURE_2D)
+
+    def delete(self):
+        if self._texture_ref is not None:
+            GL.glDeleteBuffers(len(self._buffer_ref_list), self._buffer_ref_list)
+        super().delete()
@@ -3,12 +3,17 @@ import pygame
 
 
 class Texture:
+    # Bytes of GPU memory used by the pixel data of all textures
+    _total_memory_size = 0
+
     def __init__(self, file_name=None, property_dict={}):
         # Pygame object for storing pixel data;
         # can load from image or manipulate directly
         self._surface = None
         # reference of available texture from GPU
         self._texture_ref = GL.glGenTextures(1)
+        # Bytes of GPU memory used by the uploaded pixel data, including mipmaps
+        self._memory_size = 0
         # default property values
         self._property_dict = {
             "magFilter": GL.GL_LINEAR,
@@ -29,10 +34,33 @@ class Texture:
     def surface(self, surface):
         self._surface = surface
 
+    @property
+    def memory_size(self):
+        return self._memory_size
+
     @property
     def texture_ref(self):
         return self._texture_ref
 
+    @property
+    def uses_mipmaps(self):
+        """ Are mipmaps used for minifying, i.e. must they be generated? """
+        return self._property_dict["minFilter"] not in (GL.GL_LINEAR, GL.GL_NEAREST)
+
+    @staticmethod
+    def get_total_memory_size():
+        """ Return bytes of GPU memory used by the pixel data of all textures not deleted """
+        return Texture._total_memory_size
+
+    def delete(self):
+        """ Free the GPU memory of the texture; the texture must not be used afterwards """
+        if self._texture_ref is None:
+            return
+        GL.glDeleteTextures([self._texture_ref])
+        self._texture_ref = None
+        Texture._total_memory_size -= self._memory_size
+        self._memory_size = 0
+
     def load_image(self, file_name):
         """ Load image from file """
         self._surface = pygame.image.load(file_name)
@@ -47,18 +75,31 @@ class Texture:
                     raise Exception("Texture has no property with name: " + name)
 
     def upload_data(self):
-        """ Upload pixel data to GPU """
+        """ Upload pixel data of the surface to GPU """
         # Store image dimensions
         width = self._surface.get_width()
         height = self._surface.get_height()
         # Convert image data to string buffer
         pixel_data = pygame.image.tostring(self._surface, "RGBA", True)
+        self.upload_pixel_data(pixel_data, width, height)
+
+    def upload_pixel_data(self, pixel_data, width, height):
+        """
+        Upload RGBA pixel data (rows from bottom to top) to GPU, (re)allocating the texture storage;
+        if pixel_data is None, the storage is allocated without content
+        """
         # Specify texture used by the following functions
         GL.glBindTexture(GL.GL_TEXTURE_2D, self._texture_ref)
         # Send pixel data to texture buffer
         GL.glTexImage2D(GL.GL_TEXTURE_2D, 0, GL.GL_RGBA, width, height, 0, GL.GL_RGBA, GL.GL_UNSIGNED_BYTE, pixel_data)
-        # Generate mipmap image from uploaded pixel data
-        GL.glGenerateMipmap(GL.GL_TEXTURE_2D)
+        Texture._total_memory_size -= self._memory_size
+        self._memory_size = width * height * 4
+        if self.uses_mipmaps:
+            # Generate mipmap image from uploaded pixel data
+            GL.glGenerateMipmap(GL.GL_TEXTURE_2D)
+            # Mipmaps add one third to the size of the base level
+            self._memory_size = self._memory_size * 4 // 3
+        Texture._total_memory_size += self._memory_size
         # Specify technique for magnifying/minifying textures
         GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_MAG_FILTER, self._property_dict["magFilter"])
         GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_MIN_FILTER, self._property_dict["minFilter"])
@@ -0,0 +1,94 @@
+import os
+
+from scripts.material.texture import Texture
+from scripts.material.texture_loader import TextureLoader
+
+
+class TextureCache:
+    """
+    Process-wide cache of textures loaded from image files, keyed by file path and property values,
+    so that materials using the same image share one texture.
+    Users are counted: acquire() adds a user, release() removes one,
+    and the texture is deleted from GPU memory when it has no users left.
+    """
+    # key -> [texture, number of users]
+    _entry_dict = {}
+    # Statistics since the last reset
+    _load_count = 0
+    _hit_count = 0
+
+    @staticmethod
+    def texture_key(file_name, property_dict=None):
+        property_items = tuple(sorted((property_dict or {}).items()))
+        return os.path.abspath(file_name), property_items
+
+    @staticmethod
+    def acquire(file_name, property_dict=None, asynchronous=False):
+        """
+        Return the shared texture of an image file, loading it if needed; call release() when done.
+        If asynchronous is True, a new texture is loaded in the background by TextureLoader.
+        """
+        key = TextureCache.texture_key(file_name, property_dict)
+        entry = TextureCache._entry_dict.get(key)
+        if entry is None:
+            if asynchronous:
+                texture = TextureLoader.load(file_name, property_dict)
+            else:
+                texture = Texture(file_name, property_dict or {})
+            entry = [texture, 0]
+            TextureCache._entry_dict[key] = entry
+            TextureCache._load_count += 1
+        else:
+            TextureCache._hit_count += 1
+        entry[1] += 1
+        return entry[0]
+
+    @staticmethod
+    def release(texture):
+        """ Remove a user of the texture; the texture is deleted when it has no users left """
+        for key, entry in TextureCache._entry_dict.items():
+            if entry[0] is texture:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    texture.delete()
+                    del TextureCache._entry_dict[key]
+                return
+        raise Exception("Texture was not acquired from TextureCache")
+
+    @staticmethod
+    def get_reference_count(texture):
+        for texture_object, reference_count in TextureCache._entry_dict.values():
+            if texture_object is texture:
+                return reference_count
+        return 0
+
+    @staticmethod
+    def clear():
+        """ Delete all cached textures, regardless of their users """
+        for texture, _ in TextureCache._entry_dict.values():
+            texture.delete()
+        TextureCache._entry_dict = {}
+
+    @staticmethod
+    def reset_statistics():
+        TextureCache._load_count = 0
+        TextureCache._hit_count = 0
+
+    @staticmethod
+    def get_statistics():
+        """ Return dictionary of numbers of textures and bytes of GPU memory used by them """
+        return {
+            "texture_count": len(TextureCache._entry_dict),
+            "reference_count": sum(entry[1] for entry in TextureCache._entry_dict.values()),
+            "load_count": TextureCache._load_count,
+            "hit_count": TextureCache._hit_count,
+            "memory_size": sum(entry[0].memory_size for entry in TextureCache._entry_dict.values()),
+            "total_memory_size": Texture.get_total_memory_size(),
+        }
+
+    @staticmethod
+    def print_statistics():
+        statistics = TextureCache.get_statistics()
+        print(f"Textures: {statistics['texture_count']} cached for {statistics['reference_count']} users "
+              f"({statistics['hit_count']} shared loads), {statistics['memory_size'] / 2 ** 20:.1f} MiB cached, "
+              f"{statistics['total_memory_size'] / 2 ** 20:.1f} MiB in all textures")
@@ -0,0 +1,87 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pygame
+
+from scripts.material.texture import Texture
+
+
+class TextureLoader:
+    """
+    Loads textures in the background: image files are decoded and converted to RGBA data
+    by a pool of worker threads, while the texture shows a 1x1 placeholder.
+    The decoded data is uploaded to the GPU by update(), which the renderer calls
+    at the start of each frame (OpenGL may only be used by the render thread),
+    spending at most a given time per frame.
+    """
+    WORKER_COUNT = 4
+    # Color shown until the image is loaded
+    PLACEHOLDER_PIXEL_DATA = bytes([128, 128, 128, 255])
+    # Seconds per frame spent uploading loaded images; at least one image is uploaded per frame
+    UPLOAD_TIME_BUDGET = 0.004
+    _executor = None
+    # List of [texture, future] in order of loading
+    _pending_list = []
+
+    @staticmethod
+    def load(file_name, property_dict=None):
+        """ Return a texture showing the placeholder until the image file has been loaded """
+        texture = Texture(None, property_dict or {})
+        texture.upload_pixel_data(TextureLoader.PLACEHOLDER_PIXEL_DATA, 1, 1)
+        if TextureLoader._executor is None:
+            TextureLoader._executor = ThreadPoolExecutor(max_workers=TextureLoader.WORKER_COUNT,
+                                                         thread_name_prefix="TextureLoader")
+        future = TextureLoader._executor.submit(TextureLoader.decode_image, file_name)
+        TextureLoader._pending_list.append([texture, future])
+        return texture
+
+    @staticmethod
+    def decode_image(file_name):
+        """ Return (surface, RGBA pixel data, width, height) of an image file; runs in a worker thread """
+        surface = pygame.image.load(file_name)
+        pixel_data = pygame.image.tostring(surface, "RGBA", True)
+        return surface, pixel_data, surface.get_width(), surface.get_height()
+
+    @staticmethod
+    def get_pending_count():
+        """ Return number of textures not uploaded yet """
+        return len(TextureLoader._pending_list)
+
+    @staticmethod
+    def update(time_budget=None):
+        """ Upload decoded images until the time budget (seconds) is spent; return number of uploads """
+        if time_budget is None:
+            time_budget = TextureLoader.UPLOAD_TIME_BUDGET
+        start = time.perf_counter()
+        upload_count = 0
+        remaining_list = []
+        pending_list = TextureLoader._pending_list
+        index = 0
+        try:
+            while index < len(pending_list):
+                entry = pending_list[index]
+                index += 1
+                texture, future = entry
+                # Textures deleted while loading are dropped
+                if texture.texture_ref is None:
+                    continue
+                if not future.done() or (upload_count > 0 and time.perf_counter() - start > time_budget):
+                    remaining_list.append(entry)
+                    continue
+                # Raises the exception of the worker, e.g. for a missing file; the entry is dropped
+                surface, pixel_data, width, height = future.result()
+                texture.surface = surface
+                texture.upload_pixel_data(pixel_data, width, height)
+                upload_count += 1
+        finally:
+            # Uploaded and failed entries are removed even if an exception is raised
+            TextureLoader._pending_list = remaining_list + pending_list[index:]
+        return upload_count
+
+    @staticmethod
+    def finish():
+        """ Wait for all images and upload them """
+        while TextureLoader._pending_list:
+            # Waits without raising; update raises the exception of a failed image and drops it
+            TextureLoader._pending_list[0][1].exception()
+            TextureLoader.update(float("inf"))
@@ -1,11 +1,10 @@
 import OpenGL.GL as GL
+from scripts.core.uniform_buffer import UniformBuffer
 from scripts.material.material import Material
 
 class TextureMaterial(Material):
     def __init__(self, texture, property_dict=None):
-        vertex_shader_code = """
-            uniform mat4 projectionMatrix;
-            uniform mat4 viewMatrix;
+        vertex_shader_code = UniformBuffer.CAMERA_BLOCK_CODE + """
             uniform mat4 modelMatrix;
             in vec3 vertexPosition;
             in vec2 vertexUV;
@@ -46,13 +45,10 @@ class TextureMaterial(Material):
         self.setting_dict["lineWidth"] = 1
         self.set_properties(property_dict)
 
-    def update_render_settings(self):
-        if self.setting_dict["doubleSide"]:
-            GL.glDisable(GL.GL_CULL_FACE)
-        else:
-            GL.glEnable(GL.GL_CULL_FACE)
+    def update_render_settings(self, render_state):
+        render_state.set_capability(GL.GL_CULL_FACE, not self.setting_dict["doubleSide"])
         if self.setting_dict["wireframe"]:
-            GL.glPolygonMode(GL.GL_FRONT_AND_BACK, GL.GL_LINE)
+            render_state.set_polygon_mode(GL.GL_LINE)
         else:
-            GL.glPolygonMode(GL.GL_FRONT_AND_BACK, GL.GL_FILL)
-        GL.glLineWidth(self.setting_dict["lineWidth"])
+            render_state.set_polygon_mode(GL.GL_FILL)
+        render_state.set_line_width(self.setting_dict["lineWidth"])
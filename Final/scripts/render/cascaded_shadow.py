@@ -0,0 +1,171 @@
+import OpenGL.GL as GL
+import numpy as np
+from numpy.linalg import inv
+
+from scripts.camera.camera import Camera
+from scripts.core.uniform_buffer import UniformBuffer
+from scripts.material.depth import DepthMaterial
+from scripts.render.render_target import DepthRenderTarget
+
+
+class CascadedShadow:
+    """
+    Shadow of a directional light using cascaded shadow maps.
+    The view frustum of the camera is split by distance into slices (cascades),
+    and each slice gets an orthographic shadow camera fitted around it,
+    so that near objects get detailed shadows while far objects still get shadows.
+    Depths of all cascades are stored in the layers of one depth texture array,
+    which materials sample with hardware depth comparison.
+    """
+    # Sampler uniform of materials receiving this kind of shadow, and its texture unit
+    SAMPLER_NAME = "shadowCascadeSampler"
+    TEXTURE_UNIT = 4
+
+    def __init__(self,
+                 light_source,
+                 strength=0.5,
+                 resolution=(1024, 1024),
+                 cascade_count=4,
+                 max_distance=100,
+                 split_weight=0.75,
+                 caster_distance=50,
+                 bias=0.002):
+        if not 1 <= cascade_count <= UniformBuffer.MAX_CASCADES:
+            raise Exception(f"Number of cascades must be between 1 and {UniformBuffer.MAX_CASCADES}")
+        # Must be directional light
+        self._light_source = light_source
+        # Shadows are computed up to this distance from the camera (or up to its far plane)
+        self._max_distance = max_distance
+        # Split distances blend logarithmic (weight 1) and uniform (weight 0) distribution
+        self._split_weight = split_weight
+        # Objects up to this distance outside of a slice, towards the light, still cast shadows into it
+        self._caster_distance = caster_distance
+        # One camera per cascade; not attached to the light, as their positions follow the viewing camera
+        self._camera_list = [Camera() for _ in range(cascade_count)]
+        # Far distance of each cascade from the viewing camera
+        self._split_distance_list = [0.0] * cascade_count
+        # Depth texture array, one layer per cascade
+        self._render_target = DepthRenderTarget(resolution, cascade_count)
+        # Render only depth data to target texture
+        self._material = DepthMaterial(depth_only=True)
+        # Used for instances of InstancedMesh
+        self._instanced_material = DepthMaterial(instanced=True, depth_only=True)
+        # Controls darkness of shadow
+        self._strength = strength
+        # Used to avoid visual artifacts due to
+        # rounding / sampling precision issues
+        self._bias = bias
+
+    @property
+    def bias(self):
+        return self._bias
+
+    @property
+    def camera_list(self):
+        """ Cameras rendering the layers of the shadow map, from near to far """
+        return self._camera_list
+
+    @property
+    def cascade_count(self):
+        return len(self._camera_list)
+
+    @property
+    def instanced_material(self):
+        return self._instanced_material
+
+    @property
+    def light_source(self):
+        return self._light_source
+
+    @property
+    def material(self):
+        return self._material
+
+    @property
+    def render_target(self):
+        return self._render_target
+
+    @property
+    def split_distance_list(self):
+        return self._split_distance_list
+
+    @property
+    def strength(self):
+        return self._strength
+
+    @property
+    def texture_ref(self):
+        """ Reference of the texture sampled by materials receiving the shadow """
+        return self._render_target.texture_ref
+
+    def update_internal(self, camera):
+        """ Fit the cascade cameras to the slices of the frustum of the camera (with up-to-date view matrix) """
+        near_corners, far_corners = CascadedShadow.get_frustum_corners(camera.projection_matrix)
+        near = -near_corners[0, 2]
+        far = -far_corners[0, 2]
+        last_distance = min(far, self._max_distance)
+        distance_list = [near] + CascadedShadow.get_split_distances(near, last_distance, self.cascade_count,
+                                                                     self._split_weight)
+        # Columns of the rotation of the light: x and y span the shadow map, z points towards the light
+        light_matrix = self._light_source.global_matrix
+        rotation = light_matrix[0:3, 0:3] / np.linalg.norm(light_matrix[0:3, 0:3], axis=0)
+        width = self._render_target.width
+        for index, shadow_camera in enumerate(self._camera_list):
+            start_distance, end_distance = distance_list[index], distance_list[index + 1]
+            # Corners of the slice, interpolated along the edges of the frustum, in world coordinates
+            corner_list = []
+            for distance in (start_distance, end_distance):
+                fraction = (distance - near) / (far - near)
+                corner_list.append(near_corners + (far_corners - near_corners) * fraction)
+            corners = np.vstack(corner_list)
+            corners = (camera.global_matrix @ np.hstack([corners, np.ones((8, 1))]).T)[0:3].T
+            # A bounding sphere does not change size when the camera turns, which keeps shadow edges steady
+            center = corners.mean(axis=0)
+            radius = np.linalg.norm(corners - center, axis=1).max()
+            radius = np.ceil(radius * 16) / 16
+            # Move the center by whole texels in the plane of the shadow map, so that edges do not flicker
+            texel_size = 2 * radius / width
+            light_center = rotation.T @ center
+            light_center[0:2] = np.floor(light_center[0:2] / texel_size) * texel_size
+            center = rotation @ light_center
+            matrix = np.identity(4)
+            matrix[0:3, 0:3] = rotation
+            matrix[0:3, 3] = center + rotation[:, 2] * (radius + self._caster_distance)
+            # Assign only changed matrices, so that unchanged cascades keep their transform version
+            if not np.array_equal(shadow_camera.local_matrix, matrix):
+                shadow_camera.local_matrix = matrix
+            shadow_camera.set_orthographic(-radius, radius, -radius, radius,
+                                           0, 2 * radius + self._caster_distance)
+            shadow_camera.update_view_matrix()
+            self._split_distance_list[index] = end_distance
+
+    def prepare_layer(self, layer):
+        """ Activate and clear the render target of the layer before its shadow casters are drawn """
+        self._render_target.bind_layer(layer)
+        GL.glClear(GL.GL_DEPTH_BUFFER_BIT)
+        shadow_camera = self._camera_list[layer]
+        for material in (self._material, self._instanced_material):
+            material.uniform_dict["viewMatrix"].data = shadow_camera.view_matrix
+            material.uniform_dict["projectionMatrix"].data = shadow_camera.projection_matrix
+
+    @staticmethod
+    def get_frustum_corners(projection_matrix):
+        """ Return arrays of shape (4, 3) of the corners of the near and far planes in view coordinates """
+        inverse_matrix = inv(projection_matrix)
+        corner_list = []
+        for z in (-1, 1):
+            points = inverse_matrix @ np.array([[x, y, z, 1] for x, y in ((-1, -1), (1, -1), (1, 1), (-1, 1))]).T
+            corner_list.append((points[0:3] / points[3]).T)
+        return corner_list[0], corner_list[1]
+
+    @staticmethod
+    def get_split_distances(near, far, count, weight):
+        """ Return the far distances of count slices between near and far """
+        distance_list = []
+        for index in range(1, count + 1):
+            fraction = index / count
+            uniform = near + (far - near) * fraction
+            # Orthographic cameras may have a near distance of zero or less
+            logarithmic = near * (far / near) ** fraction if near > 0 else uniform
+            distance_list.append(weight * logarithmic + (1 - weight) * uniform)
+        return distance_list
@@ -0,0 +1,140 @@
+import ctypes
+import json
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import OpenGL.GL as GL
+import numpy as np
+import pygame
+
+
+class FrameCapture:
+    """
+    Records the frames of the window or of a RenderTarget as image files without stalling the pipeline.
+    Each capture copies the framebuffer into one of buffer_count pixel pack buffers (used in turn);
+    the copy is only mapped buffer_count - 1 frames later, when the GPU has usually finished it,
+    guarded by a fence. The mapped pixels are encoded and written by a pool of worker processes,
+    so that encoding does not slow down rendering. Files are named frame_000000.png (or .rgba)
+    in the output directory; raw .rgba frames are RGBA with 8 bits per channel, top row first,
+    of the size written to capture.json.
+    """
+    FORMAT_LIST = ("png", "raw")
+    # Frames waiting for a worker, per worker; when exceeded, capturing waits for the oldest frame
+    MAX_PENDING_PER_WORKER = 4
+
+    def __init__(self, directory, width, height, framebuffer_ref=0, file_format="png",
+                 buffer_count=3, worker_count=None):
+        if file_format not in FrameCapture.FORMAT_LIST:
+            raise Exception(f"Unknown capture format: {file_format}")
+        if buffer_count < 2:
+            raise Exception("Frame capture needs at least 2 pixel pack buffers")
+        self._directory = directory
+        self._width = width
+        self._height = height
+        # The value 0 is indicating the framebuffer attached to the window
+        self._framebuffer_ref = framebuffer_ref
+        self._file_format = file_format
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, "capture.json"), "w") as info_file:
+            json.dump({"width": width, "height": height, "format": file_format}, info_file)
+        size = width * height * 4
+        self._buffer_ref_list = [GL.glGenBuffers(1) for _ in range(buffer_count)]
+        for buffer_ref in self._buffer_ref_list:
+            GL.glBindBuffer(GL.GL_PIXEL_PACK_BUFFER, buffer_ref)
+            GL.glBufferData(GL.GL_PIXEL_PACK_BUFFER, size, None, GL.GL_STREAM_READ)
+        GL.glBindBuffer(GL.GL_PIXEL_PACK_BUFFER, 0)
+        # Frame number and fence of the copy in each buffer, or None if the buffer is free
+        self._pending_list = [None] * buffer_count
+        self._frame_number = 0
+        # New processes instead of forked ones: the render process has an OpenGL context and threads
+        worker_count = worker_count or max(1, min(4, (os.cpu_count() or 2) - 1))
+        self._executor = ProcessPoolExecutor(max_workers=worker_count,
+                                             mp_context=multiprocessing.get_context("spawn"))
+        self._max_pending = worker_count * FrameCapture.MAX_PENDING_PER_WORKER
+        self._future_queue = deque()
+
+    @property
+    def directory(self):
+        return self._directory
+
+    @property
+    def frame_count(self):
+        """ Number of frames captured so far """
+        return self._frame_number
+
+    def capture(self):
+        """ Start copying the current image of the framebuffer, and hand older copies to the workers """
+        index = self._frame_number % len(self._buffer_ref_list)
+        # Only the case if the buffer has not been read since its last use, e.g. after an exception
+        if self._pending_list[index] is not None:
+            self._read_buffer(index)
+        GL.glBindFramebuffer(GL.GL_READ_FRAMEBUFFER, self._framebuffer_ref)
+        GL.glPixelStorei(GL.GL_PACK_ALIGNMENT, 1)
+        GL.glBindBuffer(GL.GL_PIXEL_PACK_BUFFER, self._buffer_ref_list[index])
+        # With a pack buffer bound, the pixels are copied into the buffer and the call returns at once
+        GL.glReadPixels(0, 0, self._width, self._height, GL.GL_RGBA, GL.GL_UNSIGNED_BYTE, ctypes.c_void_p(0))
+        GL.glBindBuffer(GL.GL_PIXEL_PACK_BUFFER, 0)
+        fence = GL.glFenceSync(GL.GL_SYNC_GPU_COMMANDS_COMPLETE, 0)
+        self._pending_list[index] = (self._frame_number, fence)
+        self._frame_number += 1
+        # The oldest copy is read now; its buffer is used again by the next capture
+        next_index = self._frame_number % len(self._buffer_ref_list)
+        if self._pending_list[next_index] is not None:
+            self._read_buffer(next_index)
+
+    def finish(self):
+        """ Read all remaining copies and wait until all frames are written; return the number of frames """
+        pending_index_list = [index for index, pending in enumerate(self._pending_list) if pending is not None]
+        # Oldest frames first
+        for index in sorted(pending_index_list, key=lambda index: self._pending_list[index][0]):
+            self._read_buffer(index)
+        while self._future_queue:
+            self._future_queue.popleft().result()
+        return self._frame_number
+
+    def delete(self):
+        """ Write the remaining frames, then stop the workers and delete the buffers """
+        if self._executor is None:
+            return
+        self.finish()
+        self._executor.shutdown()
+        self._executor = None
+        GL.glDeleteBuffers(len(self._buffer_ref_list), self._buffer_ref_list)
+
+    def _read_buffer(self, index):
+        """ Map the buffer with given index and pass a copy of its pixels to a worker """
+        frame_number, fence = self._pending_list[index]
+        self._pending_list[index] = None
+        # Returns at once if the copy has finished, which is usually the case after a frame
+        GL.glClientWaitSync(fence, GL.GL_SYNC_FLUSH_COMMANDS_BIT, GL.GL_TIMEOUT_IGNORED)
+        GL.glDeleteSync(fence)
+        size = self._width * self._height * 4
+        GL.glBindBuffer(GL.GL_PIXEL_PACK_BUFFER, self._buffer_ref_list[index])
+        pointer = GL.glMapBufferRange(GL.GL_PIXEL_PACK_BUFFER, 0, size, GL.GL_MAP_READ_BIT)
+        pixel_data = ctypes.string_at(pointer, size)
+        GL.glUnmapBuffer(GL.GL_PIXEL_PACK_BUFFER)
+        GL.glBindBuffer(GL.GL_PIXEL_PACK_BUFFER, 0)
+        # Limit the memory used by frames waiting for a worker
+        while len(self._future_queue) >= self._max_pending:
+            self._future_queue.popleft().result()
+        file_name = os.path.join(self._directory, f"frame_{frame_number:06d}."
+                                 + ("png" if self._file_format == "png" else "rgba"))
+        self._future_queue.append(self._executor.submit(FrameCapture.write_frame, file_name, pixel_data,
+                                                        self._width, self._height, self._file_format))
+        # Report errors of the workers early, without waiting
+        while self._future_queue and self._future_queue[0].done():
+            self._future_queue.popleft().result()
+
+    @staticmethod
+    def write_frame(file_name, pixel_data, width, height, file_format):
+        """ Write RGBA pixel data with the bottom row first as image file; runs in a worker process """
+        # OpenGL stores the bottom row first
+        pixel_array = np.frombuffer(pixel_data, dtype=np.uint8).reshape(height, width, 4)[::-1]
+        if file_format == "png":
+            surface = pygame.image.frombuffer(pixel_array.tobytes(), (width, height), "RGBA")
+            pygame.image.save(surface, file_name)
+        else:
+            with open(file_name, "wb") as raw_file:
+                raw_file.write(pixel_array.tobytes())
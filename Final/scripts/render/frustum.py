@@ -0,0 +1,71 @@
+import numpy as np
+
+
+class Frustum:
+    """
+    Volume seen by a camera, bounded by six planes (left, right, bottom, top, near, far).
+    Each plane is stored as (a, b, c, d) with unit normal (a, b, c) pointing inside,
+    so that a point p is inside the plane if a*px + b*py + c*pz + d >= 0.
+    """
+    # Results of classify_box
+    OUTSIDE = 0
+    INTERSECTING = 1
+    INSIDE = 2
+
+    def __init__(self, matrix):
+        # matrix: projection matrix @ view matrix of a camera
+        self._plane_data = Frustum.extract_planes(matrix)
+
+    @property
+    def plane_data(self):
+        return self._plane_data
+
+    @staticmethod
+    def from_camera(camera):
+        """ Return the frustum of a camera whose view matrix is up to date """
+        return Frustum(camera.projection_matrix @ camera.view_matrix)
+
+    @staticmethod
+    def extract_planes(matrix):
+        """ Return array of shape (6, 4) of the planes of the clip volume of a projection @ view matrix """
+        matrix = np.asarray(matrix, dtype=float)
+        # A point is inside the clip volume if -w <= x, y, z <= w,
+        # where (x, y, z, w) are the rows of the matrix applied to the point
+        plane_data = np.array([
+            matrix[3] + matrix[0],
+            matrix[3] - matrix[0],
+            matrix[3] + matrix[1],
+            matrix[3] - matrix[1],
+            matrix[3] + matrix[2],
+            matrix[3] - matrix[2],
+        ])
+        lengths = np.linalg.norm(plane_data[:, 0:3], axis=1, keepdims=True)
+        return plane_data / np.where(lengths > 0, lengths, 1)
+
+    def intersects_sphere(self, center, radius):
+        """ Return False if the sphere is completely outside the frustum """
+        distances = self._plane_data[:, 0:3] @ center + self._plane_data[:, 3]
+        return bool((distances >= -radius).all())
+
+    def intersects_spheres(self, centers, radii):
+        """ Return boolean array telling for each sphere whether it is not completely outside the frustum """
+        distances = np.asarray(centers) @ self._plane_data[:, 0:3].T + self._plane_data[:, 3]
+        return (distances >= -np.asarray(radii)[:, None]).all(axis=1)
+
+    def intersects_box(self, minimum, maximum):
+        """ Return False if the axis-aligned box is completely outside the frustum """
+        return self.classify_box(minimum, maximum) != Frustum.OUTSIDE
+
+    def classify_box(self, minimum, maximum):
+        """ Return OUTSIDE, INTERSECTING or INSIDE for an axis-aligned box """
+        normals = self._plane_data[:, 0:3]
+        positive = normals >= 0
+        # For each plane, the corner of the box farthest along the plane normal...
+        far_distances = (np.where(positive, maximum, minimum) * normals).sum(axis=1) + self._plane_data[:, 3]
+        if (far_distances < 0).any():
+            return Frustum.OUTSIDE
+        # ...and the corner nearest
+        near_distances = (np.where(positive, minimum, maximum) * normals).sum(axis=1) + self._plane_data[:, 3]
+        if (near_distances >= 0).all():
+            return Frustum.INSIDE
+        return Frustum.INTERSECTING
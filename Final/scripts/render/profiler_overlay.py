@@ -0,0 +1,131 @@
+import OpenGL.GL as GL
+import pygame
+
+from scripts.material.material import Material
+from scripts.material.streaming_texture import StreamingTexture
+
+
+class ProfilerOverlay:
+    """
+    Text panel in the upper left corner of the screen, showing the averaged report of a Profiler.
+    The text is drawn with pygame.font into a StreamingTexture, again every update_interval frames,
+    and shown on a rectangle whose corners are computed in the vertex shader, so no vertex data is needed.
+    Draw it after the scene has been rendered.
+    """
+    def __init__(self, profiler, font_size=14, update_interval=15, frame_count=60):
+        self._profiler = profiler
+        # Times are averaged over frame_count frames; the text changes every update_interval frames
+        self._update_interval = update_interval
+        self._frame_count = frame_count
+        self._frame_counter = 0
+        self._visible = True
+        pygame.font.init()
+        self._font = pygame.font.SysFont("monospace", font_size)
+        # Created when the first text is drawn
+        self._texture = None
+        vertex_shader_code = """
+            // lower left corner and size, in normalized device coordinates
+            uniform vec4 rectangle;
+            out vec2 UV;
+            void main()
+            {
+                // corners (0, 0), (1, 0), (0, 1), (1, 1) of a triangle strip
+                vec2 corner = vec2(gl_VertexID % 2, gl_VertexID / 2);
+                UV = corner;
+                gl_Position = vec4(rectangle.xy + corner * rectangle.zw, 0.0, 1.0);
+            }
+        """
+        fragment_shader_code = """
+            uniform sampler2D textureSampler;
+            in vec2 UV;
+            out vec4 fragColor;
+            void main()
+            {
+                fragColor = texture(textureSampler, UV);
+            }
+        """
+        self._material = Material(vertex_shader_code, fragment_shader_code)
+        self._material.add_uniform("vec4", "rectangle", [-1.0, -1.0, 0.0, 0.0])
+        self._material.add_uniform("sampler2D", "textureSampler", [0, 0])
+        self._material.locate_uniforms()
+        # Core profiles need a vertex array object to draw, even without vertex data
+        self._vao_ref = GL.glGenVertexArrays(1)
+
+    @property
+    def profiler(self):
+        return self._profiler
+
+    @property
+    def visible(self):
+        return self._visible
+
+    @visible.setter
+    def visible(self, visible):
+        self._visible = visible
+
+    def draw(self, renderer, margin=8):
+        """ Draw the panel over the image rendered last by the renderer """
+        if self._texture is None or self._frame_counter % self._update_interval == 0:
+            self._update_texture()
+        self._frame_counter += 1
+        render_target = renderer.default_render_target
+        if render_target is None:
+            GL.glBindFramebuffer(GL.GL_FRAMEBUFFER, 0)
+            width, height = renderer.window_size
+        else:
+            GL.glBindFramebuffer(GL.GL_FRAMEBUFFER, render_target.framebuffer_ref)
+            width, height = render_target.width, render_target.height
+        GL.glViewport(0, 0, width, height)
+        render_state = renderer.render_state
+        # Drawn over everything, blended with the image
+        render_state.set_capability(GL.GL_DEPTH_TEST, False)
+        render_state.set_capability(GL.GL_CULL_FACE, False)
+        render_state.set_capability(GL.GL_BLEND, True)
+        GL.glBlendFunc(GL.GL_SRC_ALPHA, GL.GL_ONE_MINUS_SRC_ALPHA)
+        render_state.set_polygon_mode(GL.GL_FILL)
+        render_state.use_program(self._material.program_ref)
+        render_state.bind_vertex_array(self._vao_ref)
+        panel_width = 2 * self._texture.width / width
+        panel_height = 2 * self._texture.height / height
+        self._material.uniform_dict["rectangle"].data = [-1 + 2 * margin / width,
+                                                         1 - 2 * margin / height - panel_height,
+                                                         panel_width, panel_height]
+        self._material.uniform_dict["textureSampler"].data = [self._texture.texture_ref, 0]
+        self._material.upload_uniforms(render_state)
+        GL.glDrawArrays(GL.GL_TRIANGLE_STRIP, 0, 4)
+        render_state.set_capability(GL.GL_DEPTH_TEST, True)
+
+    def _update_texture(self):
+        """ Draw the current report into the texture """
+        row_list = self._profiler.get_report_rows(self._frame_count)
+        # Names are left-aligned, numbers right-aligned in their columns
+        surface_list_list = [[self._font.render(text, True, (255, 255, 255)) for text in row] for row in row_list]
+        column_width_list = [max(surface_list[column].get_width() for surface_list in surface_list_list)
+                             for column in range(3)]
+        line_height = self._font.get_linesize()
+        padding = 4
+        spacing = 12
+        width = sum(column_width_list) + 2 * spacing + 2 * padding
+        height = line_height * len(row_list) + 2 * padding
+        # Semi-transparent background, so that the text is readable over any image
+        panel = pygame.Surface((width, height), pygame.SRCALPHA)
+        panel.fill((0, 0, 0, 160))
+        for line_number, surface_list in enumerate(surface_list_list):
+            y = padding + line_number * line_height
+            panel.blit(surface_list[0], (padding, y))
+            right = padding + column_width_list[0]
+            for column in (1, 2):
+                right += spacing + column_width_list[column]
+                panel.blit(surface_list[column], (right - surface_list[column].get_width(), y))
+        if self._texture is None:
+            self._texture = StreamingTexture(width, height)
+        elif (self._texture.width, self._texture.height) != (width, height):
+            self._texture.resize(width, height)
+        # Rows from bottom to top, as expected by OpenGL
+        self._texture.update(pygame.image.tostring(panel, "RGBA", True))
+
+    def delete(self):
+        if self._texture is not None:
+            self._texture.delete()
+            self._texture = None
+        GL.glDeleteVertexArrays(1, [self._vao_ref])
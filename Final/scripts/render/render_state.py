@@ -0,0 +1,126 @@
+import OpenGL.GL as GL
+
+
+class RenderState:
+    """
+    Tracks the OpenGL state set through it and skips calls
+    that would set a value which is already set.
+    Counts issued and avoided calls by function name,
+    including uniform uploads counted by Uniform.
+    State changed by OpenGL calls made elsewhere is not seen,
+    so the renderer calls reset() at the start of each frame.
+    """
+    def __init__(self):
+        # Tracked values; None means unknown
+        self._program_ref = None
+        self._vao_ref = None
+        self._active_texture_unit = None
+        # texture unit -> texture reference, for each texture target
+        self._texture_dict = {}
+        # capability (GL.GL_CULL_FACE, ...) -> bool
+        self._capability_dict = {}
+        self._polygon_mode = None
+        self._line_width = None
+        # Counters since last reset_counters(), indexed by OpenGL function name
+        self._issued_count_dict = {}
+        self._avoided_count_dict = {}
+
+    @property
+    def issued_count_dict(self):
+        return self._issued_count_dict
+
+    @property
+    def avoided_count_dict(self):
+        return self._avoided_count_dict
+
+    @property
+    def issued_count(self):
+        return sum(self._issued_count_dict.values())
+
+    @property
+    def avoided_count(self):
+        return sum(self._avoided_count_dict.values())
+
+    def reset(self):
+        """ Forget all tracked values, so that the next call of each kind is issued """
+        self._program_ref = None
+        self._vao_ref = None
+        self._active_texture_unit = None
+        self._texture_dict = {}
+        self._capability_dict = {}
+        self._polygon_mode = None
+        self._line_width = None
+
+    def reset_counters(self):
+        self._issued_count_dict = {}
+        self._avoided_count_dict = {}
+
+    def count(self, function_name, issued):
+        """ Count an issued or avoided call of an OpenGL function """
+        count_dict = self._issued_count_dict if issued else self._avoided_count_dict
+        count_dict[function_name] = count_dict.get(function_name, 0) + 1
+
+    def use_program(self, program_ref):
+        if self._program_ref == program_ref:
+            self.count("glUseProgram", False)
+            return
+        GL.glUseProgram(program_ref)
+        self._program_ref = program_ref
+        self.count("glUseProgram", True)
+
+    def bind_vertex_array(self, vao_ref):
+        if self._vao_ref == vao_ref:
+            self.count("glBindVertexArray", False)
+            return
+        GL.glBindVertexArray(vao_ref)
+        self._vao_ref = vao_ref
+        self.count("glBindVertexArray", True)
+
+    def active_texture(self, texture_unit):
+        if self._active_texture_unit == texture_unit:
+            self.count("glActiveTexture", False)
+            return
+        GL.glActiveTexture(GL.GL_TEXTURE0 + texture_unit)
+        self._active_texture_unit = texture_unit
+        self.count("glActiveTexture", True)
+
+    def bind_texture(self, texture_unit, texture_ref, target=GL.GL_TEXTURE_2D):
+        """ Bind texture object to texture unit (0...15) """
+        unit_dict = self._texture_dict.setdefault(target, {})
+        if unit_dict.get(texture_unit) == texture_ref:
+            self.count("glBindTexture", False)
+            return
+        self.active_texture(texture_unit)
+        GL.glBindTexture(target, texture_ref)
+        unit_dict[texture_unit] = texture_ref
+        self.count("glBindTexture", True)
+
+    def set_capability(self, capability, enabled):
+        """ Enable or disable a capability such as GL.GL_CULL_FACE """
+        enabled = bool(enabled)
+        if self._capability_dict.get(capability) == enabled:
+            self.count("glEnable" if enabled else "glDisable", False)
+            return
+        if enabled:
+            GL.glEnable(capability)
+        else:
+            GL.glDisable(capability)
+        self._capability_dict[capability] = enabled
+        self.count("glEnable" if enabled else "glDisable", True)
+
+    def set_polygon_mode(self, mode):
+        """ Set polygon mode (GL.GL_FILL, GL.GL_LINE) for front and back faces """
+        if self._polygon_mode == mode:
+            self.count("glPolygonMode", False)
+            return
+        GL.glPolygonMode(GL.GL_FRONT_AND_BACK, mode)
+        self._polygon_mode = mode
+        self.count("glPolygonMode", True)
+
+    def set_line_width(self, line_width):
+        if self._line_width == line_width:
+            self.count("glLineWidth", False)
+            return
+        GL.glLineWidth(line_width)
+        self._line_width = line_width
+        self.count("glLineWidth", True)
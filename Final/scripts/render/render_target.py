@@ -1,4 +1,5 @@
 import OpenGL.GL as GL
+import numpy as np
 import pygame
 
 from scripts.material.texture import Texture
@@ -55,3 +56,76 @@ class RenderTarget:
     @property
     def texture(self):
         return self._texture
+
+    def read_pixels(self):
+        """ Return the rendered colors as RGBA array of shape (height, width, 4), top row first """
+        GL.glBindFramebuffer(GL.GL_FRAMEBUFFER, self._framebuffer_ref)
+        GL.glPixelStorei(GL.GL_PACK_ALIGNMENT, 1)
+        data = GL.glReadPixels(0, 0, self._width, self._height, GL.GL_RGBA, GL.GL_UNSIGNED_BYTE)
+        # OpenGL stores the bottom row first
+        return np.frombuffer(data, dtype=np.uint8).reshape(self._height, self._width, 4)[::-1]
+
+    def save_image(self, file_name):
+        """ Save the rendered colors as image file, format given by the file name extension (e.g. .png) """
+        pixel_array = np.ascontiguousarray(self.read_pixels())
+        surface = pygame.image.frombuffer(pixel_array.tobytes(), (self._width, self._height), "RGBA")
+        pygame.image.save(surface, file_name)
+
+
+class DepthRenderTarget:
+    """
+    Create a framebuffer with only a depth attachment, which is one layer of a depth texture array,
+    e.g. for the cascades of a shadow. No color is stored, so only depth values are written.
+    The texture compares a given depth with the stored depth when sampled by a sampler2DArrayShadow.
+    """
+    def __init__(self, resolution=(1024, 1024), layer_count=1):
+        self._width, self._height = resolution
+        self._layer_count = layer_count
+        # Depth texture array, one layer per cascade
+        self._texture_ref = GL.glGenTextures(1)
+        GL.glBindTexture(GL.GL_TEXTURE_2D_ARRAY, self._texture_ref)
+        GL.glTexImage3D(GL.GL_TEXTURE_2D_ARRAY, 0, GL.GL_DEPTH_COMPONENT24, self._width, self._height,
+                        layer_count, 0, GL.GL_DEPTH_COMPONENT, GL.GL_FLOAT, None)
+        # Linear filtering of compared values smooths shadow edges on most hardware
+        GL.glTexParameteri(GL.GL_TEXTURE_2D_ARRAY, GL.GL_TEXTURE_MAG_FILTER, GL.GL_LINEAR)
+        GL.glTexParameteri(GL.GL_TEXTURE_2D_ARRAY, GL.GL_TEXTURE_MIN_FILTER, GL.GL_LINEAR)
+        GL.glTexParameteri(GL.GL_TEXTURE_2D_ARRAY, GL.GL_TEXTURE_WRAP_S, GL.GL_CLAMP_TO_EDGE)
+        GL.glTexParameteri(GL.GL_TEXTURE_2D_ARRAY, GL.GL_TEXTURE_WRAP_T, GL.GL_CLAMP_TO_EDGE)
+        # Sampling returns 1 where the given depth is not farther than the stored depth (lit), else 0
+        GL.glTexParameteri(GL.GL_TEXTURE_2D_ARRAY, GL.GL_TEXTURE_COMPARE_MODE, GL.GL_COMPARE_REF_TO_TEXTURE)
+        GL.glTexParameteri(GL.GL_TEXTURE_2D_ARRAY, GL.GL_TEXTURE_COMPARE_FUNC, GL.GL_LEQUAL)
+        # Create a framebuffer without color buffers
+        self._framebuffer_ref = GL.glGenFramebuffers(1)
+        GL.glBindFramebuffer(GL.GL_FRAMEBUFFER, self._framebuffer_ref)
+        GL.glFramebufferTextureLayer(GL.GL_FRAMEBUFFER, GL.GL_DEPTH_ATTACHMENT, self._texture_ref, 0, 0)
+        GL.glDrawBuffer(GL.GL_NONE)
+        GL.glReadBuffer(GL.GL_NONE)
+        # Check framebuffer status
+        if GL.glCheckFramebufferStatus(GL.GL_FRAMEBUFFER) != GL.GL_FRAMEBUFFER_COMPLETE:
+            raise Exception("Framebuffer status error")
+
+    @property
+    def framebuffer_ref(self):
+        return self._framebuffer_ref
+
+    @property
+    def height(self):
+        return self._height
+
+    @property
+    def layer_count(self):
+        return self._layer_count
+
+    @property
+    def texture_ref(self):
+        return self._texture_ref
+
+    @property
+    def width(self):
+        return self._width
+
+    def bind_layer(self, layer):
+        """ Render into the given layer of the texture array """
+        GL.glBindFramebuffer(GL.GL_FRAMEBUFFER, self._framebuffer_ref)
+        GL.glFramebufferTextureLayer(GL.GL_FRAMEBUFFER, GL.GL_DEPTH_ATTACHMENT, self._texture_ref, 0, layer)
+        GL.glViewport(0, 0, self._width, self._height)
@@ -1,19 +1,82 @@
+import contextlib
+import itertools
+
 import OpenGL.GL as GL
 import pygame
 
-from scripts.core.mesh import Mesh
-from scripts.light.light import Light
+from scripts.core.uniform_buffer import UniformBuffer
+from scripts.material.texture_loader import TextureLoader
+from scripts.render.cascaded_shadow import CascadedShadow
+from scripts.render.frame_capture import FrameCapture
+from scripts.render.frustum import Frustum
+from scripts.render.render_state import RenderState
 from scripts.render.shadow import Shadow
 
 
 class Renderer:
-    def __init__(self, clear_color=(0, 0, 0)):
+    def __init__(self, clear_color=(0, 0, 0), frustum_culling=True, default_render_target=None, profiler=None):
         GL.glEnable(GL.GL_DEPTH_TEST)
         # required for antialiasing
         GL.glEnable(GL.GL_MULTISAMPLE)
         GL.glClearColor(*clear_color, 1)
-        self._window_size = pygame.display.get_surface().get_size()
+        # Target used when render() gets none, instead of the window;
+        # needed without a window, e.g. with a HeadlessContext
+        self._default_render_target = default_render_target
+        if default_render_target is None:
+            self._window_size = pygame.display.get_surface().get_size()
+        else:
+            self._window_size = (default_render_target.width, default_render_target.height)
         self._shadows_enabled = False
+        self._shadow_object = None
+        # Skips OpenGL calls that would not change the state; counts calls per frame
+        self._render_state = RenderState()
+        # Camera, light and shadow data shared by all programs; uploaded once per frame
+        self._camera_buffer = UniformBuffer(UniformBuffer.CAMERA_BINDING, UniformBuffer.CAMERA_BLOCK_SIZE)
+        self._light_buffer = UniformBuffer(UniformBuffer.LIGHT_BINDING, UniformBuffer.LIGHT_BLOCK_SIZE)
+        self._shadow_buffer = UniformBuffer(UniformBuffer.SHADOW_BINDING, UniformBuffer.SHADOW_BLOCK_SIZE)
+        self._cascade_buffer = UniformBuffer(UniformBuffer.CASCADE_BINDING, UniformBuffer.CASCADE_BLOCK_SIZE)
+        # Skip meshes whose bounding spheres are outside the camera frustum
+        self._frustum_culling = frustum_culling
+        # Number of meshes culled in the last frame, indexed by pass name
+        self._culled_count_dict = {"shadow": 0, "main": 0}
+        # Describes the light and shadow casters of each layer of the current shadow map;
+        # the shadow pass of a layer is skipped while it does not change
+        self._shadow_signature_list = []
+        self._shadow_map_updated = False
+        # Numbers of draw calls and of drawn triangles (all passes) in the last frame
+        self._draw_call_count = 0
+        self._triangle_count = 0
+        # Measures passes and material groups when set
+        self._profiler = profiler
+        # Records frames while capturing
+        self._frame_capture = None
+
+    @property
+    def default_render_target(self):
+        return self._default_render_target
+
+    @property
+    def draw_call_count(self):
+        """ Number of draw calls in the last frame, including the shadow pass """
+        return self._draw_call_count
+
+    @property
+    def triangle_count(self):
+        """ Number of triangles drawn in the last frame, including the shadow pass and all instances """
+        return self._triangle_count
+
+    @property
+    def profiler(self):
+        return self._profiler
+
+    @profiler.setter
+    def profiler(self, profiler):
+        self._profiler = profiler
+
+    @property
+    def frame_capture(self):
+        """ FrameCapture recording the frames, or None when not capturing """
+        return self._frame_capture
 
     @property
     def window_size(self):
@@ -23,41 +86,90 @@ class Renderer:
     def shadow_object(self):
         return self._shadow_object
 
+    @property
+    def culled_count_dict(self):
+        """ Number of meshes outside the frustum in the last frame, indexed by pass name: "shadow" | "main" """
+        return self._culled_count_dict
+
+    @property
+    def frustum_culling(self):
+        return self._frustum_culling
+
+    @frustum_culling.setter
+    def frustum_culling(self, frustum_culling):
+        self._frustum_culling = frustum_culling
+
+    @property
+    def shadow_map_updated(self):
+        """ Was the shadow map (or one of its cascades) rendered again in the last frame? """
+        return self._shadow_map_updated
+
+    @property
+    def render_state(self):
+        """ State tracker with counters of issued and avoided state changes of the last frame """
+        return self._render_state
+
     def render(self, scene, camera, clear_color=True, clear_depth=True, render_target=None):
-        # Filter descendents
-        descendant_list = scene.descendant_list
-        mesh_filter = lambda x: isinstance(x, Mesh)
-        mesh_list = list(filter(mesh_filter, descendant_list))
+        if render_target is None:
+            render_target = self._default_render_target
+        # State may have been changed outside of the renderer since the last frame
+        self._render_state.reset()
+        self._render_state.reset_counters()
+        self._draw_call_count = 0
+        self._triangle_count = 0
+        with self._scope("render"):
+            # Upload images loaded in the background since the last frame
+            with self._scope("texture uploads"):
+                TextureLoader.update()
+            # Update camera view (calculate inverse)
+            camera.update_view_matrix()
+            # Levels of detail are chosen by size on the screen of the camera
+            viewport_height = self._window_size[1] if render_target is None else render_target.height
+            self._shadow_map_updated = False
+            if self._shadows_enabled:
+                with self._scope("shadow pass"):
+                    self._render_shadow_pass(scene, camera, viewport_height)
+            with self._scope("main pass"):
+                self._render_main_pass(scene, camera, clear_color, clear_depth, render_target, viewport_height)
+        if self._profiler is not None:
+            issued_count_dict = self._render_state.issued_count_dict
+            self._profiler.add_counters({
+                "draw calls": self._draw_call_count,
+                "triangles": self._triangle_count,
+                "program switches": issued_count_dict.get("glUseProgram", 0),
+                "uniform uploads": sum(count for function_name, count in issued_count_dict.items()
+                                       if function_name.startswith("glUniform")),
+                "avoided state changes": self._render_state.avoided_count,
+            })
 
-        # shadow pass
-        if self._shadows_enabled:
-            # Set render target properties
-            GL.glBindFramebuffer(GL.GL_FRAMEBUFFER, self._shadow_object.render_target.framebuffer_ref)
-            GL.glViewport(0, 0, self._shadow_object.render_target.width, self._shadow_object.render_target.height)
-            # Set default color to white, used when no objects present to cast shadows
-            GL.glClearColor(1, 1, 1, 1)
-            GL.glClear(GL.GL_COLOR_BUFFER_BIT)
-            GL.glClear(GL.GL_DEPTH_BUFFER_BIT)
-            # Everything in the scene gets rendered with depthMaterial so
-            # only need to call glUseProgram & set matrices once
-            GL.glUseProgram(self._shadow_object.material.program_ref)
-            self._shadow_object.update_internal()
-            for mesh in mesh_list:
-                # Skip invisible meshes
-                if not mesh.visible:
-                    continue
-                # Only triangle-based meshes cast shadows
-                if mesh.material.setting_dict["drawStyle"] != GL.GL_TRIANGLES:
-                    continue
-                # Bind VAO
-                GL.glBindVertexArray(mesh.vao_ref)
-                # Update transform data
-                self._shadow_object.material.uniform_dict["modelMatrix"].data = mesh.global_matrix
-                # Update uniforms (matrix data) stored in shadow material
-                for var_name, uniform_obj in self._shadow_object.material.uniform_dict.items():
-                    uniform_obj.upload_data()
-                GL.glDrawArrays(GL.GL_TRIANGLES, 0, mesh.geometry.vertex_count)
+    def _render_shadow_pass(self, scene, camera, viewport_height):
+        """ Render the layers of the shadow map whose casters have changed since they were rendered """
+        # Cascades are fitted to the frustum of the camera
+        self._shadow_object.update_internal(camera)
+        culled_count = 0
+        for layer, shadow_camera in enumerate(self._shadow_object.camera_list):
+            # Only triangle-based meshes cast shadows
+            shadow_mesh_list = [mesh for mesh in self._cull(scene, shadow_camera, "shadow")
+                                if mesh.cast_shadow and mesh.material.setting_dict["drawStyle"] == GL.GL_TRIANGLES]
+            culled_count += self._culled_count_dict["shadow"]
+            for mesh in shadow_mesh_list:
+                mesh.select_level(camera, viewport_height)
+            # A layer of the shadow map stays valid while its camera and all its casters are unchanged
+            shadow_signature = (shadow_camera.transform_version,
+                                shadow_camera.projection_matrix.tobytes(),
+                                tuple(mesh.shadow_signature for mesh in shadow_mesh_list))
+            if shadow_signature != self._shadow_signature_list[layer]:
+                self._shadow_signature_list[layer] = shadow_signature
+                self._shadow_map_updated = True
+                with self._scope(f"layer {layer}"):
+                    self._render_shadow_map(layer, shadow_mesh_list)
+        # Total over all layers
+        self._culled_count_dict["shadow"] = culled_count
 
+    def _render_main_pass(self, scene, camera, clear_color, clear_depth, render_target, viewport_height):
+        """ Render the visible meshes of the scene into the render target, or the window if it is None """
+        # Lists of meshes and lights are cached by the scene until the scene graph changes
+        light_list = scene.light_list
         # Activate render target
         if render_target is None:
             # Set render target to window
@@ -75,45 +187,184 @@ class Renderer:
         if clear_depth:
             GL.glClear(GL.GL_DEPTH_BUFFER_BIT)
         # blending
-        GL.glEnable(GL.GL_BLEND)
+        self._render_state.set_capability(GL.GL_BLEND, True)
         GL.glBlendFunc(GL.GL_SRC_ALPHA, GL.GL_ONE_MINUS_SRC_ALPHA)
-        # Update camera view (calculate inverse)
-        camera.update_view_matrix()
-        # Extract list of all Mesh instances in scene
-        descendant_list = scene.descendant_list
-        mesh_list = list(filter(lambda x: isinstance(x, Mesh), descendant_list))
-        # Extract list of all Light instances in scene
-        light_list = list(filter(lambda x: isinstance(x, Light), descendant_list))
-        for mesh in mesh_list:
-            # If this object is not visible, continue to next object in list
-            if not mesh.visible:
-                continue
-            GL.glUseProgram(mesh.material.program_ref)
+        # Upload data shared by all meshes to the uniform buffers
+        with self._scope("uniform buffers"):
+            self._camera_buffer.upload_data(UniformBuffer.pack_camera(camera), self._render_state)
+            self._light_buffer.upload_data(UniformBuffer.pack_lights(light_list), self._render_state)
+            if isinstance(self._shadow_object, CascadedShadow):
+                self._cascade_buffer.upload_data(UniformBuffer.pack_cascades(self._shadow_object), self._render_state)
+            elif self._shadows_enabled:
+                self._shadow_buffer.upload_data(UniformBuffer.pack_shadow(self._shadow_object), self._render_state)
+        with self._scope("culling"):
+            visible_mesh_list = self._cull(scene, camera, "main")
+            for mesh in visible_mesh_list:
+                mesh.select_level(camera, viewport_height)
+        # Meshes sharing a program are consecutive in the queue and measured together
+        for program_ref, mesh_group in itertools.groupby(self._sort_render_queue(visible_mesh_list),
+                                                         key=lambda mesh: mesh.material.program_ref):
+            mesh_group = list(mesh_group)
+            with self._scope(f"{type(mesh_group[0].material).__name__} #{program_ref}"):
+                for mesh in mesh_group:
+                    self._render_mesh(mesh, camera, light_list)
+
+    def _render_mesh(self, mesh, camera, light_list):
+        self._render_state.use_program(mesh.material.program_ref)
+        # Bind VAO
+        self._render_state.bind_vertex_array(mesh.vao_ref)
+        # Update uniform values stored outside of material
+        mesh.material.uniform_dict["modelMatrix"].data = mesh.global_matrix
+        # Camera matrices, lights and shadow data are read from uniform buffers
+        # by the built-in materials; the following uniforms are only set
+        # for materials with custom shader code declaring them
+        mesh.material.uniform_dict["viewMatrix"].data = camera.view_matrix
+        mesh.material.uniform_dict["projectionMatrix"].data = camera.projection_matrix
+        # If material uses light data, add lights from list
+        if "light0" in mesh.material.uniform_dict.keys():
+            for light_number in range(len(light_list)):
+                light_name = "light" + str(light_number)
+                light_instance = light_list[light_number]
+                mesh.material.uniform_dict[light_name].data = light_instance
+        # Add camera position if needed (specular lighting)
+        if "viewPosition" in mesh.material.uniform_dict.keys():
+            mesh.material.uniform_dict["viewPosition"].data = camera.global_position
+        # Add shadow data if enabled and used by shader
+        if isinstance(self._shadow_object, Shadow) and "shadow0" in mesh.material.uniform_dict.keys():
+            mesh.material.uniform_dict["shadow0"].data = self._shadow_object
+        # Depth texture of the shadow pass, if the material reads this kind of shadow
+        if self._shadows_enabled and "useShadow" in mesh.material.uniform_dict.keys():
+            sampler_name = self._shadow_object.SAMPLER_NAME
+            receives_shadow = sampler_name in mesh.material.uniform_dict.keys()
+            if receives_shadow:
+                mesh.material.uniform_dict[sampler_name].data = \
+                    [self._shadow_object.texture_ref, self._shadow_object.TEXTURE_UNIT]
+            mesh.material.uniform_dict["useShadow"].data = receives_shadow and mesh.receive_shadow
+        # Update uniforms stored in material;
+        # values already stored in the program (e.g. camera and light data
+        # uploaded for a previous mesh with the same program) are skipped
+        mesh.material.upload_uniforms(self._render_state)
+        # Update render settings
+        mesh.material.update_render_settings(self._render_state)
+        self._draw(mesh.geometry, mesh.material.setting_dict["drawStyle"], mesh.instance_count)
+
+    def _scope(self, name):
+        """ Profiler scope with given name, or a context doing nothing when profiling is off """
+        if self._profiler is None:
+            return contextlib.nullcontext()
+        return self._profiler.scope(name)
+
+    def _render_shadow_map(self, layer, shadow_mesh_list):
+        """ Render the depth of the shadow casters into a layer of the render target of the shadow """
+        # Bind and clear the render target, and set the matrices of the shadow camera of the layer
+        self._shadow_object.prepare_layer(layer)
+        # Everything in the scene gets rendered with depthMaterial
+        # (or its instanced variant for instanced meshes), so only need to set matrices once;
+        # single meshes come first, so that the program changes at most once
+        for mesh in sorted(shadow_mesh_list, key=lambda mesh: mesh.instance_count is not None):
+            if mesh.instance_count is None:
+                shadow_material = self._shadow_object.material
+            else:
+                shadow_material = self._shadow_object.instanced_material
+            self._render_state.use_program(shadow_material.program_ref)
             # Bind VAO
-            GL.glBindVertexArray(mesh.vao_ref)
-            # Update uniform values stored outside of material
-            mesh.material.uniform_dict["modelMatrix"].data = mesh.global_matrix
-            mesh.material.uniform_dict["viewMatrix"].data = camera.view_matrix
-            mesh.material.uniform_dict["projectionMatrix"].data = camera.projection_matrix
-            # If material uses light data, add lights from list
-            if "light0" in mesh.material.uniform_dict.keys():
-                for light_number in range(len(light_list)):
-                    light_name = "light" + str(light_number)
-                    light_instance = light_list[light_number]
-                    mesh.material.uniform_dict[light_name].data = light_instance
-            # Add camera position if needed (specular lighting)
-            if "viewPosition" in mesh.material.uniform_dict.keys():
-                mesh.material.uniform_dict["viewPosition"].data = camera.global_position
-            # Add shadow data if enabled and used by shader
-            if self._shadows_enabled and "shadow0" in mesh.material.uniform_dict.keys():
-                mesh.material.uniform_dict["shadow0"].data = self._shadow_object
-            # Update uniforms stored in material
-            for uniform_object in mesh.material.uniform_dict.values():
-                uniform_object.upload_data()
-            # Update render settings
-            mesh.material.update_render_settings()
-            GL.glDrawArrays(mesh.material.setting_dict["drawStyle"], 0, mesh.geometry.vertex_count)
-
-    def enable_shadows(self, shadow_light, strength=0.5, resolution=(512, 512)):
+            self._render_state.bind_vertex_array(mesh.shadow_vao_ref)
+            # Update transform data
+            shadow_material.uniform_dict["modelMatrix"].data = mesh.global_matrix
+            # Update uniforms (matrix data) stored in shadow material;
+            # view and projection matrices are only uploaded for the first mesh
+            shadow_material.upload_uniforms(self._render_state)
+            self._draw(mesh.shadow_geometry, GL.GL_TRIANGLES, mesh.instance_count)
+
+    def _cull(self, scene, camera, pass_name):
+        """
+        Return the visible meshes whose bounding spheres are not completely outside the frustum
+        of the camera (with up-to-date view matrix), in scene order, and count the culled meshes of the pass.
+        The bounding volume hierarchy of the scene is used, so that whole groups of meshes
+        outside of or inside the frustum are handled at once.
+        """
+        if not self._frustum_culling:
+            self._culled_count_dict[pass_name] = 0
+            return [mesh for mesh in scene.mesh_list if mesh.visible]
+        hierarchy = scene.bounding_volume_hierarchy
+        mesh_list = hierarchy.frustum_query(Frustum.from_camera(camera))
+        self._culled_count_dict[pass_name] = hierarchy.mesh_count - len(mesh_list)
+        return [mesh for mesh in mesh_list if mesh.visible]
+
+    @staticmethod
+    def _sort_render_queue(mesh_list):
+        """
+        Return the meshes sorted by shader program, then textures, then vertex array object,
+        so that consecutive draw calls share as much OpenGL state as possible
+        """
+        return sorted(mesh_list, key=lambda mesh: (mesh.material.program_ref,
+                                                   mesh.material.texture_refs,
+                                                   mesh.vao_ref))
+
+    def _draw(self, geometry, draw_style, instance_count=None):
+        """
+        Draw the geometry whose vertex array object is bound;
+        draw instance_count instances with a single call if instance_count is not None
+        """
+        self._draw_call_count += 1
+        if draw_style == GL.GL_TRIANGLES:
+            vertex_count = geometry.vertex_count if geometry.index_attribute is None else geometry.index_count
+            self._triangle_count += vertex_count // 3 * (1 if instance_count is None else instance_count)
+        if instance_count is None:
+            if geometry.index_attribute is None:
+                GL.glDrawArrays(draw_style, 0, geometry.vertex_count)
+            else:
+                GL.glDrawElements(draw_style, geometry.index_count, GL.GL_UNSIGNED_INT, None)
+        elif geometry.index_attribute is None:
+            GL.glDrawArraysInstanced(draw_style, 0, geometry.vertex_count, instance_count)
+        else:
+            GL.glDrawElementsInstanced(draw_style, geometry.index_count, GL.GL_UNSIGNED_INT, None, instance_count)
+
+    def start_capture(self, directory, render_target=None, file_format="png", buffer_count=3, worker_count=None):
+        """
+        Record the images of the render target (by default the default render target, or the window)
+        as files in the directory, each time capture_frame is called; see FrameCapture
+        """
+        if self._frame_capture is not None:
+            raise Exception("Frames are already being captured")
+        if render_target is None:
+            render_target = self._default_render_target
+        if render_target is None:
+            width, height = self._window_size
+            framebuffer_ref = 0
+        else:
+            width, height = render_target.width, render_target.height
+            framebuffer_ref = render_target.framebuffer_ref
+        self._frame_capture = FrameCapture(directory, width, height, framebuffer_ref, file_format,
+                                           buffer_count, worker_count)
+
+    def capture_frame(self):
+        """ Record the current image of the captured target; call once per frame, after everything is drawn """
+        if self._frame_capture is None:
+            return
+        with self._scope("capture"):
+            self._frame_capture.capture()
+
+    def stop_capture(self):
+        """ Write the remaining frames and stop capturing; return the number of captured frames """
+        if self._frame_capture is None:
+            return 0
+        frame_count = self._frame_capture.finish()
+        self._frame_capture.delete()
+        self._frame_capture = None
+        return frame_count
+
+    def enable_shadows(self, shadow_light, strength=0.5, resolution=(512, 512), cascade_count=0, **kwargs):
+        """
+        Render shadows of the directional light. With cascade_count > 0, a cascaded shadow map
+        fitted to the camera is used (received by materials created with cascaded_shadow=True);
+        otherwise a single shadow map covering a fixed box. Other keyword arguments are passed to
+        the constructor of CascadedShadow or Shadow.
+        """
         self._shadows_enabled = True
-        self._shadow_object = Shadow(shadow_light, strength=strength, resolution=resolution)
+        if cascade_count > 0:
+            self._shadow_object = CascadedShadow(shadow_light, strength=strength, resolution=resolution,
+                                                 cascade_count=cascade_count, **kwargs)
+        else:
+            self._shadow_object = Shadow(shadow_light, strength=strength, resolution=resolution, **kwargs)
+        self._shadow_signature_list = [None] * len(self._shadow_object.camera_list)
@@ -6,6 +6,14 @@ from scripts.material.depth import DepthMaterial
 
 
 class Shadow:
+    """
+    Shadow of a directional light, stored as depth values seen by one orthographic camera
+    attached to the light, covering a fixed box
+    """
+    # Sampler uniform of materials receiving this kind of shadow, and its texture unit
+    SAMPLER_NAME = "shadowDepthSampler0"
+    TEXTURE_UNIT = 3
+
     def __init__(self,
                  light_source,
                  strength=0.5,
@@ -27,6 +35,8 @@ class Shadow:
         )
         # Render only depth data to target texture
         self._material = DepthMaterial()
+        # Used for instances of InstancedMesh
+        self._instanced_material = DepthMaterial(instanced=True)
         # Controls darkness of shadow
         self._strength = strength
         # Used to avoid visual artifacts due to
@@ -41,10 +51,19 @@ class Shadow:
     def camera(self):
         return self._camera
 
+    @property
+    def camera_list(self):
+        """ Cameras rendering the layers of the shadow map; a single layer here """
+        return [self._camera]
+
     @property
     def material(self):
         return self._material
 
+    @property
+    def instanced_material(self):
+        return self._instanced_material
+
     @property
     def light_source(self):
         return self._light_source
@@ -57,7 +76,23 @@ class Shadow:
     def strength(self):
         return self._strength
 
-    def update_internal(self):
+    @property
+    def texture_ref(self):
+        """ Reference of the texture sampled by materials receiving the shadow """
+        return self._render_target.texture.texture_ref
+
+    def update_internal(self, camera=None):
+        """ Update the shadow camera; the camera viewing the scene does not change the fixed box """
         self._camera.update_view_matrix()
-        self._material.uniform_dict["viewMatrix"].data = self._camera.view_matrix
-        self._material.uniform_dict["projectionMatrix"].data = self._camera.projection_matrix
+        for material in (self._material, self._instanced_material):
+            material.uniform_dict["viewMatrix"].data = self._camera.view_matrix
+            material.uniform_dict["projectionMatrix"].data = self._camera.projection_matrix
+
+    def prepare_layer(self, layer):
+        """ Activate and clear the render target of the layer before its shadow casters are drawn """
+        GL.glBindFramebuffer(GL.GL_FRAMEBUFFER, self._render_target.framebuffer_ref)
+        GL.glViewport(0, 0, self._render_target.width, self._render_target.height)
+        # Set default color to white, used when no objects present to cast shadows
+        GL.glClearColor(1, 1, 1, 1)
+        GL.glClear(GL.GL_COLOR_BUFFER_BIT)
+        GL.glClear(GL.GL_DEPTH_BUFFER_BIT)
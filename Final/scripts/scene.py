@@ -1,4 +1,7 @@
+from scripts.core.bounding_volume_hierarchy import BoundingVolumeHierarchy
+from scripts.core.mesh import Mesh
 from scripts.core.object3d import Object3D
+from scripts.light.light import Light
 
 
 class Scene(Object3D):
@@ -6,3 +9,52 @@ class Scene(Object3D):
 
     def __init__(self):
         super().__init__()
+        # Lists of Mesh and Light instances in the scene,
+        # made from the descendant list they are stored with
+        self._filtered_descendant_list = None
+        self._mesh_list = []
+        self._light_list = []
+        # Hierarchy of the bounds of all meshes, updated when meshes are added, removed or moved
+        self._bounding_volume_hierarchy = BoundingVolumeHierarchy()
+        # Mesh list the hierarchy was last made to contain
+        self._hierarchy_mesh_list = None
+
+    @property
+    def bounding_volume_hierarchy(self):
+        """ Return the hierarchy containing all meshes of the scene, for culling and spatial queries """
+        mesh_list = self.mesh_list
+        if mesh_list is not self._hierarchy_mesh_list:
+            self._bounding_volume_hierarchy.set_meshes(mesh_list)
+            self._hierarchy_mesh_list = mesh_list
+        return self._bounding_volume_hierarchy
+
+    @property
+    def mesh_list(self):
+        """ Return list of all Mesh instances in the scene """
+        self._update_filtered_lists()
+        return self._mesh_list
+
+    @property
+    def light_list(self):
+        """ Return list of all Light instances in the scene """
+        self._update_filtered_lists()
+        return self._light_list
+
+    def pick(self, camera, x, y):
+        """
+        Return the nearest visible mesh whose bounding sphere is under the point (x, y)
+        in normalized device coordinates (-1...1) of the camera view, or None
+        """
+        origin, direction = camera.get_ray(x, y)
+        for _, mesh in self.bounding_volume_hierarchy.ray_query(origin, direction):
+            if mesh.visible:
+                return mesh
+        return None
+
+    def _update_filtered_lists(self):
+        """ Filter the descendant list again if the scene graph has changed """
+        descendant_list = self.descendant_list
+        if descendant_list is not self._filtered_descendant_list:
+            self._mesh_list = [node for node in descendant_list if isinstance(node, Mesh)]
+            self._light_list = [node for node in descendant_list if isinstance(node, Light)]
+            self._filtered_descendant_list = descendant_list